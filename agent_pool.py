@@ -0,0 +1,156 @@
+import atexit
+import threading
+from contextlib import contextmanager
+
+from phi.run.response import RunResponse
+
+
+# ---------------------------
+# Reset between uses
+# ---------------------------
+
+def clear_memory(agent):
+    """Drop the run/message history phi keeps on an Agent and its team members."""
+    agent.memory.clear()
+    for member in agent.team or []:
+        clear_memory(member)
+
+
+def reset_agent(agent):
+    """
+    Wipe per-conversation state from an Agent and its team members so the
+    next user starts clean: memory, session/run ids, session state, media.
+    Tools, instructions and model clients are kept (that is the point).
+    """
+    agent.memory.clear()
+    agent.session_id = None
+    agent.session_name = None
+    agent.session_state = {}
+    agent.session_data = None
+    agent.agent_session = None
+    agent.run_id = None
+    agent.run_input = None
+    agent.run_response = RunResponse()
+    agent.images = None
+    agent.videos = None
+    agent.audio = None
+    if agent.model is not None:
+        agent.model.session_id = None
+        agent.model.metrics = {}
+        agent.model.function_call_stack = None
+    for member in agent.team or []:
+        reset_agent(member)
+
+
+# ---------------------------
+# Pool
+# ---------------------------
+
+class AgentPool:
+    """
+    Keeps `size` pre-built agents ready so checking one out costs nothing.
+
+        with pool.checkout() as agent:      # one request
+            agent.run(...)
+
+        agent = pool.acquire()              # one whole session
+        ...
+        pool.release(agent)
+
+    An agent belongs to one caller until released, then it is reset and
+    reused. When the pool runs dry, acquire() builds one on the spot; once
+    fewer than half of `size` are idle a background thread tops it back up.
+    `close()` (also run at exit) stops that thread after the agent it is
+    building, so nothing is built while the interpreter shuts down.
+    """
+
+    def __init__(self, factory, size: int = 4, name: str = None):
+        self.factory = factory
+        self.size = size
+        self.name = name or getattr(factory, "__name__", "agents")
+        self._idle = []
+        self._lock = threading.Lock()
+        self._filling = False
+        self._closed = False
+        self._thread = None
+        self.built = 0
+        self.reused = 0
+        self.in_use = 0
+        atexit.register(self.close)
+
+    def _build(self):
+        agent = self.factory()
+        with self._lock:
+            self.built += 1
+        return agent
+
+    def _fill(self):
+        try:
+            while True:
+                with self._lock:
+                    if self._closed or len(self._idle) >= self.size:
+                        return
+                agent = self._build()
+                with self._lock:
+                    self._idle.append(agent)
+        finally:
+            with self._lock:
+                self._filling = False
+
+    def warm(self, background: bool = True):
+        """Pre-build agents up to `size` (in a daemon thread by default)."""
+        with self._lock:
+            if self._filling or self._closed:
+                return
+            self._filling = True
+            if background:
+                self._thread = threading.Thread(target=self._fill, name=f"warm-{self.name}", daemon=True)
+                self._thread.start()
+        if not background:
+            self._fill()
+
+    def close(self, timeout: float = 30.0):
+        """Stop pre-building and wait for the agent being built, if any."""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def acquire(self):
+        with self._lock:
+            agent = self._idle.pop() if self._idle else None
+            self.in_use += 1
+            if agent is not None:
+                self.reused += 1
+            low = len(self._idle) < max(1, self.size // 2)
+        if agent is None:
+            agent = self._build()
+        if low:
+            self.warm()  # top the idle list back up off the request path
+        return agent
+
+    def release(self, agent):
+        reset_agent(agent)
+        with self._lock:
+            self.in_use -= 1
+            if len(self._idle) < self.size:
+                self._idle.append(agent)
+
+    @contextmanager
+    def checkout(self):
+        agent = self.acquire()
+        try:
+            yield agent
+        finally:
+            self.release(agent)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "idle": len(self._idle),
+                "in_use": self.in_use,
+                "size": self.size,
+                "built": self.built,
+                "reused": self.reused,
+            }
@@ -0,0 +1,292 @@
+import re
+import warnings
+
+import numpy as np
+import pandas as pd
+
+
+# ---------------------------
+# Vectorized return / risk metrics
+# ---------------------------
+#
+# Every function takes a price matrix: a DataFrame indexed by date with one
+# column per symbol (as returned by `_safe_history_many`). Symbols may have
+# different histories; missing prices are NaN and are skipped, never filled
+# into returns.
+
+TRADING_DAYS = 252
+
+DEFAULT_HORIZONS = ("1m", "3m", "ytd", "1y", "3y", "5y", "10y")
+
+# a symbol must have a price within this many days of a window's start to get numbers for it
+HORIZON_TOLERANCE_DAYS = 7
+
+
+def _as_matrix(prices: pd.DataFrame):
+    values = prices.to_numpy(dtype=np.float64, copy=False)
+    if values.ndim == 1:
+        values = values[:, None]
+    return values
+
+
+def _ffill(values: np.ndarray) -> np.ndarray:
+    """Forward-fill NaNs down each column (leading NaNs stay NaN)."""
+    rows = np.arange(values.shape[0])[:, None]
+    idx = np.where(~np.isnan(values), rows, 0)
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    return values[idx, np.arange(values.shape[1])]
+
+
+def _first_last(values: np.ndarray):
+    """Row index of the first and last valid price in every column (-1 if none)."""
+    valid = ~np.isnan(values)
+    has_any = valid.any(axis=0)
+    first = np.where(has_any, valid.argmax(axis=0), -1)
+    last = np.where(has_any, values.shape[0] - 1 - valid[::-1].argmax(axis=0), -1)
+    return first, last
+
+
+def daily_returns(prices: pd.DataFrame) -> np.ndarray:
+    """
+    Simple returns between consecutive valid prices of each column.
+    Rows where a symbol has no price are NaN for that symbol.
+    """
+    values = _as_matrix(prices)
+    filled = _ffill(values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return values[1:] / filled[:-1] - 1.0
+
+
+def summarize(prices: pd.DataFrame, trading_days: int = TRADING_DAYS) -> pd.DataFrame:
+    """
+    One row per symbol with:
+    start, end, total_return (%), years, cagr (%), volatility (annualized %),
+    max_drawdown (%, negative), high, low.
+    """
+    values = _as_matrix(prices)
+    cols = np.arange(values.shape[1])
+    first, last = _first_last(values)
+    ok = first >= 0
+
+    start = np.where(ok, values[np.maximum(first, 0), cols], np.nan)
+    end = np.where(ok, values[np.maximum(last, 0), cols], np.nan)
+
+    dates = pd.DatetimeIndex(prices.index)
+    day_ns = dates.as_unit("ns").asi8
+    span_days = np.where(ok, (day_ns[np.maximum(last, 0)] - day_ns[np.maximum(first, 0)]) / 86_400e9, np.nan)
+    years = span_days / 365.25
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth = end / start
+        total_return = (growth - 1.0) * 100.0
+        cagr = np.where((start > 0) & (years > 0), (growth ** (1.0 / years) - 1.0) * 100.0, np.nan)
+
+    rets = daily_returns(prices)
+    n_rets = (~np.isnan(rets)).sum(axis=0)
+    with warnings.catch_warnings():
+        # all-NaN / single-return columns are masked out below
+        warnings.simplefilter("ignore", RuntimeWarning)
+        std = np.nanstd(rets, axis=0, ddof=1) if rets.shape[0] else np.full(values.shape[1], np.nan)
+    volatility = np.where(n_rets > 1, std, np.nan) * np.sqrt(trading_days) * 100.0
+
+    filled = _ffill(values)
+    peak = np.fmax.accumulate(filled, axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdown = filled / peak - 1.0
+    valid_dd = ~np.isnan(drawdown)
+    max_dd = np.where(valid_dd.any(axis=0), np.min(np.where(valid_dd, drawdown, np.inf), axis=0), np.nan) * 100.0
+
+    valid = ~np.isnan(values)
+    high = np.where(ok, np.max(np.where(valid, values, -np.inf), axis=0), np.nan)
+    low = np.where(ok, np.min(np.where(valid, values, np.inf), axis=0), np.nan)
+
+    return pd.DataFrame(
+        {
+            "start": start,
+            "end": end,
+            "total_return": total_return,
+            "years": years,
+            "cagr": cagr,
+            "volatility": volatility,
+            "max_drawdown": max_dd,
+            "high": high,
+            "low": low,
+        },
+        index=pd.Index(prices.columns, name="symbol"),
+    )
+
+
+def yearly_returns(prices: pd.DataFrame) -> pd.DataFrame:
+    """
+    Calendar-year returns (%) from one year-end close to the next, per symbol.
+    Years with no prior year-end close for a symbol are NaN.
+    """
+    values = _ffill(_as_matrix(prices))
+    years = pd.DatetimeIndex(prices.index).year.to_numpy()
+    if years.size == 0:
+        return pd.DataFrame(columns=prices.columns)
+
+    # last row of each calendar year (index is sorted)
+    boundary = np.flatnonzero(np.diff(years))
+    year_end_rows = np.append(boundary, years.size - 1)
+    year_end = values[year_end_rows]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ret = (year_end[1:] / year_end[:-1] - 1.0) * 100.0
+
+    return pd.DataFrame(ret, index=pd.Index(years[year_end_rows[1:]], name="year"), columns=prices.columns)
+
+
+def horizon_offset(spec: str):
+    """DateOffset for "1m" / "3mo" / "5y" style horizons, "ytd" → None; ValueError otherwise."""
+    spec = spec.strip().lower()
+    if spec == "ytd":
+        return None
+    m = re.fullmatch(r"(\d+)\s*(m|mo|mos|months?|y|yr|yrs|years?)", spec)
+    if not m or int(m.group(1)) == 0:
+        raise ValueError(f"Unsupported horizon: {spec!r} (use e.g. 1m, 3m, ytd, 1y, 5y, 10y)")
+    n = int(m.group(1))
+    return pd.DateOffset(years=n) if m.group(2).startswith("y") else pd.DateOffset(months=n)
+
+
+def horizon_summary(prices: pd.DataFrame, horizons=DEFAULT_HORIZONS, as_of=None,
+                    trading_days: int = TRADING_DAYS) -> pd.DataFrame:
+    """
+    `summarize` over trailing windows that all end at the last date, from one
+    price matrix (e.g. a single 10y download). Index is (symbol, horizon).
+
+    Windows are measured back from `as_of` (default: the last date) and start
+    at the first date on or after that point (Jan 1 for "ytd"), the same
+    convention as a yfinance `period`. Symbols without a price within
+    HORIZON_TOLERANCE_DAYS of that start (listed later, or too little history)
+    get NaN for the horizon, and CAGR is left NaN for windows under a year.
+    """
+    dates = pd.DatetimeIndex(prices.index)
+    if dates.empty:
+        raise ValueError("No price data")
+    end = pd.Timestamp(as_of) if as_of is not None else dates[-1]
+    day_ns = dates.as_unit("ns").asi8
+    tolerance = pd.Timedelta(days=HORIZON_TOLERANCE_DAYS).value
+
+    frames = []
+    for h in horizons:
+        offset = horizon_offset(h)
+        start = pd.Timestamp(year=end.year, month=1, day=1) if offset is None else end - offset
+        pos = int(dates.searchsorted(start, side="left"))
+        window = prices.iloc[pos:]
+        summary = summarize(window, trading_days)
+
+        first, _ = _first_last(_as_matrix(window))
+        first_ns = np.where(first >= 0, day_ns[pos:][np.maximum(first, 0)], np.iinfo(np.int64).max)
+        late = first_ns - pd.Timestamp(start).as_unit("ns").value > tolerance
+        summary.loc[late] = np.nan
+        summary.loc[summary["years"] < 0.9, "cagr"] = np.nan  # annualizing a few months misleads
+        summary["horizon"] = h
+        frames.append(summary)
+
+    out = pd.concat(frames).set_index("horizon", append=True)
+    return out.loc[pd.MultiIndex.from_product([list(prices.columns), list(horizons)], names=["symbol", "horizon"])]
+
+
+def rank(summary: pd.DataFrame, by: str = "total_return", ascending: bool = False) -> pd.DataFrame:
+    """Sort a `summarize` table by one metric, NaNs last."""
+    return summary.sort_values(by, ascending=ascending, na_position="last")
+
+
+def top_k(summary: pd.DataFrame, by: str, k: int, ascending: bool = False) -> pd.DataFrame:
+    """
+    The `k` best rows of `summary` by one metric, in order, NaNs never chosen.
+    Uses a partial partition (O(n)) and only sorts the k winners, so picking
+    the top 10 of a 500-symbol universe does not sort all 500.
+    """
+    values = summary[by].to_numpy(dtype=np.float64)
+    candidates = np.flatnonzero(~np.isnan(values))
+    keys = values[candidates] if ascending else -values[candidates]
+    if 0 < k < candidates.size:
+        part = np.argpartition(keys, k - 1)[:k]
+        candidates, keys = candidates[part], keys[part]
+    elif k <= 0:
+        candidates, keys = candidates[:0], keys[:0]
+    order = np.argsort(keys, kind="stable")
+    return summary.iloc[candidates[order]]
+
+
+# ---------------------------
+# Correlation / covariance
+# ---------------------------
+
+# fewer overlapping returns than this and a pair's correlation is NaN
+MIN_OVERLAP = 20
+
+# columns per block when building pairwise matrices for many symbols
+CORRELATION_BLOCK = 256
+
+
+def _pair_stats(xa, ma, xb, mb):
+    """
+    Pairwise-complete moments between two column blocks of returns.
+    x* are returns with NaN → 0, m* the matching validity masks (float).
+    Only rows where both columns of a pair have a return are counted.
+    """
+    n = ma.T @ mb
+    sa = xa.T @ mb            # Σ a over rows where b is valid too
+    sb = ma.T @ xb
+    sab = xa.T @ xb
+    saa = (xa * xa).T @ mb
+    sbb = ma.T @ (xb * xb)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = (sab - sa * sb / n) / (n - 1)
+        var_a = (saa - sa * sa / n) / (n - 1)
+        var_b = (sbb - sb * sb / n) / (n - 1)
+        corr = cov / np.sqrt(var_a * var_b)
+    short = n < MIN_OVERLAP
+    cov[short] = np.nan
+    corr[short] = np.nan
+    return corr, cov
+
+
+def correlation(prices: pd.DataFrame, trading_days: int = TRADING_DAYS, block: int = CORRELATION_BLOCK):
+    """
+    Correlation and annualized covariance of daily returns, one row and
+    column per symbol. Each pair uses the dates both symbols traded
+    (pairwise-complete), so one short history does not shrink every other
+    pair. Built from matrix products over `block`-column tiles, so the
+    temporaries stay block x block however many symbols there are.
+    """
+    rets = daily_returns(prices)
+    mask = (~np.isnan(rets)).astype(np.float64)
+    x = np.where(mask > 0, rets, 0.0)
+    n = x.shape[1]
+
+    corr = np.full((n, n), np.nan)
+    cov = np.full((n, n), np.nan)
+    for i in range(0, n, block):
+        for j in range(i, n, block):
+            c, v = _pair_stats(x[:, i:i + block], mask[:, i:i + block], x[:, j:j + block], mask[:, j:j + block])
+            corr[i:i + block, j:j + block] = c
+            cov[i:i + block, j:j + block] = v
+            corr[j:j + block, i:i + block] = c.T
+            cov[j:j + block, i:i + block] = v.T
+
+    np.clip(corr, -1.0, 1.0, out=corr)
+    labels = pd.Index(prices.columns, name="symbol")
+    return (
+        pd.DataFrame(corr, index=labels, columns=labels),
+        pd.DataFrame(cov * trading_days, index=labels, columns=labels),
+    )
+
+
+def extreme_pairs(corr: pd.DataFrame, k: int = 5):
+    """
+    (most, least): the `k` most and least correlated distinct pairs as
+    DataFrames with columns a, b, corr, best first. Picked by partial
+    partition over the upper triangle, NaN pairs skipped.
+    """
+    rows, cols = np.triu_indices(len(corr), k=1)
+    values = corr.to_numpy()[rows, cols]
+    ok = ~np.isnan(values)
+    pairs = pd.DataFrame({"a": corr.index[rows[ok]], "b": corr.columns[cols[ok]], "corr": values[ok]})
+    return (
+        top_k(pairs, "corr", k, ascending=False).reset_index(drop=True),
+        top_k(pairs, "corr", k, ascending=True).reset_index(drop=True),
+    )
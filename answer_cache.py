@@ -0,0 +1,106 @@
+import hashlib
+import os
+import threading
+
+import router
+import tracing
+from news_fetcher import news_fetcher
+from price_store import price_store
+from tool_cache import NEWS_TTL, ToolCache
+
+
+# ---------------------------
+# Settings
+# ---------------------------
+
+ANSWER_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(15 * 60)))   # upper bound for any answer
+
+
+# ---------------------------
+# Answer cache
+# ---------------------------
+
+class AnswerCache:
+    """
+    Full agent answers keyed by normalized intent (router.intent_key):
+    content words + sorted symbols + horizons + numbers, so rephrasings hit.
+
+    Each entry remembers the data it was built on (price_store.version per
+    symbol, news_fetcher.version per symbol for news questions) and is
+    dropped as soon as any of it is refreshed or goes stale. Entries also
+    expire after ANSWER_TTL (NEWS_TTL for news questions), which covers
+    data fetched outside those stores (web search, analyst ratings).
+
+    Follow-ups are answered from the conversation context, so the key also
+    holds a digest of the rendered context: answers are shared only between
+    turns with no context, or with exactly the same one.
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: float = ANSWER_TTL, store=None, news=None):
+        self.ttl = ttl
+        self.store = store or price_store
+        self.news = news or news_fetcher
+        self._cache = ToolCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+
+    def _deps(self, key) -> tuple:
+        words, symbols = key[0], key[1]
+        deps = [("price", s, self.store.version(s)) for s in symbols]
+        if "news" in words:
+            deps += [("news", s, self.news.version(s)) for s in symbols]
+        return tuple(deps)
+
+    @staticmethod
+    def _key(message: str, context: str):
+        intent = router.intent_key(message)
+        if intent is None:
+            return None
+        digest = hashlib.sha1(context.encode("utf-8")).hexdigest() if context else ""
+        return intent + (digest,)
+
+    def _count(self, outcome: str):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def get(self, message: str, context: str = ""):
+        """Cached answer for `message` asked in conversation `context`, or None."""
+        key = self._key(message, context)
+        if key is None:
+            return None
+        with tracing.span("answer_cache", kind="cache") as sp:
+            found, entry = self._cache.get(key)
+            if found and entry[1] != self._deps(key):
+                self._cache.pop(key)
+                self._count("invalidated")
+                found = False
+            sp.set(cache_answer="hit" if found else "miss")
+            self._count("hits" if found else "misses")
+            return entry[0] if found else None
+
+    def put(self, message: str, answer: str, context: str = ""):
+        key = self._key(message, context)
+        if key is None or not answer or answer.startswith("Error"):
+            return
+        ttl = min(self.ttl, NEWS_TTL) if "news" in key[0] else self.ttl
+        self._cache.set(key, (answer, self._deps(key)), ttl)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": self._cache.stats()["size"],
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidated": self.invalidated,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+# Shared cache consulted before any agent runs
+answer_cache = AnswerCache()
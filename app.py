@@ -1,7 +1,10 @@
 import streamlit as st
-import time
-import markdown2
-from financial_agent import get_financial_agent
+import os
+import tracing
+from financial_agent import stream_answer, warm_agent_pools
+from prefetcher import prefetcher
+from chat_render import HISTORY_PAGE, StreamRenderer, history_html, message_html, new_message
+from conversation import ConversationContext
 
 # ------------------------------------------------------
 # PAGE CONFIG
@@ -102,47 +105,64 @@ st.markdown("<div class='subtitle'>Ask about stocks, news, 10-year analysis, per
 # ------------------------------------------------------
 # LOAD AGENT
 # ------------------------------------------------------
+# Agents come pre-built from a process-wide pool; a turn that reaches the LLM
+# checks one out and hands it back (reset) when the answer ends, so
+# conversations never share memory and a closed browser tab never keeps one.
 @st.cache_resource
-def load_agent():
-    return get_financial_agent()
+def warm_pools():
+    warm_agent_pools()
+    prefetcher.start()   # with PREFETCH=1, keeps hot tickers' prices and news fresh in the background
+    return True
 
-agent = load_agent()
+warm_pools()
+
+# What the agents are told about earlier turns: last few verbatim, older ones
+# summarized, tickers/figures remembered, all within a fixed token budget
+if "context" not in st.session_state:
+    st.session_state.context = ConversationContext()
+
+# Prometheus-style metrics endpoint (opt-in via METRICS_PORT)
+@st.cache_resource
+def start_metrics():
+    port = os.getenv("METRICS_PORT")
+    return tracing.start_metrics_server(int(port)) if port else None
+
+start_metrics()
+
+# Typing animation is optional; off by default so answers paint as fast as they stream
+typing_effect = st.sidebar.checkbox("Typing effect", value=False)
 
 # ------------------------------------------------------
 # SESSION CHAT MEMORY
 # ------------------------------------------------------
 if "messages" not in st.session_state:
     st.session_state.messages = [
-        {"role": "assistant", "content": "Hello! I'm your financial assistant. What can I help you analyze today?"}
+        new_message("assistant", "Hello! I'm your financial assistant. What can I help you analyze today?")
     ]
 
+# Rendered bubble HTML per message id, and how many recent bubbles are shown
+if "html_cache" not in st.session_state:
+    st.session_state.html_cache = {}
+if "history_shown" not in st.session_state:
+    st.session_state.history_shown = HISTORY_PAGE
+
 # ------------------------------------------------------
-# RENDER CHAT HISTORY
+# RENDER CHAT HISTORY (last N bubbles, cached HTML)
 # ------------------------------------------------------
-st.markdown("<div class='chat-container'>", unsafe_allow_html=True)
-
-for msg in st.session_state.messages:
-    if msg["role"] == "assistant":
-        bubble = "bot-bubble"
-        emoji = "🤖"
-    else:
-        bubble = "user-bubble"
-        emoji = "👤"
-
-    # Convert Markdown → HTML BEFORE inserting into bubble
-    html_text = markdown2.markdown(msg["content"])
-
-    st.markdown(
-        f"""
-        <div class="chat-bubble {bubble}">
-            <div class="emoji">{emoji}</div>
-            <div class="bubble-text">{html_text}</div>
-        </div>
-        """,
-        unsafe_allow_html=True
-    )
-
-st.markdown("</div>", unsafe_allow_html=True)
+messages = st.session_state.messages
+hidden = len(messages) - st.session_state.history_shown
+
+if hidden > 0:
+    if st.button(f"Load older messages ({hidden} hidden)"):
+        st.session_state.history_shown += HISTORY_PAGE
+        st.rerun()
+
+st.markdown(
+    "<div class='chat-container'>"
+    + history_html(messages, st.session_state.html_cache, st.session_state.history_shown)
+    + "</div>",
+    unsafe_allow_html=True
+)
 
 # ------------------------------------------------------
 # USER INPUT
@@ -152,63 +172,59 @@ prompt = st.chat_input("Type your financial question...")
 if prompt:
 
     # Save user message
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    user_msg = new_message("user", prompt)
+    st.session_state.messages.append(user_msg)
 
     # Display user bubble
-    st.markdown(
-        f"""
-        <div class="chat-bubble user-bubble">
-            <div class="emoji">👤</div>
-            <div class="bubble-text">{prompt}</div>
-        </div>
-        """,
-        unsafe_allow_html=True
-    )
+    st.markdown(message_html(user_msg, st.session_state.html_cache), unsafe_allow_html=True)
 
     stream_box = st.empty()
-    full_response = ""
+    renderer = StreamRenderer(
+        paint=lambda html: stream_box.markdown(html, unsafe_allow_html=True),
+        typing=typing_effect,
+    )
 
     # ------------------------------------------------------
-    # STREAMING + TYPING EFFECT
+    # STREAMING (chunk-level, frame-throttled repaint)
     # ------------------------------------------------------
-    for chunk in agent.run(message=prompt, stream=True):
-        if hasattr(chunk, "content") and chunk.content:
-            text = chunk.content
-        elif isinstance(chunk, str):
-            text = chunk
-        else:
-            continue
-
-        for c in text:
-            full_response += c
-
-            html_text = markdown2.markdown(full_response + "▌")
-
-            stream_box.markdown(
-                f"""
-                <div class="chat-bubble bot-bubble">
-                    <div class="emoji">🤖</div>
-                    <div class="bubble-text">{html_text}</div>
-                </div>
-                """,
-                unsafe_allow_html=True
-            )
-            time.sleep(0.006)
-
-    # Final bubble (remove cursor ▌)
-    html_text = markdown2.markdown(full_response)
-
-    stream_box.markdown(
-        f"""
-        <div class="chat-bubble bot-bubble">
-            <div class="emoji">🤖</div>
-            <div class="bubble-text">{html_text}</div>
-        </div>
-        """,
-        unsafe_allow_html=True
-    )
+    # Fast path (direct tool call) → parallel fan-out → Supervisor team;
+    # the whole turn is recorded as one trace for the debug panel
+    with tracing.trace(prompt) as turn:
+        for chunk in stream_answer(prompt, context=st.session_state.context):
+            if hasattr(chunk, "content") and chunk.content:
+                text = chunk.content
+            elif isinstance(chunk, str):
+                text = chunk
+            else:
+                continue
+
+            renderer.append(text)
+
+        # Final bubble (full conversion, no cursor ▌)
+        full_response = renderer.finish()
+
+    st.session_state.last_trace = turn.to_dict()
 
     # Save assistant message
-    st.session_state.messages.append(
-        {"role": "assistant", "content": full_response}
-    )
+    st.session_state.messages.append(new_message("assistant", full_response))
+
+# ------------------------------------------------------
+# DEBUG PANEL (span breakdown of the last answer)
+# ------------------------------------------------------
+last_trace = st.session_state.get("last_trace")
+if last_trace:
+    with st.sidebar.expander(f"🔍 Last answer: {last_trace['duration_ms'] / 1000:.2f}s"):
+        st.dataframe(
+            [
+                {
+                    "kind": sp["kind"],
+                    "name": sp["name"],
+                    "ms": round(sp["duration_ms"] or 0.0, 1),
+                    "tokens in/out": f"{sp.get('input_tokens', '')}/{sp.get('output_tokens', '')}".strip("/"),
+                    "bytes": sp.get("bytes", ""),
+                    "cache": sp.get("cache_tool") or sp.get("cache_price") or "",
+                }
+                for sp in last_trace["spans"]
+            ],
+            use_container_width=True,
+        )
@@ -0,0 +1,375 @@
+"""
+Local stand-ins for every upstream the app talks to, so benchmarks run offline:
+
+- SyntheticHistory: deterministic OHLCV frames (a PriceStore fetcher)
+- FakeNewsSource:   NewsFetcher source returning canned results
+- MockOpenAIServer: OpenAI-compatible /v1/chat/completions that streams
+                    tokens at a fixed rate
+- RecordingHistory / ReplayHistory: capture real responses once, replay them later
+- ThrottlingProvider: wraps any of the above and answers "429 Too Many
+                    Requests" beyond a request rate, like Yahoo under burst load
+- block_network():  refuse any non-loopback connection
+"""
+import asyncio
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+
+# ---------------------------
+# Network guard
+# ---------------------------
+
+_LOOPBACK = {"127.0.0.1", "::1", "localhost"}
+
+
+def block_network():
+    """Make every non-loopback socket connect fail fast (returns an undo callable)."""
+    original = socket.socket.connect
+
+    def guarded(self, address):
+        host = address[0] if isinstance(address, tuple) else address
+        if host not in _LOOPBACK:
+            raise ConnectionRefusedError(f"network disabled for benchmarks: {host}")
+        return original(self, address)
+
+    socket.socket.connect = guarded
+    return lambda: setattr(socket.socket, "connect", original)
+
+
+# ---------------------------
+# Price history
+# ---------------------------
+
+_PERIOD_DAYS = {"1mo": 31, "3mo": 92, "6mo": 183, "ytd": 366, "1y": 366, "2y": 731, "5y": 1827, "10y": 3653, "max": 7305}
+
+
+class SyntheticHistory:
+    """
+    PriceStore-compatible fetcher returning a seeded random walk per symbol.
+    `latency` (seconds) is slept on every call to model the network.
+    Symbols starting with "BAD" raise, to exercise error paths.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+        self._frames = {}
+
+    def __call__(self, symbol: str, period: str = None, start=None):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if symbol.startswith("BAD"):
+            raise RuntimeError(f"no such symbol {symbol}")
+
+        frame = self._frames.get(symbol)
+        if frame is None:
+            frame = self._frames[symbol] = self._generate(symbol)
+
+        if start is not None:
+            first = pd.Timestamp(start, tz="America/New_York")
+        else:
+            first = frame.index[-1] - pd.Timedelta(days=_PERIOD_DAYS.get(period, 366))
+        return frame[frame.index >= first].copy()
+
+    @staticmethod
+    def _generate(symbol: str):
+        end = pd.Timestamp.now(tz="America/New_York").normalize()
+        # weekdays via numpy: pd.bdate_range holds the GIL ~0.1 s per symbol, which
+        # would serialize concurrent "network" calls in the benchmarks
+        days = np.arange(np.datetime64((end - pd.Timedelta(days=_PERIOD_DAYS["max"])).date()),
+                         np.datetime64(end.date()) + 1)
+        full = pd.DatetimeIndex(days[np.is_busday(days)].astype("datetime64[us]"), name="Date").tz_localize(end.tz)
+
+        seed = int(hashlib.md5(symbol.encode()).hexdigest()[:8], 16)
+        rng = np.random.default_rng(seed)
+        close = 50.0 * np.exp(np.cumsum(rng.normal(0.0004, 0.018, len(full))))
+        frame = pd.DataFrame(
+            {
+                "Open": close * 0.995,
+                "High": close * 1.01,
+                "Low": close * 0.99,
+                "Close": close,
+                "Volume": rng.integers(1_000_000, 50_000_000, len(full)).astype(float),
+                "Dividends": 0.0,
+                "Stock Splits": 0.0,
+            },
+            index=full,
+        )
+        return frame
+
+
+# ---------------------------
+# Google News
+# ---------------------------
+
+def canned_news(query: str, n: int = 10) -> list:
+    return [
+        {
+            "title": f"{query}: headline {i + 1}",
+            "media": "Benchmark Wire",
+            "date": f"{i + 1} hours ago",
+            "desc": f"Synthetic story {i + 1} about {query}.",
+            "link": f"https://news.example.com/{query.lower().replace(' ', '-')}/{i + 1}",
+        }
+        for i in range(n)
+    ]
+
+
+class FakeNewsSource:
+    """
+    NewsFetcher `source` returning canned (or replayed) stories after
+    `latency` seconds, without blocking the fetcher's event loop.
+    """
+
+    def __init__(self, latency: float = 0.0, replay: dict = None):
+        self.latency = latency
+        self.replay = replay  # {query: [results]} from load_news_replay()
+        self.calls = 0
+
+    async def __call__(self, client, query: str) -> list:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.replay is not None and query in self.replay:
+            return list(self.replay[query])
+        return canned_news(query)
+
+
+# ---------------------------
+# Throttling upstream
+# ---------------------------
+
+class RateLimited(Exception):
+    """What a throttling provider raises (status 429, yfinance-style message)."""
+
+    status_code = 429
+
+    def __init__(self, name: str):
+        super().__init__(f"{name}: Too Many Requests. Rate limited. Try after a while.")
+
+
+class ThrottlingProvider:
+    """
+    Wrap a fetcher (SyntheticHistory, ...) or an async news source and reject
+    calls beyond `rate` per second (bursts up to `burst`) with RateLimited,
+    the way Yahoo / Google answer a burst. Rejected calls still count
+    against the window, so hammering a throttled provider keeps it closed.
+    """
+
+    def __init__(self, inner, rate: float = 5.0, burst: int = 5, name: str = "fake"):
+        self.inner = inner
+        self.rate = rate
+        self.burst = burst
+        self.name = name
+        self.calls = 0
+        self.rejected = 0
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _admit(self):
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1.0
+            if self._tokens < 0:
+                self._tokens = max(self._tokens, -1.0)
+                self.rejected += 1
+                raise RateLimited(self.name)
+
+    def __call__(self, *args, **kwargs):
+        self._admit()
+        return self.inner(*args, **kwargs)  # a coroutine when `inner` is async
+
+
+# ---------------------------
+# Record / replay
+# ---------------------------
+
+class RecordingHistory:
+    """Wrap a real fetcher and save every frame it returns under `root`."""
+
+    def __init__(self, inner, root: str):
+        self.inner = inner
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def __call__(self, symbol: str, period: str = None, start=None):
+        df = self.inner(symbol, period=period, start=start)
+        if df is not None and not df.empty:
+            df.to_pickle(os.path.join(self.root, f"{symbol}.pkl"))
+        return df
+
+
+class ReplayHistory:
+    """Serve frames recorded by RecordingHistory; fall back to synthetic data."""
+
+    def __init__(self, root: str, fallback=None):
+        self.root = root
+        self.fallback = fallback or SyntheticHistory()
+
+    def __call__(self, symbol: str, period: str = None, start=None):
+        path = os.path.join(self.root, f"{symbol}.pkl")
+        if not os.path.exists(path):
+            return self.fallback(symbol, period=period, start=start)
+        df = pd.read_pickle(path)
+        if start is not None:
+            first = pd.Timestamp(start, tz=df.index.tz)
+        else:
+            first = df.index[-1] - pd.Timedelta(days=_PERIOD_DAYS.get(period, 366))
+        return df[df.index >= first]
+
+
+def record_news(queries, path: str):
+    """Fetch real Google News results for `queries` and save them as JSON."""
+    from news_fetcher import NewsFetcher
+
+    fetcher = NewsFetcher()
+    try:
+        data = {q: items for q, items in fetcher.search(list(queries), limit=100).items()
+                if not isinstance(items, Exception)}
+    finally:
+        fetcher.close()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, default=str)
+
+
+def load_news_replay(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ---------------------------
+# OpenAI-compatible mock
+# ---------------------------
+
+class MockOpenAIServer:
+    """
+    Minimal /v1/chat/completions server on 127.0.0.1.
+    Streams `reply_tokens` tokens at `tokens_per_sec` after `first_token_delay`.
+    Point the OpenAI client at it with OPENAI_BASE_URL=server.base_url.
+    """
+
+    def __init__(self, tokens_per_sec: float = 200.0, reply_tokens: int = 150, first_token_delay: float = 0.3):
+        self.tokens_per_sec = tokens_per_sec
+        self.reply_tokens = reply_tokens
+        self.first_token_delay = first_token_delay
+        self.requests = 0
+        self._httpd = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    @staticmethod
+    def prompt_tokens(body: dict) -> int:
+        """Rough prompt size (~4 chars per token) so traces show real context growth."""
+        return len(json.dumps(body.get("messages", []))) // 4
+
+    def _reply(self):
+        words = ("The", "stock", "moved", "higher", "on", "strong", "volume", "and", "analysts", "remain", "upbeat.")
+        return [words[i % len(words)] + " " for i in range(self.reply_tokens)]
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                server.requests += 1
+                if body.get("stream"):
+                    self._stream(body)
+                else:
+                    self._complete(body)
+
+            def _chunk(self, cid, model, delta, finish=None, usage=None):
+                payload = {
+                    "id": cid,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish}],
+                }
+                if usage:
+                    payload["usage"] = usage
+                data = f"data: {json.dumps(payload)}\n\n".encode()
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def _stream(self, body):
+                cid, model = f"chatcmpl-{uuid.uuid4().hex}", body.get("model", "mock")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                time.sleep(server.first_token_delay)
+                self._chunk(cid, model, {"role": "assistant", "content": ""})
+                interval = 1.0 / server.tokens_per_sec if server.tokens_per_sec else 0.0
+                tokens = server._reply()
+                for tok in tokens:
+                    self._chunk(cid, model, {"content": tok})
+                    if interval:
+                        time.sleep(interval)
+                self._chunk(cid, model, {}, finish="stop")
+                prompt = server.prompt_tokens(body)
+                self._chunk(cid, model, {}, usage={
+                    "prompt_tokens": prompt, "completion_tokens": len(tokens), "total_tokens": prompt + len(tokens),
+                })
+                done = b"data: [DONE]\n\n"
+                self.wfile.write(f"{len(done):x}\r\n".encode() + done + b"\r\n0\r\n\r\n")
+                self.wfile.flush()
+
+            def _complete(self, body):
+                tokens = server._reply()
+                time.sleep(server.first_token_delay + (len(tokens) / server.tokens_per_sec if server.tokens_per_sec else 0))
+                payload = json.dumps({
+                    "id": f"chatcmpl-{uuid.uuid4().hex}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "mock"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "".join(tokens)},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {
+                        "prompt_tokens": server.prompt_tokens(body),
+                        "completion_tokens": len(tokens),
+                        "total_tokens": server.prompt_tokens(body) + len(tokens),
+                    },
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
@@ -0,0 +1,336 @@
+"""
+Offline latency benchmarks for the tools and the full chat path.
+
+    python -m benchmarks.run                      # synthetic data, no network
+    python -m benchmarks.run --replay bench_data  # replay recorded responses
+    python -m benchmarks.run --record bench_data  # record real responses (needs network)
+
+Reports p50 / p95 / mean latency and throughput per case, cold (caches
+cleared before every call) and warm. The warm LLM row clears the answer
+cache before every call, so it times the agents rather than a cached answer. The universe screen is reported as
+"disk": price data already held locally, tool cache cleared per call.
+The fetch scheduler's rate limits are lifted for these cases (every upstream
+is a local fake); the throttled-burst table puts them back against a fake
+Yahoo that rejects requests beyond 5/s.
+"""
+import argparse
+import json
+import math
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fakes import (
+    FakeNewsSource,
+    MockOpenAIServer,
+    RecordingHistory,
+    ReplayHistory,
+    SyntheticHistory,
+    ThrottlingProvider,
+    block_network,
+    load_news_replay,
+    record_news,
+)
+
+NEWS_QUERIES = ["Bitcoin", "NVDA"]
+
+
+# ---------------------------
+# Measurement
+# ---------------------------
+
+def _percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def measure(fn, iterations: int, concurrency: int = 1, reset=None) -> dict:
+    """Time `fn` `iterations` times on `concurrency` threads; `reset` runs before each call."""
+    latencies = []
+
+    def one(_):
+        if reset is not None:
+            reset()
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+
+    fn()  # warm imports / connections outside the timed window
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(iterations)))
+    wall = time.perf_counter() - start
+
+    return {
+        "p50_ms": _percentile(latencies, 0.50) * 1000.0,
+        "p95_ms": _percentile(latencies, 0.95) * 1000.0,
+        "mean_ms": sum(latencies) / len(latencies) * 1000.0,
+        "throughput_per_s": iterations / wall if wall > 0 else float("inf"),
+    }
+
+
+def _consume(stream):
+    for _ in stream:
+        pass
+
+
+# ---------------------------
+# Setup
+# ---------------------------
+
+def _setup(args):
+    """Point every upstream at a local stand-in and import the app modules."""
+    cache_dir = tempfile.mkdtemp(prefix="bench_prices_")
+    os.environ["PRICE_CACHE_DIR"] = cache_dir
+
+    server = MockOpenAIServer(
+        tokens_per_sec=args.tokens_per_sec,
+        reply_tokens=args.reply_tokens,
+        first_token_delay=args.first_token_ms / 1000.0,
+    ).start()
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+
+    import financial_agent
+    import google_news_tool
+    from news_fetcher import news_fetcher
+    from price_store import _yf_fetch, price_store
+
+    price_store.root = cache_dir
+    news = FakeNewsSource(args.news_ms / 1000.0)
+    if args.record:
+        price_store.fetcher = RecordingHistory(_yf_fetch, args.record)
+        record_news(NEWS_QUERIES, os.path.join(args.record, "news.json"))
+    elif args.replay:
+        price_store.fetcher = ReplayHistory(args.replay, SyntheticHistory(args.fetch_ms / 1000.0))
+        news_path = os.path.join(args.replay, "news.json")
+        if os.path.exists(news_path):
+            news.replay = load_news_replay(news_path)
+    else:
+        price_store.fetcher = SyntheticHistory(args.fetch_ms / 1000.0)
+
+    if not args.record:
+        news_fetcher.source = news
+        from fetch_scheduler import scheduler
+
+        for name in scheduler.limits:
+            scheduler.configure(name, rate=0)
+
+    return server, financial_agent, google_news_tool
+
+
+TURN_SYMBOLS = ["AAPL", "MSFT", "GOOG", "NVDA", "AMZN"]
+
+
+def _tool_turn(fa, concurrent: bool):
+    """One model response asking one_year_tool for five tickers, run the way the Finance Agent runs it."""
+    from phi.tools.function import FunctionCall
+
+    model = fa._model("Finance Agent", concurrent_tools=concurrent)
+    calls = [FunctionCall(function=fa.one_year_tool, arguments={"symbol": s}, call_id=f"call_{i}")
+             for i, s in enumerate(TURN_SYMBOLS)]
+    _consume(model.run_function_calls(calls, []))
+
+
+def _cases(fa, gnt):
+    return [
+        ("one_year_tool", lambda: fa.one_year_tool.entrypoint("AAPL")),
+        ("compare_stocks_tool", lambda: fa.compare_stocks_tool.entrypoint("AAPL", "MSFT")),
+        ("ten_year_analysis_tool", lambda: fa.ten_year_analysis_tool.entrypoint("MSFT")),
+        ("multi_horizon_analysis_tool", lambda: fa.multi_horizon_analysis_tool.entrypoint("AAPL,MSFT")),
+        ("compare_multi_stocks_tool", lambda: fa.compare_multi_stocks_tool.entrypoint("AAPL,MSFT,GOOG,NVDA,AMZN")),
+        ("correlation_tool[5]", lambda: fa.correlation_tool.entrypoint("AAPL,MSFT,GOOG,NVDA,AMZN")),
+        ("tool_calls[5, sequential]", lambda: _tool_turn(fa, concurrent=False)),
+        ("tool_calls[5, concurrent]", lambda: _tool_turn(fa, concurrent=True)),
+        ("google_news_tool", lambda: gnt.google_news_tool.entrypoint("Bitcoin")),
+        ("google_news_tool[3 tickers]", lambda: gnt.google_news_tool.entrypoint("AAPL, MSFT, NVDA")),
+        ("run_agent_stream[fast path]", lambda: _consume(fa.run_agent_stream("Give me a 10-year analysis of MSFT."))),
+        ("run_agent_stream[llm]", lambda: _consume(fa.run_agent_stream("What do analysts think about NVDA?"))),
+    ]
+
+
+def _clear_answers():
+    from answer_cache import answer_cache
+
+    answer_cache.clear()
+
+
+# run before every warm call; repeating a question would otherwise be served by the answer cache
+WARM_RESET = {
+    "run_agent_stream[llm]": _clear_answers,
+}
+
+
+SIZE_SYMBOLS = ",".join(f"S{i:02d}" for i in range(50))
+
+
+def output_sizes(fa, gnt) -> dict:
+    """Estimated tokens of each tool's output as the user sees it vs. as the LLM gets it."""
+    import tool_output
+
+    calls = [
+        ("one_year_tool", lambda: fa.one_year_tool.entrypoint("AAPL")),
+        ("compare_stocks_tool", lambda: fa.compare_stocks_tool.entrypoint("AAPL", "MSFT")),
+        ("ten_year_analysis_tool", lambda: fa.ten_year_analysis_tool.entrypoint("MSFT")),
+        ("multi_horizon_analysis_tool", lambda: fa.multi_horizon_analysis_tool.entrypoint("AAPL,MSFT")),
+        ("compare_multi_stocks_tool[5]", lambda: fa.compare_multi_stocks_tool.entrypoint("AAPL,MSFT,GOOG,NVDA,AMZN")),
+        ("compare_multi_stocks_tool[50]", lambda: fa.compare_multi_stocks_tool.entrypoint(SIZE_SYMBOLS)),
+        ("correlation_tool[50]", lambda: fa.correlation_tool.entrypoint(SIZE_SYMBOLS)),
+        ("google_news_tool[3 tickers]", lambda: gnt.google_news_tool.entrypoint("AAPL, MSFT, NVDA")),
+    ]
+    sizes = {}
+    for name, call in calls:
+        markdown = tool_output.estimate_tokens(call())
+        with tool_output.output_mode(tool_output.LLM_OUTPUT_MODE):
+            compact = tool_output.estimate_tokens(call())
+        sizes[name] = {"markdown_tokens": markdown, "llm_tokens": compact}
+    return sizes
+
+
+SCREEN_UNIVERSE = 500
+
+
+def screen_latency(fa, iterations: int) -> dict:
+    """
+    A 500-name watchlist screen once the price data is local (on disk and in
+    the memory column store): the first (untimed) call downloads every name,
+    then each timed call clears the tool cache so the whole load + metrics +
+    top-K pass runs.
+    """
+    import screener
+    from tool_cache import tool_cache
+
+    screener.WATCHLIST_DIR = tempfile.mkdtemp(prefix="bench_universe_")
+    with open(os.path.join(screener.WATCHLIST_DIR, "watchlist.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(f"U{i:03d}" for i in range(SCREEN_UNIVERSE)))
+    return measure(lambda: fa.screen_universe_tool.entrypoint("watchlist.txt", "sharpe", 10, "5y"),
+                   iterations, reset=tool_cache.clear)
+
+
+THROTTLE_SYMBOLS = 30
+THROTTLE_RATE = 5.0
+
+
+def throttled_burst(fa, fetch_ms: float) -> dict:
+    """
+    30 cold symbols requested at once from a fake Yahoo that answers 429
+    beyond THROTTLE_RATE requests/s (burst 5): sent straight through (no
+    limit, no retries) vs. through the fetch scheduler at the same rate.
+    """
+    from fetch_scheduler import scheduler
+    from price_store import price_store
+
+    symbols = [f"T{i:02d}" for i in range(THROTTLE_SYMBOLS)]
+    original, limits, retries = price_store.fetcher, dict(scheduler.limits), scheduler.max_retries
+    out = {}
+    try:
+        for mode, rate, max_retries in (("unscheduled", 0, 0), ("scheduled", THROTTLE_RATE, retries)):
+            _reset_caches()
+            scheduler.reset()
+            scheduler.configure("yahoo", rate=rate, burst=5)
+            scheduler.max_retries = max_retries
+            fake = price_store.fetcher = ThrottlingProvider(SyntheticHistory(fetch_ms / 1000.0),
+                                                            rate=THROTTLE_RATE, burst=5, name="yahoo")
+            t0 = time.perf_counter()
+            _, errors = fa._safe_history_many(symbols, "1y")
+            out[mode] = {
+                "wall_ms": (time.perf_counter() - t0) * 1000.0,
+                "failed": len(errors),
+                "rejected_upstream": fake.rejected,
+                "retries": scheduler.stats()["yahoo"]["retries"],
+            }
+    finally:
+        price_store.fetcher, scheduler.max_retries = original, retries
+        scheduler.limits = limits
+        scheduler.reset()
+        _reset_caches()
+    return out
+
+
+def _reset_caches():
+    from answer_cache import answer_cache
+    from news_fetcher import news_fetcher
+    from price_store import price_store
+    from tool_cache import tool_cache
+
+    answer_cache.clear()
+    tool_cache.clear()
+    news_fetcher.clear()
+    price_store.invalidate()
+
+
+# ---------------------------
+# CLI
+# ---------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline latency benchmarks")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--fetch-ms", type=float, default=150.0, help="simulated yfinance latency")
+    parser.add_argument("--news-ms", type=float, default=300.0, help="simulated Google News latency")
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0, help="mock LLM streaming rate")
+    parser.add_argument("--reply-tokens", type=int, default=150)
+    parser.add_argument("--first-token-ms", type=float, default=300.0)
+    parser.add_argument("--only", default="", help="comma-separated substrings of case names to run")
+    parser.add_argument("--record", metavar="DIR", help="record real upstream responses into DIR")
+    parser.add_argument("--replay", metavar="DIR", help="replay responses recorded into DIR")
+    parser.add_argument("--json", metavar="PATH", help="also write results as JSON")
+    args = parser.parse_args(argv)
+
+    unblock = None if args.record else block_network()
+    server, fa, gnt = _setup(args)
+
+    only = [s.strip() for s in args.only.split(",") if s.strip()]
+    results = {}
+    try:
+        for name, fn in _cases(fa, gnt):
+            if only and not any(s in name for s in only):
+                continue
+            results[name] = {
+                "cold": measure(fn, args.iterations, args.concurrency, reset=_reset_caches),
+                "warm": measure(fn, args.iterations, args.concurrency, reset=WARM_RESET.get(name)),
+            }
+        screen_case = f"screen_universe_tool[{SCREEN_UNIVERSE}]"
+        if not only or any(s in screen_case for s in only):
+            results[screen_case] = {"disk": screen_latency(fa, args.iterations)}
+        throttled = None
+        if not args.record and (not only or any(s in "throttled_burst" for s in only)):
+            throttled = throttled_burst(fa, args.fetch_ms)
+        sizes = output_sizes(fa, gnt)
+    finally:
+        server.stop()
+        if unblock:
+            unblock()
+
+    header = f"{'case':32} {'mode':5} {'p50 ms':>9} {'p95 ms':>9} {'mean ms':>9} {'ops/s':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, modes in results.items():
+        for mode, r in modes.items():
+            print(f"{name:32} {mode:5} {r['p50_ms']:9.1f} {r['p95_ms']:9.1f} {r['mean_ms']:9.1f} {r['throughput_per_s']:9.1f}")
+
+    print()
+    header = f"{'tool output (est. tokens)':32} {'markdown':>9} {'to LLM':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, r in sizes.items():
+        print(f"{name:32} {r['markdown_tokens']:9d} {r['llm_tokens']:9d}")
+
+    if throttled:
+        print()
+        header = f"{f'throttled burst [{THROTTLE_SYMBOLS} symbols]':32} {'wall ms':>9} {'failed':>9} {'429s':>9} {'retries':>9}"
+        print(header)
+        print("-" * len(header))
+        for mode, r in throttled.items():
+            print(f"{mode:32} {r['wall_ms']:9.1f} {r['failed']:9d} {r['rejected_upstream']:9d} {r['retries']:9d}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"latency": results, "output_tokens": sizes, "throttled_burst": throttled}, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
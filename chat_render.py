@@ -0,0 +1,129 @@
+import hashlib
+import time
+import uuid
+
+import markdown2
+
+
+# ------------------------------------------------------
+# SETTINGS
+# ------------------------------------------------------
+FRAME_INTERVAL = 0.075   # seconds between repaints while streaming (~13 fps)
+TYPING_STEP = 8          # characters revealed per frame when the typing effect is on
+TYPING_DELAY = 0.01      # seconds per typing frame
+CURSOR = "▌"
+HISTORY_PAGE = 20        # bubbles emitted per page of chat history
+MAX_CACHED_HTML = 200    # rendered bubbles kept in memory (least recently shown dropped)
+
+
+# ------------------------------------------------------
+# BUBBLE MARKUP
+# ------------------------------------------------------
+def bubble_html(role: str, html_text: str) -> str:
+    if role == "assistant":
+        bubble = "bot-bubble"
+        emoji = "🤖"
+    else:
+        bubble = "user-bubble"
+        emoji = "👤"
+
+    return f"""
+        <div class="chat-bubble {bubble}">
+            <div class="emoji">{emoji}</div>
+            <div class="bubble-text">{html_text}</div>
+        </div>
+        """
+
+
+# ------------------------------------------------------
+# MEMOIZED HISTORY
+# ------------------------------------------------------
+def new_message(role: str, content: str) -> dict:
+    """Chat message with a stable id so its rendered HTML can be cached."""
+    return {"id": uuid.uuid4().hex, "role": role, "content": content}
+
+
+def message_html(msg: dict, cache: dict, limit: int = MAX_CACHED_HTML) -> str:
+    """
+    Bubble HTML for one message, cached per message id and content hash.
+    Markdown is only converted again if the message content changes.
+    The cache keeps the `limit` most recently shown bubbles; older pages are
+    simply converted again when scrolled back to.
+    """
+    msg_id = msg.setdefault("id", uuid.uuid4().hex)
+    digest = hashlib.sha1(msg["content"].encode("utf-8")).hexdigest()
+
+    hit = cache.pop(msg_id, None)
+    if hit and hit[0] == digest:
+        cache[msg_id] = hit  # most recently shown last
+        return hit[1]
+
+    html = bubble_html(msg["role"], markdown2.markdown(msg["content"]))
+    cache[msg_id] = (digest, html)
+    while len(cache) > limit:
+        del cache[next(iter(cache))]
+    return html
+
+
+def history_html(messages: list, cache: dict, shown: int) -> str:
+    """Concatenated HTML of the last `shown` messages."""
+    return "".join(message_html(m, cache) for m in messages[-shown:])
+
+
+# ------------------------------------------------------
+# STREAMING RENDERER
+# ------------------------------------------------------
+class StreamRenderer:
+    """
+    Collects streamed chunks and repaints the bot bubble at a capped frame rate.
+
+    Markdown is converted incrementally: blocks that are already closed by a
+    blank line (outside a code fence) are converted once and kept as HTML;
+    each repaint only converts the still-growing tail. `finish()` does one
+    full conversion so the final bubble is exactly what markdown2 produces.
+    """
+
+    def __init__(self, paint, frame_interval: float = FRAME_INTERVAL, typing: bool = False):
+        self.paint = paint
+        self.frame_interval = frame_interval
+        self.typing = typing
+        self.text = ""
+        self._stable_len = 0
+        self._stable_html = ""
+        self._last_paint = 0.0
+
+    def append(self, chunk: str):
+        if not chunk:
+            return
+        if not self.typing:
+            self.text += chunk
+            if time.monotonic() - self._last_paint >= self.frame_interval:
+                self._repaint()
+            return
+
+        # optional typing effect: reveal the chunk a few characters per frame
+        for i in range(0, len(chunk), TYPING_STEP):
+            self.text += chunk[i:i + TYPING_STEP]
+            self._repaint()
+            time.sleep(TYPING_DELAY)
+
+    def finish(self) -> str:
+        self.paint(bubble_html("assistant", markdown2.markdown(self.text)))
+        return self.text
+
+    def _commit_stable_blocks(self):
+        cut = self.text.rfind("\n\n")
+        if cut <= self._stable_len:
+            return
+        # an odd number of fences means the cut falls inside a code block
+        if self.text.count("```", 0, cut) % 2:
+            return
+        self._stable_html += markdown2.markdown(self.text[self._stable_len:cut])
+        self._stable_len = cut
+
+    def _repaint(self):
+        self._commit_stable_blocks()
+        tail = self.text[self._stable_len:]
+        html_text = self._stable_html + markdown2.markdown(tail + CURSOR)
+        self.paint(bubble_html("assistant", html_text))
+        self._last_paint = time.monotonic()
@@ -0,0 +1,196 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+# ---------------------------
+# Settings
+# ---------------------------
+
+MEMORY_BUDGET_MB = float(os.getenv("PRICE_MEMORY_MB", "256"))     # resident Close data, all symbols
+PRICE_DTYPE = os.getenv("PRICE_DTYPE", "float64")                 # "float64" | "float32" (half the memory)
+
+
+class _Column:
+    __slots__ = ("start", "values", "fetched_at", "covered_from")
+
+    def __init__(self, start, values, fetched_at, covered_from):
+        self.start = start                # position of values[0] on the shared axis
+        self.values = values
+        self.fetched_at = fetched_at
+        self.covered_from = covered_from
+
+
+# ---------------------------
+# Columnar in-memory store
+# ---------------------------
+
+class ColumnStore:
+    """
+    Close prices of many symbols kept in memory as one contiguous typed array
+    per symbol, all positioned on a single shared date axis.
+
+    - only Close is kept, as `dtype` (float64 by default, a sixth of a full
+      yfinance frame per symbol; float32 halves that at reduced precision)
+    - `get()` returns zero-copy views of the axis and the values
+    - the total (axis included) stays within `budget_bytes`; the least
+      recently used symbols are evicted first
+    - dates missing for one symbol but present on the axis are NaN
+
+    The axis normally only grows at the end (today's bar); a date inserted
+    in the middle (e.g. a weekend bar of a crypto pair) re-positions every
+    column once.
+    """
+
+    def __init__(self, budget_bytes: int = int(MEMORY_BUDGET_MB * 2**20), dtype=PRICE_DTYPE):
+        self.budget_bytes = budget_bytes
+        self.dtype = np.dtype(dtype)
+        self._axis = np.empty(0, dtype="datetime64[ns]")
+        self._cols = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ---- axis ----
+
+    def _merge_axis(self, days: np.ndarray):
+        """Add `days` to the axis; re-position columns only if a date lands inside it."""
+        if self._axis.size and days[0] > self._axis[-1]:
+            self._axis = np.concatenate([self._axis, days])
+            return
+        fresh = np.setdiff1d(days, self._axis, assume_unique=True)
+        if not fresh.size:
+            return
+        if self._axis.size and fresh[0] > self._axis[-1]:
+            self._axis = np.concatenate([self._axis, fresh])
+            return
+
+        old_axis, self._axis = self._axis, np.union1d(self._axis, fresh)
+        for col in self._cols.values():
+            old_pos = np.arange(col.start, col.start + col.values.size)
+            new_pos = np.searchsorted(self._axis, old_axis[old_pos])
+            values = np.full(new_pos[-1] - new_pos[0] + 1, np.nan, dtype=self.dtype)
+            values[new_pos - new_pos[0]] = col.values
+            self._bytes += values.nbytes - col.values.nbytes
+            col.start, col.values = int(new_pos[0]), values
+
+    # ---- public API ----
+
+    def put(self, symbol: str, days, values, fetched_at=None, covered_from=None):
+        """
+        Store one symbol's closes. `days` are sorted trading dates (anything
+        numpy turns into datetime64), `values` the matching closes.
+        `fetched_at` / `covered_from` are kept for the caller's freshness checks.
+        """
+        days = np.asarray(days, dtype="datetime64[ns]")
+        if not days.size:
+            return
+        with self._lock:
+            self._merge_axis(np.unique(days))
+            pos = np.searchsorted(self._axis, days)
+            col_values = np.full(pos[-1] - pos[0] + 1, np.nan, dtype=self.dtype)
+            col_values[pos - pos[0]] = values
+
+            old = self._cols.pop(symbol, None)
+            if old is not None:
+                self._bytes -= old.values.nbytes
+            self._cols[symbol] = _Column(int(pos[0]), col_values, fetched_at, covered_from)
+            self._bytes += col_values.nbytes
+            self._evict(keep=symbol)
+
+    def get(self, symbol: str, start=None):
+        """
+        (days, values, fetched_at, covered_from) for `symbol` from `start`
+        on, or None. `days` and `values` are read-only views, no copies.
+        """
+        with self._lock:
+            col = self._cols.get(symbol)
+            if col is None:
+                self.misses += 1
+                return None
+            self._cols.move_to_end(symbol)
+            self.hits += 1
+            end = col.start + col.values.size
+            first = col.start
+            if start is not None:
+                first = max(first, int(np.searchsorted(self._axis, pd.Timestamp(start).as_unit("ns").to_datetime64())))
+            days = self._axis[first:end]
+            values = col.values[first - col.start:]
+        days.flags.writeable = False
+        values.flags.writeable = False
+        return days, values, col.fetched_at, col.covered_from
+
+    def _evict(self, keep=None):
+        while self._bytes + self._axis.nbytes > self.budget_bytes and len(self._cols) > 1:
+            symbol, col = next(iter(self._cols.items()))
+            if symbol == keep:
+                self._cols.move_to_end(symbol)
+                continue
+            del self._cols[symbol]
+            self._bytes -= col.values.nbytes
+            self.evictions += 1
+
+    def drop(self, symbol: str = None):
+        """Forget one symbol, or everything when none is given."""
+        with self._lock:
+            if symbol is None:
+                self._cols.clear()
+                self._axis = self._axis[:0]
+                self._bytes = 0
+                return
+            col = self._cols.pop(symbol, None)
+            if col is not None:
+                self._bytes -= col.values.nbytes
+
+    def __contains__(self, symbol: str) -> bool:
+        with self._lock:
+            return symbol in self._cols
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "symbols": len(self._cols),
+                "axis_days": int(self._axis.size),
+                "bytes": int(self._bytes + self._axis.nbytes),
+                "budget_bytes": self.budget_bytes,
+                "dtype": self.dtype.name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# ---------------------------
+# Price matrix from columns
+# ---------------------------
+
+def align(columns: dict) -> pd.DataFrame:
+    """
+    {symbol: (days, values)} → date x symbol DataFrame on the union of
+    dates, rows with no price at all dropped. A single gap-free column is
+    wrapped without copying.
+    """
+    if not columns:
+        return pd.DataFrame()
+    if len(columns) == 1:
+        (symbol, (days, values)), = columns.items()
+        present = ~np.isnan(values)
+        if not present.all():
+            days, values = days[present], values[present]
+        return pd.DataFrame(values[:, None], index=pd.DatetimeIndex(days, name="Date"),
+                            columns=[symbol], copy=False)
+
+    axis = np.unique(np.concatenate([days for days, _ in columns.values()]))
+    dtype = np.result_type(*(values.dtype for _, values in columns.values()))
+    matrix = np.full((axis.size, len(columns)), np.nan, dtype=dtype)
+    for j, (days, values) in enumerate(columns.values()):
+        matrix[np.searchsorted(axis, days), j] = values
+    keep = ~np.isnan(matrix).all(axis=1)
+    if not keep.all():
+        axis, matrix = axis[keep], matrix[keep]
+    return pd.DataFrame(matrix, index=pd.DatetimeIndex(axis, name="Date"), columns=list(columns), copy=False)
@@ -0,0 +1,186 @@
+import os
+import re
+import threading
+from collections import OrderedDict, deque
+
+import router
+from tool_output import estimate_tokens, fit
+
+
+# ---------------------------
+# Settings
+# ---------------------------
+
+CONTEXT_TURNS = int(os.getenv("CONTEXT_TURNS", "4"))                     # recent turns kept verbatim
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))    # context added per turn
+SUMMARY_TOKENS = 400      # rolling summary cap
+MAX_TICKERS = 20
+MAX_FACTS = 16
+FACTS_PER_TURN = 6
+
+_MARKDOWN = re.compile(r"[#*_`>|]+")
+_LINK = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_FIGURE = re.compile(r"[-+]?\$?\d[\d,]*(?:\.\d+)?\s*%?")
+_SENTENCE = re.compile(r"(?<=[.!?])\s")
+
+
+def _plain(text: str) -> str:
+    """Markdown → one line of plain text."""
+    text = _LINK.sub(r"\1", text or "")
+    return " ".join(_MARKDOWN.sub(" ", text).split())
+
+
+def _gist(answer: str, limit: int = 200) -> str:
+    """First substantive sentence of an answer (headings and rules skipped)."""
+    for line in (answer or "").splitlines():
+        line = line.strip()
+        if not line or line.startswith("#") or set(line) <= set("-=*_ "):
+            continue
+        sentence = _SENTENCE.split(_plain(line), 1)[0]
+        return sentence[:limit]
+    return ""
+
+
+# ---------------------------
+# Per-session context
+# ---------------------------
+
+class ConversationContext:
+    """
+    Bounded memory of one chat session, rendered into each new prompt:
+
+    - the last `keep_turns` turns verbatim
+    - older turns folded into a short rolling summary (no LLM call)
+    - tickers mentioned so far, most recent first
+    - key figures (lines with a tracked ticker and a $ / % number) from answers
+
+    `prompt(message)` never adds more than `budget` tokens of context; when it
+    would, the oldest verbatim turns are folded first, then the summary and
+    facts are trimmed.
+    """
+
+    def __init__(self, keep_turns: int = CONTEXT_TURNS, budget: int = CONTEXT_TOKEN_BUDGET):
+        self.keep_turns = keep_turns
+        self.budget = budget
+        self.turns = deque()
+        self.summary = []
+        self.tickers = OrderedDict()
+        self.facts = OrderedDict()
+        self._lock = threading.Lock()
+
+    # ---- updating ----
+
+    def add_turn(self, user: str, assistant: str):
+        with self._lock:
+            for sym in router.extract_symbols(user):
+                self.tickers[sym] = True
+                self.tickers.move_to_end(sym, last=False)
+            while len(self.tickers) > MAX_TICKERS:
+                self.tickers.popitem()
+
+            self._remember_facts(assistant, router.extract_symbols(user))
+            self.turns.append((user, assistant))
+            while len(self.turns) > self.keep_turns:
+                self._fold(self.turns.popleft())
+
+    def _remember_facts(self, answer: str, symbols):
+        """
+        Keep lines of `answer` that carry a $ / % figure for a tracked ticker.
+        A figure line without a ticker belongs to the last ticker named above
+        it (e.g. "CAGR: 7.5%" under "10-Year Analysis — MSFT").
+        """
+        current = symbols[0] if len(symbols) == 1 else None
+        kept = 0
+        for line in (answer or "").splitlines():
+            text = _plain(line)
+            syms = [s for s in router.extract_symbols(text) if s in self.tickers]
+            if len(syms) == 1:
+                current = syms[0]
+            if not ("%" in text or "$" in text) or not _FIGURE.search(text):
+                continue
+            if not syms:
+                if current is None:
+                    continue
+                text = f"{current}: {text}"
+            key = text[:60].casefold()
+            self.facts[key] = text[:160]
+            self.facts.move_to_end(key)
+            kept += 1
+            if kept >= FACTS_PER_TURN:
+                break
+        while len(self.facts) > MAX_FACTS:
+            self.facts.popitem(last=False)
+
+    def _fold(self, turn):
+        user, assistant = turn
+        line = f"- Q: {_plain(user)[:150]}"
+        gist = _gist(assistant)
+        if gist:
+            line += f" → A: {gist}"
+        self.summary.append(line)
+        while len(self.summary) > 1 and estimate_tokens("\n".join(self.summary)) > SUMMARY_TOKENS:
+            self.summary.pop(0)
+
+    def clear(self):
+        with self._lock:
+            self.turns.clear()
+            self.summary.clear()
+            self.tickers.clear()
+            self.facts.clear()
+
+    # ---- rendering ----
+
+    def _render(self, turn_budget: int = None) -> str:
+        parts = []
+        if self.summary:
+            parts.append("Earlier in this conversation:\n" + "\n".join(self.summary))
+        if self.tickers:
+            parts.append("Tickers discussed: " + ", ".join(self.tickers))
+        if self.facts:
+            parts.append("Known figures:\n" + "\n".join(f"- {f}" for f in self.facts.values()))
+        if self.turns:
+            recent = []
+            for user, assistant in self.turns:
+                answer = fit(assistant, turn_budget) if turn_budget else assistant
+                recent.append(f"User: {user}\nAssistant: {answer}")
+            parts.append("Recent turns:\n" + "\n\n".join(recent))
+        return "\n\n".join(parts)
+
+    def render(self) -> str:
+        """Context block within `budget` tokens ("" for a new conversation)."""
+        with self._lock:
+            text = self._render()
+            while estimate_tokens(text) > self.budget and len(self.turns) > 1:
+                self._fold(self.turns.popleft())
+                text = self._render()
+            if estimate_tokens(text) > self.budget and self.turns:
+                # one long answer left: keep it, shortened
+                text = self._render(turn_budget=self.budget // 2)
+            while estimate_tokens(text) > self.budget and (self.summary or self.facts):
+                if self.summary:
+                    self.summary.pop(0)
+                else:
+                    self.facts.popitem(last=False)
+                text = self._render(turn_budget=self.budget // 2)
+            return fit(text, self.budget)
+
+    def prompt(self, message: str, context: str = None) -> str:
+        """`message` prefixed with the bounded context of this session (`context`: an already rendered one)."""
+        context = self.render() if context is None else context
+        if not context:
+            return message
+        return (
+            "Conversation context (for resolving follow-up questions):\n"
+            f"{context}\n\n---\n\nCurrent question: {message}"
+        )
+
+    def stats(self) -> dict:
+        context_tokens = estimate_tokens(self.render())
+        with self._lock:
+            return {
+                "turns": len(self.turns),
+                "summary_lines": len(self.summary),
+                "tickers": list(self.tickers),
+                "facts": len(self.facts),
+                "context_tokens": context_tokens,
+            }
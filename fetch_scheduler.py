@@ -0,0 +1,443 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import wraps
+
+import tracing
+from tool_cache import ToolCache, _normalize
+
+
+# ---------------------------
+# Settings
+# ---------------------------
+
+# provider → (requests per second, burst); a rate of 0 means unlimited
+PROVIDER_LIMITS = {
+    "yahoo": (float(os.getenv("YAHOO_RATE", "4")), int(os.getenv("YAHOO_BURST", "10"))),
+    "google_news": (float(os.getenv("GOOGLE_NEWS_RATE", "5")), int(os.getenv("GOOGLE_NEWS_BURST", "10"))),
+    "duckduckgo": (float(os.getenv("DUCKDUCKGO_RATE", "1")), int(os.getenv("DUCKDUCKGO_BURST", "3"))),
+}
+
+MAX_RETRIES = int(os.getenv("FETCH_RETRIES", "3"))
+BACKOFF_BASE = 0.5           # seconds before the first retry (doubles every attempt, jittered)
+BACKOFF_MAX = 8.0
+REJECT_COOLDOWN = 30.0       # seconds a provider counts as rejecting us after a throttle error
+STALE_TTL = 24 * 3600        # how long a last good result may be served while a provider rejects us
+REVALIDATE_WORKERS = 2
+
+# lower runs first
+INTERACTIVE = 0
+BACKGROUND = 10
+
+_priority = contextvars.ContextVar("fetch_priority", default=INTERACTIVE)
+_flight = contextvars.ContextVar("fetch_flight", default=None)
+
+logger = logging.getLogger("agentic.fetch")
+
+
+# ---------------------------
+# Error classification
+# ---------------------------
+
+_THROTTLE_WORDS = ("too many requests", "rate limit", "ratelimit", "rate-limit", "429")
+
+
+def _status(e: BaseException):
+    response = getattr(e, "response", None)
+    return getattr(response, "status_code", None) or getattr(e, "status_code", None)
+
+
+def is_throttle(e: BaseException) -> bool:
+    """The provider is refusing us (HTTP 429 / 503, yfinance or DDG rate-limit errors)."""
+    if _status(e) in (429, 503):
+        return True
+    text = f"{type(e).__name__} {e}".lower()
+    return any(w in text for w in _THROTTLE_WORDS)
+
+
+def is_retryable(e: BaseException) -> bool:
+    """Throttling, timeouts and dropped connections; not bad symbols or parse errors."""
+    if is_throttle(e):
+        return True
+    if isinstance(e, (ConnectionError, TimeoutError)):
+        return True
+    status = _status(e)
+    if status is not None:
+        return status >= 500
+    return type(e).__name__ in ("ConnectError", "ReadError", "ReadTimeout", "ConnectTimeout",
+                                "RemoteProtocolError", "PoolTimeout", "TimeoutException")
+
+
+def backoff(attempt: int) -> float:
+    """Jittered exponential delay before retry `attempt` (0-based): uniform in [d/2, d]."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+    return random.uniform(delay / 2, delay)
+
+
+# ---------------------------
+# Token bucket + priority queue per provider
+# ---------------------------
+
+class _Provider:
+    """
+    Token bucket (`rate` per second, up to `burst` at once) with a priority
+    queue of waiters: a free token always goes to the highest-priority,
+    then oldest, request.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int):
+        self.name = name
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.rejected_until = 0.0
+        self._queue = []                    # (priority, seq, Future)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._timer = None
+        self.granted = 0
+        self.retries = 0
+        self.throttled = 0
+        self.stale = 0
+
+    def _refill(self, now):
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def request(self, priority: int) -> Future:
+        """A Future resolved when this request may go upstream."""
+        fut = Future()
+        with self._lock:
+            heapq.heappush(self._queue, (priority, next(self._seq), fut))
+        self._pump()
+        return fut
+
+    def promote(self, fut: Future, priority: int):
+        """Queue a waiting request again at `priority` (its older entry is skipped once granted)."""
+        with self._lock:
+            if fut.done():
+                return
+            heapq.heappush(self._queue, (priority, next(self._seq), fut))
+        self._pump()
+
+    def _pump(self, from_timer: bool = False):
+        with self._lock:
+            if from_timer:
+                self._timer = None
+            now = time.monotonic()
+            self._refill(now)
+            while self._queue and (self.rate <= 0 or self.tokens >= 1.0):
+                _, _, fut = heapq.heappop(self._queue)
+                if fut.done() or not fut.set_running_or_notify_cancel():
+                    continue  # promoted and already granted, or the caller gave up while queued
+                if self.rate > 0:
+                    self.tokens -= 1.0
+                self.granted += 1
+                fut.set_result(None)
+            if self._queue and self._timer is None:
+                timer = threading.Timer((1.0 - self.tokens) / self.rate, self._pump, kwargs={"from_timer": True})
+                timer.daemon = True
+                self._timer = timer
+                timer.start()
+
+    def reject(self):
+        """Note a throttle response: drain the bucket and start the cooldown."""
+        with self._lock:
+            self.throttled += 1
+            self.tokens = 0.0
+            self.updated = time.monotonic()
+            self.rejected_until = self.updated + REJECT_COOLDOWN
+
+    def rejecting(self) -> bool:
+        return time.monotonic() < self.rejected_until
+
+    def configure(self, rate: float = None, burst: int = None):
+        with self._lock:
+            if rate is not None:
+                self.rate = rate
+            if burst is not None:
+                self.burst = max(1, burst)
+                self.tokens = min(self.tokens, self.burst)
+        self._pump()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rate": self.rate,
+                "burst": self.burst,
+                "queued": len({id(fut) for _, _, fut in self._queue if not fut.done()}),
+                "granted": self.granted,
+                "retries": self.retries,
+                "throttled": self.throttled,
+                "stale_served": self.stale,
+                "rejecting": self.rejecting(),
+            }
+
+
+# ---------------------------
+# Shared flights
+# ---------------------------
+
+class FlightPriority:
+    """
+    Priority of one upstream fetch shared by several callers (a SingleFlight
+    call, an in-flight news task). It starts at the leader's priority and is
+    raised as soon as a more urgent caller `join()`s: requests the flight
+    has waiting for a token are queued again at the new priority, so a chat
+    turn that joins a background refresh never waits behind other
+    background work. Flights started inside a flight follow it.
+    """
+
+    def __init__(self):
+        parent = _flight.get()
+        self.priority = _current_priority()
+        self._waiting = []                  # (provider, Future) not granted yet
+        self._children = []
+        self._lock = threading.Lock()
+        if parent is not None:
+            with parent._lock:
+                parent._children.append(self)
+
+    @contextmanager
+    def lead(self):
+        """Upstream calls made inside the block (the flight's own work) use this priority."""
+        token = _flight.set(self)
+        try:
+            yield self
+        finally:
+            _flight.reset(token)
+
+    def join(self, priority: int = None):
+        """A caller now waits on this flight: raise it to the caller's priority."""
+        priority = _current_priority() if priority is None else priority
+        with self._lock:
+            if priority >= self.priority:
+                return
+            self.priority = priority
+            waiting, children = list(self._waiting), list(self._children)
+        for p, fut in waiting:
+            p.promote(fut, priority)
+        for child in children:
+            child.join(priority)
+
+    def request(self, p: "_Provider") -> Future:
+        with self._lock:
+            fut = p.request(self.priority)
+            self._waiting.append((p, fut))
+        fut.add_done_callback(self._granted)
+        return fut
+
+    def _granted(self, fut: Future):
+        with self._lock:
+            self._waiting = [w for w in self._waiting if w[1] is not fut]
+
+
+def _current_priority() -> int:
+    flight = _flight.get()
+    return flight.priority if flight is not None else _priority.get()
+
+
+def _request(p: "_Provider") -> Future:
+    flight = _flight.get()
+    return flight.request(p) if flight is not None else p.request(_priority.get())
+
+
+# ---------------------------
+# Scheduler
+# ---------------------------
+
+class FetchScheduler:
+    """
+    Single gate for every upstream call (Yahoo, Google News, DuckDuckGo).
+
+    - per-provider token bucket; requests wait in a priority queue, so
+      interactive calls go ahead of background refreshes (`background()`),
+      and shared flights run at their most urgent caller's priority
+      (`FlightPriority`)
+    - timeouts and dropped connections are retried up to `max_retries` times
+      with jittered exponential backoff, each attempt taking a token
+    - a throttle response empties the provider's bucket and marks it as
+      rejecting for REJECT_COOLDOWN seconds; nothing is retried during the
+      cooldown (that would only extend it), so callers holding older data
+      serve it and `revalidate()` in the background, the others fail fast
+
+    `call()` blocks the calling thread; `acall()` awaits a coroutine function.
+    """
+
+    def __init__(self, limits: dict = PROVIDER_LIMITS, max_retries: int = MAX_RETRIES):
+        self.limits = dict(limits)
+        self.max_retries = max_retries
+        self._providers = {name: _Provider(name, rate, burst) for name, (rate, burst) in limits.items()}
+        self._revalidating = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=REVALIDATE_WORKERS, thread_name_prefix="revalidate")
+
+    def provider(self, name: str) -> _Provider:
+        p = self._providers.get(name)
+        if p is None:
+            p = self._providers.setdefault(name, _Provider(name, 0, 1))
+        return p
+
+    # ---- priority ----
+
+    @staticmethod
+    @contextmanager
+    def background():
+        """Mark upstream calls made inside the block (and tasks / bound threads it starts) as background."""
+        token = _priority.set(BACKGROUND)
+        try:
+            yield
+        finally:
+            _priority.reset(token)
+
+    @staticmethod
+    def is_background() -> bool:
+        return _priority.get() >= BACKGROUND
+
+    # ---- calls ----
+
+    def _failed(self, p: _Provider, e: BaseException, attempt: int) -> bool:
+        """Record a failure; True if it should be retried."""
+        if is_throttle(e):
+            p.reject()
+        if attempt >= self.max_retries or not is_retryable(e) or p.rejecting():
+            return False
+        with p._lock:
+            p.retries += 1
+        tracing.annotate(**{f"retries_{p.name}": attempt + 1})
+        return True
+
+    @staticmethod
+    def _waited(queued: float):
+        waited = time.perf_counter() - queued
+        if waited >= 0.001:
+            tracing.annotate(queued_ms=round(waited * 1000.0, 1))
+
+    def call(self, name: str, fn, *args, **kwargs):
+        """Run the blocking `fn` against provider `name` under its limits, with retries."""
+        p = self.provider(name)
+        for attempt in range(self.max_retries + 1):
+            queued = time.perf_counter()
+            _request(p).result()
+            self._waited(queued)
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if not self._failed(p, e, attempt):
+                    raise
+                delay = backoff(attempt)
+                logger.info("%s retry %d in %.2fs: %s", name, attempt + 1, delay, e)
+                time.sleep(delay)
+
+    async def acall(self, name: str, fn, *args, **kwargs):
+        """Await the coroutine function `fn` against provider `name` under its limits, with retries."""
+        p = self.provider(name)
+        for attempt in range(self.max_retries + 1):
+            queued = time.perf_counter()
+            grant = _request(p)
+            try:
+                await asyncio.wrap_future(grant)
+            except asyncio.CancelledError:
+                grant.cancel()
+                raise
+            self._waited(queued)
+            try:
+                return await fn(*args, **kwargs)
+            except Exception as e:
+                if not self._failed(p, e, attempt):
+                    raise
+                delay = backoff(attempt)
+                logger.info("%s retry %d in %.2fs: %s", name, attempt + 1, delay, e)
+                await asyncio.sleep(delay)
+
+    # ---- stale-while-revalidate ----
+
+    def rejecting(self, name: str) -> bool:
+        """True while provider `name` is in its throttle cooldown."""
+        return self.provider(name).rejecting()
+
+    def served_stale(self, name: str):
+        p = self.provider(name)
+        with p._lock:
+            p.stale += 1
+        tracing.annotate(**{f"stale_{name}": True})
+
+    def revalidate(self, key, fn, *args, **kwargs):
+        """Run `fn` once in the background for `key` (deduplicated), errors logged."""
+        with self._lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+
+        def run():
+            try:
+                with self.background():
+                    fn(*args, **kwargs)
+            except Exception as e:
+                logger.info("revalidate %s failed: %s", key, e)
+            finally:
+                with self._lock:
+                    self._revalidating.discard(key)
+
+        self._pool.submit(run)
+
+    # ---- admin ----
+
+    def configure(self, name: str, rate: float = None, burst: int = None):
+        """Change a provider's limits at runtime (rate 0: unlimited)."""
+        p = self.provider(name)
+        p.configure(rate, burst)
+        self.limits[name] = (p.rate, p.burst)
+
+    def reset(self):
+        """Back to the configured limits with full buckets, no cooldowns and zeroed counters."""
+        self._providers = {name: _Provider(name, rate, burst) for name, (rate, burst) in self.limits.items()}
+
+    def stats(self) -> dict:
+        return {name: p.stats() for name, p in self._providers.items()}
+
+
+# Shared scheduler for every upstream call
+scheduler = FetchScheduler()
+
+
+def schedule_toolkit(toolkit, provider: str, stale_ttl: float = STALE_TTL):
+    """
+    Route every function of a phi Toolkit (e.g. DuckDuckGo) through the
+    scheduler. The last good result per arguments is kept for `stale_ttl`
+    and returned when the provider keeps rejecting us; wrap the result
+    with `cache_toolkit` afterwards so cache hits skip the queue.
+    """
+    last_good = ToolCache(maxsize=256)
+
+    def wrap(fn, name):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (name, _normalize(args), _normalize(kwargs))
+            try:
+                result = scheduler.call(provider, fn, *args, **kwargs)
+            except Exception as e:
+                found, stale = last_good.get(key)
+                if not found or not is_retryable(e):
+                    raise
+                scheduler.served_stale(provider)
+                scheduler.revalidate(key, wrapper, *args, **kwargs)
+                return stale
+            last_good.set(key, result, stale_ttl)
+            return result
+        return wrapper
+
+    for fn in toolkit.functions.values():
+        if fn.entrypoint is not None:
+            fn.entrypoint = wrap(fn.entrypoint, f"{toolkit.name}.{fn.name}")
+    return toolkit
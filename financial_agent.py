@@ -6,13 +6,32 @@ from phi.tools.duckduckgo import DuckDuckGo
 from google_news_tool import google_news_tool
 
 from phi.tools import tool
+from phi.tools.function import FunctionCall, ToolCallException
+from phi.model.response import ModelResponseEvent
+from pydantic import PrivateAttr
 from dotenv import load_dotenv
-import yfinance as yf
 import pandas as pd
-import math
+import numpy as np
 import traceback
-from GoogleNews import GoogleNews
-from phi.tools import tool
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from openai import OpenAI
+from price_store import MARKET_TZ, price_store
+from column_store import align
+from fetch_scheduler import schedule_toolkit
+from prefetcher import prefetcher
+import analytics
+import router
+import screener
+import tool_output
+import tracing
+from agent_pool import AgentPool, clear_memory
+from answer_cache import answer_cache
+from tool_output import YAHOO_QUOTE
+from tool_cache import LONG_TERM_TTL, NEWS_TTL, QUOTE_TTL, cache_toolkit, cached
 
 load_dotenv()
 
@@ -22,14 +41,17 @@ load_dotenv()
 # ---------------------------
 
 def _safe_history(symbol: str, period: str = "1y"):
-    """Fetch historical dataframe safely; raises ValueError on failure."""
+    """
+    Fetch historical dataframe safely; raises ValueError on failure.
+    Served from the on-disk price store, which only downloads missing bars.
+    """
     symbol = (symbol or "").upper().strip()
     if not symbol:
         raise ValueError("Empty symbol provided")
 
     try:
-        ticker = yf.Ticker(symbol)
-        df = ticker.history(period=period)
+        with tracing.span("history", kind="fetch", symbol=symbol, period=period):
+            df = price_store.history(symbol, period=period)
     except Exception as e:
         raise ValueError(f"yfinance error for {symbol}: {e}")
 
@@ -38,16 +60,79 @@ def _safe_history(symbol: str, period: str = "1y"):
 
     return df
 
-def _cagr(start_price: float, end_price: float, years: float):
-    if start_price <= 0 or years <= 0:
-        return float("nan")
-    return ((end_price / start_price) ** (1.0 / years) - 1.0) * 100.0
+def _running_metrics(symbol: str, period: str = "10y"):
+    """Incremental metrics state of one symbol from the price store; raises ValueError on failure."""
+    symbol = (symbol or "").upper().strip()
+    if not symbol:
+        raise ValueError("Empty symbol provided")
+
+    try:
+        with tracing.span("metrics", kind="fetch", symbol=symbol, period=period):
+            state = price_store.metrics(symbol, period=period)
+    except Exception as e:
+        raise ValueError(f"yfinance error for {symbol}: {e}")
+
+    if state is None or state.last_date is None:
+        raise ValueError(f"No historical data available for {symbol} (period={period})")
+
+    prefetcher.note_metrics(symbol, period)  # only symbols known to exist
+    return state
+
+def _safe_closes(symbol: str, period: str = "1y"):
+    """
+    (trading dates, Close) views from the in-memory column store, which
+    loads through the same path as `_safe_history`; raises ValueError on failure.
+    """
+    symbol = (symbol or "").upper().strip()
+    if not symbol:
+        raise ValueError("Empty symbol provided")
+
+    try:
+        with tracing.span("history", kind="fetch", symbol=symbol, period=period):
+            data = price_store.closes(symbol, period=period)
+    except Exception as e:
+        raise ValueError(f"yfinance error for {symbol}: {e}")
+
+    if data is None or not len(data[0]):
+        raise ValueError(f"No historical data available for {symbol} (period={period})")
+
+    return data
 
-def _max_drawdown(series: pd.Series):
-    # series expected to be price series
-    roll_max = series.cummax()
-    drawdown = (series - roll_max) / roll_max
-    return drawdown.min() * 100.0  # as percentage (negative value)
+# Upper bound on concurrent upstream fetches for one multi-symbol request
+MAX_FETCH_WORKERS = 8
+
+def _safe_history_many(symbols, period: str = "1y"):
+    """
+    Fetch Close prices for several symbols concurrently (bounded thread pool).
+    Returns (prices, errors):
+     - prices: DataFrame indexed by date, one column per symbol that loaded
+     - errors: {symbol: message} for the symbols that failed
+    """
+    symbols = list(dict.fromkeys(str(s).upper().strip() for s in symbols if str(s).strip()))
+    closes, errors = {}, {}
+    if not symbols:
+        return pd.DataFrame(), errors
+
+    with ThreadPoolExecutor(max_workers=min(MAX_FETCH_WORKERS, len(symbols))) as pool:
+        futures = {sym: pool.submit(tracing.bind(_safe_closes), sym, period) for sym in symbols}
+        for sym, fut in futures.items():
+            try:
+                closes[sym] = fut.result()
+            except Exception as e:
+                errors[sym] = str(e)
+
+    # only symbols that loaded are worth keeping warm (typos stay out of the hot set)
+    prefetcher.note_prices(closes, period)
+
+    # aligned on the trading date so symbols from different exchanges line up
+    return align(closes), errors
+
+def _price_matrix(symbol: str, period: str):
+    """Single-symbol price matrix (date x 1); raises ValueError on failure."""
+    prices, fetch_errors = _safe_history_many([symbol], period=period)
+    if fetch_errors:
+        raise ValueError(fetch_errors[symbol])
+    return prices
 
 
 # ---------------------------
@@ -55,6 +140,7 @@ def _max_drawdown(series: pd.Series):
 # ---------------------------
 
 @tool
+@cached(ttl=QUOTE_TTL)
 def one_year_tool(symbol: str):
     """
     Returns 1-year performance for a given stock symbol.
@@ -63,15 +149,17 @@ def one_year_tool(symbol: str):
     """
     symbol = (symbol or "").upper().strip()
     try:
-        df = _safe_history(symbol, period="1y")
-        start = float(df["Close"].iloc[0])
-        end = float(df["Close"].iloc[-1])
-        pct = ((end - start) / start) * 100.0 if start != 0 else float("nan")
+        m = analytics.summarize(_price_matrix(symbol, "1y")).loc[symbol]
+        if tool_output.is_compact():
+            return tool_output.compact({
+                "symbol": symbol, "period": "1y", "start": m["start"], "end": m["end"],
+                "change_pct": m["total_return"], "ref": YAHOO_QUOTE.format(symbol=symbol),
+            }, budget=tool_output.budget_for("one_year_tool"))
         txt = (
             f"# 1-Year Performance — {symbol}\n\n"
-            f"- Start price: ${start:.2f}\n"
-            f"- End price:   ${end:.2f}\n"
-            f"- Change:      {pct:.2f}%\n\n"
+            f"- Start price: ${m['start']:.2f}\n"
+            f"- End price:   ${m['end']:.2f}\n"
+            f"- Change:      {m['total_return']:.2f}%\n\n"
             f"Reference: https://finance.yahoo.com/quote/{symbol}\n"
         )
         return txt
@@ -84,6 +172,7 @@ def one_year_tool(symbol: str):
 # ---------------------------
 
 @tool
+@cached(ttl=QUOTE_TTL)
 def compare_stocks_tool(symbol1: str, symbol2: str):
     """
     Compare two stocks over 1 year. Inputs: symbol1, symbol2.
@@ -95,21 +184,26 @@ def compare_stocks_tool(symbol1: str, symbol2: str):
         return "Please provide two symbols, e.g., symbol1=GOOG, symbol2=AMZN"
 
     try:
-        df1 = _safe_history(s1, period="1y")
-        df2 = _safe_history(s2, period="1y")
+        prices, fetch_errors = _safe_history_many([s1, s2], period="1y")
+        if fetch_errors:
+            raise ValueError("; ".join(fetch_errors.values()))
 
-        s1_start, s1_end = float(df1["Close"].iloc[0]), float(df1["Close"].iloc[-1])
-        s2_start, s2_end = float(df2["Close"].iloc[0]), float(df2["Close"].iloc[-1])
+        summary = analytics.summarize(prices)
+        m1, m2 = summary.loc[s1], summary.loc[s2]
 
-        s1_pct = ((s1_end - s1_start) / s1_start) * 100.0 if s1_start != 0 else float("nan")
-        s2_pct = ((s2_end - s2_start) / s2_start) * 100.0 if s2_start != 0 else float("nan")
+        winner = s1 if m1["total_return"] > m2["total_return"] else s2
 
-        winner = s1 if s1_pct > s2_pct else s2
+        if tool_output.is_compact():
+            table = summary.loc[[s1, s2], ["start", "end", "total_return"]].rename(columns={"total_return": "change_pct"})
+            return tool_output.compact(
+                {"period": "1y", "better_performer": winner, "ref": YAHOO_QUOTE},
+                table, budget=tool_output.budget_for("compare_stocks_tool"),
+            )
 
         txt = (
             f"# 1-Year Comparison: {s1} vs {s2}\n\n"
-            f"- {s1}: ${s1_start:.2f} → ${s1_end:.2f} ({s1_pct:.2f}%)\n"
-            f"- {s2}: ${s2_start:.2f} → ${s2_end:.2f} ({s2_pct:.2f}%)\n\n"
+            f"- {s1}: ${m1['start']:.2f} → ${m1['end']:.2f} ({m1['total_return']:.2f}%)\n"
+            f"- {s2}: ${m2['start']:.2f} → ${m2['end']:.2f} ({m2['total_return']:.2f}%)\n\n"
             f"**Better performer:** {winner}\n\n"
             f"References:\n- https://finance.yahoo.com/quote/{s1}\n- https://finance.yahoo.com/quote/{s2}\n"
         )
@@ -123,6 +217,7 @@ def compare_stocks_tool(symbol1: str, symbol2: str):
 # ---------------------------
 
 @tool
+@cached(ttl=LONG_TERM_TTL)
 def ten_year_analysis_tool(symbol: str):
     """
     10-year analysis for a given stock symbol:
@@ -135,42 +230,36 @@ def ten_year_analysis_tool(symbol: str):
     """
     symbol = (symbol or "").upper().strip()
     try:
-        df = _safe_history(symbol, period="10y")
-        df = df.sort_index()
+        # kept up to date bar by bar in the price store: no pass over 10 years of data
+        state = _running_metrics(symbol, "10y")
+        m = state.summary()
+        yearly = pd.Series(state.yearly_returns(), dtype=float).rename_axis("year")
 
-        # daily returns
-        df["Pct"] = df["Close"].pct_change()
-        daily_ret = df["Pct"].dropna()
-
-        # yearly returns (calendar year)
-        yearly_last = df["Close"].resample("Y").last()
-        yearly_returns = yearly_last.pct_change().dropna() * 100.0
-
-        start_price = float(df["Close"].iloc[0])
-        end_price = float(df["Close"].iloc[-1])
-        total_return = (end_price / start_price - 1) * 100.0
-        years = (df.index[-1] - df.index[0]).days / 365.25
-        cagr = _cagr(start_price, end_price, years if years > 0 else 10)
-        volatility = daily_ret.std() * (252 ** 0.5) * 100.0 if not daily_ret.empty else float("nan")
-        max_dd = _max_drawdown(df["Close"])
-
-        # key highs/lows
-        max_price = float(df["Close"].max())
-        min_price = float(df["Close"].min())
+        if tool_output.is_compact():
+            meta = {"symbol": symbol, "period": "10y", "ref": YAHOO_QUOTE.format(symbol=symbol)}
+            meta.update({
+                "start": m["start"], "end": m["end"], "total_return_pct": m["total_return"],
+                "cagr_pct": m["cagr"], "volatility_pct": m["volatility"],
+                "max_drawdown_pct": m["max_drawdown"], "high": m["high"], "low": m["low"],
+            })
+            return tool_output.compact(
+                meta, yearly.rename("return_pct").to_frame(),
+                budget=tool_output.budget_for("ten_year_analysis_tool"),
+            )
 
         # yearly string
-        yearly_md = "\n".join([f"- {idx.year}: {ret:.2f}%" for idx, ret in yearly_returns.items()])
+        yearly_md = "\n".join([f"- {year}: {ret:.2f}%" for year, ret in yearly.items()])
 
         txt = (
             f"# 10-Year Analysis — {symbol}\n\n"
-            f"**Start (10y ago):** ${start_price:.2f}\n"
-            f"**Current:** ${end_price:.2f}\n"
-            f"**Total Return (10y):** {total_return:.2f}%\n\n"
-            f"**CAGR:** {cagr:.2f}% per year\n"
-            f"**Annualized Volatility:** {volatility:.2f}%\n"
-            f"**Max Drawdown:** {max_dd:.2f}%\n"
-            f"**High (10y):** ${max_price:.2f}\n"
-            f"**Low (10y):**  ${min_price:.2f}\n\n"
+            f"**Start (10y ago):** ${m['start']:.2f}\n"
+            f"**Current:** ${m['end']:.2f}\n"
+            f"**Total Return (10y):** {m['total_return']:.2f}%\n\n"
+            f"**CAGR:** {m['cagr']:.2f}% per year\n"
+            f"**Annualized Volatility:** {m['volatility']:.2f}%\n"
+            f"**Max Drawdown:** {m['max_drawdown']:.2f}%\n"
+            f"**High (10y):** ${m['high']:.2f}\n"
+            f"**Low (10y):**  ${m['low']:.2f}\n\n"
             f"---\n\n"
             f"### Yearly Returns\n{yearly_md}\n\n"
             f"---\n\n"
@@ -187,6 +276,7 @@ def ten_year_analysis_tool(symbol: str):
 # ---------------------------
 
 @tool
+@cached(ttl=LONG_TERM_TTL)
 def compare_multi_stocks_tool(symbols):
     """
     Compare multiple symbols over 10 years.
@@ -205,27 +295,23 @@ def compare_multi_stocks_tool(symbols):
     if len(raw) < 2:
         return "Please provide at least two symbols to compare."
 
-    results = []
-    errors = []
+    # one concurrent fetch for every symbol; failures stay per symbol
+    prices, fetch_errors = _safe_history_many(raw, period="10y")
+    errors = [f"{sym}: {err}" for sym, err in fetch_errors.items()]
 
-    for sym in raw:
-        symu = sym.upper()
-        try:
-            df = _safe_history(symu, period="10y")
-            start = float(df["Close"].iloc[0])
-            end = float(df["Close"].iloc[-1])
-            total_return = (end / start - 1) * 100.0
-            cagr = _cagr(start, end, 10.0)
-            results.append({"symbol": symu, "total_return": total_return, "cagr": cagr})
-        except Exception as e:
-            errors.append(f"{symu}: {e}")
+    # all symbols in one vectorized pass, sorted by total return descending
+    ranked = analytics.rank(analytics.summarize(prices), by="total_return")
 
-    # sort by total_return descending
-    results_sorted = sorted(results, key=lambda r: (r["total_return"] is not None, r["total_return"]), reverse=True)
+    if tool_output.is_compact():
+        meta = {"period": "10y", "sorted_by": "total_return_pct desc", "ref": YAHOO_QUOTE}
+        if fetch_errors:
+            meta["errors"] = fetch_errors
+        table = ranked[["total_return", "cagr"]].rename(columns={"total_return": "total_return_pct", "cagr": "cagr_pct"})
+        return tool_output.compact(meta, table, budget=tool_output.budget_for("compare_multi_stocks_tool"))
 
     txt = "# 10-Year Multi-Stock Comparison\n\n"
-    for r in results_sorted:
-        txt += f"- **{r['symbol']}**: Total Return {r['total_return']:.2f}% — CAGR {r['cagr']:.2f}%\n"
+    for sym, r in ranked.iterrows():
+        txt += f"- **{sym}**: Total Return {r['total_return']:.2f}% — CAGR {r['cagr']:.2f}%\n"
 
     if errors:
         txt += "\n---\n\n**Warnings / Errors:**\n"
@@ -233,54 +319,423 @@ def compare_multi_stocks_tool(symbols):
             txt += f"- {er}\n"
 
     txt += "\n\n**References:**\n"
-    for r in results_sorted:
-        txt += f"- {r['symbol']}: https://finance.yahoo.com/quote/{r['symbol']}\n"
+    for sym in ranked.index:
+        txt += f"- {sym}: https://finance.yahoo.com/quote/{sym}\n"
 
     return txt
 
 
 # ---------------------------
-# AGENT FACTORY (returns master Supervisor agent)
+# TOOL: multi-horizon analysis (one 10y download per symbol)
 # ---------------------------
 
-def get_financial_agent():
+def _fmt_pct(value) -> str:
+    return "—" if pd.isna(value) else f"{value:.2f}%"
+
+
+@tool
+@cached(ttl=QUOTE_TTL)
+def multi_horizon_analysis_tool(symbols: str, horizons: str = "1m,3m,ytd,1y,3y,5y,10y"):
     """
-    Build and return the multi-agent Supervisor (team) that routes tasks:
-     - Web Search Agent: DuckDuckGo for news/trends
-     - Finance Agent: yfinance tools + custom historical tools
-     - Supervisor Agent: team routing and final answer aggregation
+    Returns, CAGR, annualized volatility and max drawdown over several horizons
+    at once, all derived from a single 10-year download per symbol.
+    Use this for any question about 1 month to 10 years of history, or about
+    more than one horizon, instead of calling other tools repeatedly.
+    Inputs:
+      symbols: one ticker or a comma-separated list (e.g. 'AAPL' or 'AAPL,MSFT')
+      horizons: comma-separated subset of 1m,3m,6m,ytd,1y,3y,5y,10y
     """
+    raw = [s.strip() for s in str(symbols or "").replace(";", ",").split(",") if s.strip()]
+    wanted = [h.strip().lower() for h in str(horizons or "").split(",") if h.strip()]
+    if not raw:
+        return "Please provide at least one symbol, e.g., symbols='AAPL,MSFT'"
 
-    # Web Search Agent
-    web_search_agent = Agent(
-        name="Web Search Agent",
-        role="Search the web and fetch news/trends",
-        model=OpenAIChat(model="gpt-4o"),
-        tools=[DuckDuckGo()],
-        markdown=True,
-        show_tool_calls=False,
-        instructions=[
-            "Use DuckDuckGo for news, trends, or general web research.",
-            "Return short summaries and include source links.",
-        ],
+    try:
+        for h in wanted:
+            analytics.horizon_offset(h)  # reject bad horizons before downloading
+        prices, fetch_errors = _safe_history_many(raw, period="10y")
+        if prices.empty:
+            raise ValueError("; ".join(fetch_errors.values()) or "no data")
+
+        as_of = pd.Timestamp.now(tz=MARKET_TZ).normalize().tz_localize(None)
+        table = analytics.horizon_summary(prices, wanted or analytics.DEFAULT_HORIZONS, as_of=as_of)
+    except Exception as e:
+        return f"Error running multi-horizon analysis for {', '.join(raw)}: {e}"
+
+    if tool_output.is_compact():
+        meta = {"as_of": str(prices.index[-1].date()), "ref": YAHOO_QUOTE}
+        if fetch_errors:
+            meta["errors"] = fetch_errors
+        cols = {"total_return": "return_pct", "cagr": "cagr_pct", "volatility": "volatility_pct",
+                "max_drawdown": "max_drawdown_pct"}
+        return tool_output.compact(meta, table[list(cols)].rename(columns=cols),
+                                   budget=tool_output.budget_for("multi_horizon_analysis_tool"))
+
+    txt = f"# Multi-Horizon Analysis (as of {prices.index[-1].date()})\n\n"
+    for sym in prices.columns:
+        txt += (
+            f"### {sym}\n\n"
+            "| Horizon | Return | CAGR | Volatility | Max Drawdown |\n"
+            "|---|---|---|---|---|\n"
+        )
+        for h, r in table.loc[sym].iterrows():
+            txt += (
+                f"| {h} | {_fmt_pct(r['total_return'])} | {_fmt_pct(r['cagr'])} | "
+                f"{_fmt_pct(r['volatility'])} | {_fmt_pct(r['max_drawdown'])} |\n"
+            )
+        txt += f"\nReference: https://finance.yahoo.com/quote/{sym}\n\n"
+
+    if fetch_errors:
+        txt += "---\n\n**Warnings / Errors:**\n"
+        for sym, err in fetch_errors.items():
+            txt += f"- {sym}: {err}\n"
+
+    return txt
+
+
+# ---------------------------
+# TOOL: correlation / covariance matrix
+# ---------------------------
+
+# symbols up to which the full heat-table is shown; above it, per-symbol averages
+HEAT_TABLE_MAX = 12
+
+
+def _heat(value) -> str:
+    if pd.isna(value):
+        return "—"
+    shade = "🟥" if value >= 0.8 else "🟧" if value >= 0.5 else "🟨" if value >= 0.2 else "🟩" if value > -0.2 else "🟦"
+    return f"{shade} {value:.2f}"
+
+
+@tool
+@cached(ttl=QUOTE_TTL)
+def correlation_tool(symbols: str, period: str = "1y", top_pairs: int = 5):
+    """
+    How correlated are these stocks? Correlation and annualized covariance of
+    daily returns for N symbols in one call, with the most and least correlated pairs.
+    Inputs:
+      symbols: comma-separated tickers (at least two), e.g. 'AAPL,MSFT,NVDA'
+      period: history to use: 6mo, 1y, 2y, 5y or 10y (default 1y)
+      top_pairs: how many most / least correlated pairs to list (default 5)
+    """
+    raw = [s.strip() for s in str(symbols or "").replace(";", ",").split(",") if s.strip()]
+    if len(raw) < 2:
+        return "Please provide at least two symbols, e.g., symbols='AAPL,MSFT'"
+
+    try:
+        top_pairs = max(1, min(int(top_pairs), 50))
+        prices, fetch_errors = _safe_history_many(raw, period=period)
+        if prices.shape[1] < 2:
+            raise ValueError("; ".join(fetch_errors.values()) or "need price data for at least two symbols")
+        corr, cov = analytics.correlation(prices)
+        n = corr.shape[0]
+        # with few symbols keep the two lists from repeating the same pairs
+        most, least = analytics.extreme_pairs(corr, min(top_pairs, max(1, n * (n - 1) // 4)))
+    except Exception as e:
+        return f"Error computing correlations for {', '.join(raw)}: {e}"
+
+    # mean correlation of each symbol with all the others (diagonal excluded)
+    others = corr.where(~np.eye(n, dtype=bool))
+    avg = others.mean(axis=1)
+
+    if tool_output.is_compact():
+        meta = {
+            "period": period, "as_of": str(prices.index[-1].date()), "symbols": n,
+            "most_correlated": [[r.a, r.b, r.corr] for r in most.itertuples()],
+            "least_correlated": [[r.a, r.b, r.corr] for r in least.itertuples()],
+        }
+        if fetch_errors:
+            meta["errors"] = fetch_errors
+        if n <= HEAT_TABLE_MAX:
+            table = corr.copy()
+            table["vol_pct"] = np.sqrt(np.diag(cov.to_numpy())) * 100.0
+        else:
+            table = pd.DataFrame({"avg_corr": avg, "vol_pct": np.sqrt(np.diag(cov.to_numpy())) * 100.0})
+            table = table.sort_values("avg_corr", ascending=False)
+        return tool_output.compact(meta, table, budget=tool_output.budget_for("correlation_tool"))
+
+    txt = f"# Correlation of Daily Returns ({period}, as of {prices.index[-1].date()})\n\n"
+    if n <= HEAT_TABLE_MAX:
+        txt += "| | " + " | ".join(corr.columns) + " |\n|---|" + "---|" * n + "\n"
+        for sym, row in corr.iterrows():
+            txt += f"| **{sym}** | " + " | ".join(_heat(v) for v in row) + " |\n"
+        txt += "\n🟥 ≥ 0.8 · 🟧 ≥ 0.5 · 🟨 ≥ 0.2 · 🟩 ≈ 0 · 🟦 ≤ -0.2\n\n"
+    else:
+        txt += "| Symbol | Avg. correlation | Volatility |\n|---|---|---|\n"
+        for sym in avg.sort_values(ascending=False).index:
+            txt += f"| {sym} | {_heat(avg[sym])} | {_fmt_pct(np.sqrt(cov.at[sym, sym]) * 100.0)} |\n"
+        txt += "\n"
+
+    for title, pairs in (("Most correlated pairs", most), ("Least correlated pairs", least)):
+        txt += f"**{title}:**\n"
+        for r in pairs.itertuples():
+            txt += f"- {r.a} / {r.b}: {r.corr:.2f}\n"
+        txt += "\n"
+
+    if fetch_errors:
+        txt += "---\n\n**Warnings / Errors:**\n"
+        for sym, err in fetch_errors.items():
+            txt += f"- {sym}: {err}\n"
+
+    return txt
+
+
+# ---------------------------
+# TOOL: universe screener (local price store, top-K)
+# ---------------------------
+
+def _fetch_into_store(period: str):
+    """fetch_missing callback for the screener: one bounded concurrent download."""
+    def fetch(symbols):
+        with tracing.span("screen_fetch", kind="fetch", symbols=len(symbols)):
+            _safe_history_many(symbols, period=period)
+    return fetch
+
+
+@tool
+@cached(ttl=QUOTE_TTL)
+def screen_universe_tool(universe: str = "sp500", metric: str = "sharpe", top_k: int = 10,
+                         horizon: str = "5y", worst: bool = False):
+    """
+    Screens a whole universe of stocks and returns the top-K by one metric.
+    Use this for "best / worst stocks in the S&P 500 (or my watchlist) by ..." questions;
+    use compare_multi_stocks_tool for a handful of named symbols.
+    Inputs:
+      universe: 'sp500', the name of a saved watchlist file (e.g. 'tech.txt'), or comma-separated tickers
+      metric: sharpe (return / volatility), cagr, return, volatility (lowest first) or drawdown (shallowest first)
+      top_k: how many to return (default 10)
+      horizon: trailing window, e.g. 1y, 3y, 5y, 10y, ytd, 6m
+      worst: True to return the bottom of the ranking instead
+    Runs over locally stored prices; names never seen before are downloaded once.
+    """
+    try:
+        top_k = max(1, min(int(top_k), 100))
+        symbols = screener.load_universe(universe)
+        period = screener.fetch_period(horizon)
+        ranked, info = screener.screen(symbols, metric=metric, top=top_k, horizon=horizon, worst=bool(worst),
+                                       fetch_missing=_fetch_into_store(period))
+        if ranked.empty:
+            raise ValueError(f"no price data for any of {info['universe']} symbols")
+    except Exception as e:
+        return f"Error screening {universe}: {e}"
+
+    column = screener.METRICS[metric.strip().lower()][0]
+    skipped = len(info["missing"]) + len(info["insufficient"])
+    title = "S&P 500" if universe.strip().lower() in screener.SP500_NAMES else universe
+
+    if tool_output.is_compact():
+        meta = {"universe": title, "metric": column, "horizon": horizon, "order": "worst" if worst else "best",
+                "screened": info["screened"], "of": info["universe"], "skipped": skipped,
+                "as_of": info["as_of"], "ref": YAHOO_QUOTE}
+        cols = ["cagr", "volatility", "sharpe", "max_drawdown", "total_return"]
+        return tool_output.compact(meta, ranked[cols], budget=tool_output.budget_for("screen_universe_tool"))
+
+    txt = (
+        f"# Universe Screen — {title}\n\n"
+        f"{'Bottom' if worst else 'Top'} {len(ranked)} by **{metric}** over {horizon} "
+        f"(as of {info['as_of']}; {info['screened']} of {info['universe']} symbols screened)\n\n"
+        "| # | Symbol | CAGR | Volatility | Sharpe | Max Drawdown | Total Return |\n"
+        "|---|---|---|---|---|---|---|\n"
     )
+    for i, (sym, r) in enumerate(ranked.iterrows(), start=1):
+        sharpe = "—" if pd.isna(r["sharpe"]) else f"{r['sharpe']:.2f}"
+        txt += (
+            f"| {i} | [{sym}](https://finance.yahoo.com/quote/{sym}) | {_fmt_pct(r['cagr'])} | "
+            f"{_fmt_pct(r['volatility'])} | {sharpe} | {_fmt_pct(r['max_drawdown'])} | {_fmt_pct(r['total_return'])} |\n"
+        )
+    if skipped:
+        txt += f"\n_{skipped} symbols skipped (no data or less than {horizon} of history)._\n"
+    return txt
 
-def get_financial_agent():
+
+# ---------------------------
+# FAST PATH (answers without the LLM)
+# ---------------------------
+
+FAST_PATH_TOOLS = {
+    f.name: f
+    for f in [
+        one_year_tool, compare_stocks_tool, ten_year_analysis_tool, compare_multi_stocks_tool,
+        multi_horizon_analysis_tool, correlation_tool, google_news_tool,
+    ]
+}
+
+def fast_path_answer(message: str):
     """
-    Build and return the multi-agent Supervisor (team) that routes tasks:
-     - Web Search Agent: DuckDuckGo for news/trends
-     - Finance Agent: yfinance tools + custom historical tools
-     - Supervisor Agent: team routing and final answer aggregation
+    Answer a supported query shape (see README) with one direct tool call.
+    Returns None when the router is not confident, meaning: use the agents.
     """
+    r = router.route(message)
+    router.record(r is not None)
+    if r is None:
+        return None
+    return FAST_PATH_TOOLS[r.tool].entrypoint(**r.args)
 
-    # ---------------------------------------------------------
-    # 1) WEB SEARCH AGENT
-    # ---------------------------------------------------------
-    web_search_agent = Agent(
+
+# ---------------------------
+# TRACED MODEL (one span per LLM call / sub-agent hop)
+# ---------------------------
+
+# Shared bound on tool calls running at once, across every agent turn
+TOOL_CALL_WORKERS = int(os.getenv("TOOL_CALL_WORKERS", "16"))
+_tool_call_pool = ThreadPoolExecutor(max_workers=TOOL_CALL_WORKERS, thread_name_prefix="tool-call")
+
+
+class _ExecutedCall(FunctionCall):
+    """A FunctionCall run outside phi's loop (inline or on the tool-call pool); `execute()` replays its outcome."""
+
+    _outcome: tuple = PrivateAttr(default=(False, None))
+    _elapsed: float = PrivateAttr(default=0.0)
+
+    def run(self):
+        started = time.perf_counter()
+        try:
+            self._outcome = (FunctionCall.execute(self), None)
+        except ToolCallException as e:
+            self._outcome = (False, e)
+        finally:
+            self._elapsed = time.perf_counter() - started
+
+    def execute(self) -> bool:
+        success, error = self._outcome
+        if error is not None:
+            raise error
+        return success
+
+
+class TracedOpenAIChat(OpenAIChat):
+    """
+    OpenAIChat that records a tracing span for every API call and team transfer,
+    and feeds tool results back to the model in compact, token-budgeted form.
+    With `concurrent_tools`, the tool calls of one model response run at the
+    same time on the shared tool-call pool; results still go back in order.
+    """
+
+    agent_name: str = "agent"
+    concurrent_tools: bool = False
+
+    def invoke(self, messages):
+        with tracing.span(self.agent_name, kind="llm", model=self.id) as sp:
+            response = super().invoke(messages)
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                sp.set(input_tokens=usage.prompt_tokens, output_tokens=usage.completion_tokens)
+            return response
+
+    def invoke_stream(self, messages):
+        sp = tracing.start_span(self.agent_name, kind="llm", model=self.id)
+        error = None
+        try:
+            for chunk in super().invoke_stream(messages):
+                usage = getattr(chunk, "usage", None)
+                if usage is not None:
+                    sp.set(input_tokens=usage.prompt_tokens, output_tokens=usage.completion_tokens)
+                yield chunk
+        except GeneratorExit:
+            raise
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            tracing.end_span(sp, error)
+
+    @staticmethod
+    def _run_concurrently(calls):
+        """Execute already-announced tool calls in parallel on the tool-call pool."""
+        with tool_output.output_mode(tool_output.LLM_OUTPUT_MODE):
+            with tracing.span("tool_calls", kind="parallel", calls=len(calls)):
+                for fut in [_tool_call_pool.submit(tracing.bind(c.run)) for c in calls]:
+                    fut.result()
+
+    def _replay(self, call: _ExecutedCall, events, function_call_results):
+        """
+        Rest of phi's loop for a call already run (`events` is past its
+        tool_call_started event), reporting the call's own duration rather
+        than the time since it was announced.
+        """
+        elapsed = call._elapsed
+        for response in events:
+            if response.event == ModelResponseEvent.tool_call_completed.value:
+                response.content = f"{call.get_call_str()} completed in {elapsed:.4f}s."
+                response.tool_call["metrics"] = {"time": elapsed}
+            yield response
+        for msg in function_call_results:
+            if msg.tool_call_id == call.call_id:
+                msg.metrics = {"time": elapsed}
+        self.metrics["tool_call_times"][call.function.name][-1] = elapsed
+
+    def run_function_calls(self, function_calls, function_call_results, tool_role: str = "tool"):
+        # Tools run outside phi's loop, inside output_mode and never across a
+        # yield (the mode would leak into whoever consumes this generator);
+        # phi's loop then only announces them and reports their outcome.
+        tools = [fc for fc in function_calls if not fc.function.name.startswith("transfer_task_to_")]
+        concurrent = self.concurrent_tools and len(tools) > 1 and not self.tool_call_limit
+        replays = {}
+        if concurrent:
+            # announce every call (tool_call_started) before any runs, run them
+            # together, then let phi report each outcome in order
+            for fc in tools:
+                call = _ExecutedCall(**{k: getattr(fc, k) for k in FunctionCall.model_fields})
+                events = super().run_function_calls([call], function_call_results, tool_role)
+                yield next(events)
+                replays[id(fc)] = call, events
+            self._run_concurrently([call for call, _ in replays.values()])
+        for fc in function_calls:
+            name = fc.function.name
+            if not name.startswith("transfer_task_to_"):
+                if id(fc) not in replays:
+                    call = _ExecutedCall(**{k: getattr(fc, k) for k in FunctionCall.model_fields})
+                    events = super().run_function_calls([call], function_call_results, tool_role)
+                    yield next(events)
+                    with tool_output.output_mode(tool_output.LLM_OUTPUT_MODE):
+                        call.run()
+                    replays[id(fc)] = call, events
+                yield from self._replay(*replays[id(fc)], function_call_results)
+                # tools answer the model in compact form, each held to its token budget
+                for msg in function_call_results:
+                    if msg.tool_call_id == fc.call_id:
+                        msg.content = tool_output.fit(msg.content, tool_output.budget_for(name))
+                continue
+            member = name[len("transfer_task_to_"):].replace("_", " ").title()
+            with tracing.span(member, kind="agent"):
+                yield from super().run_function_calls([fc], function_call_results, tool_role)
+
+
+# ---------------------------
+# SHARED OPENAI CLIENT (one HTTP connection pool for every model)
+# ---------------------------
+
+_openai_client = None
+_openai_lock = threading.Lock()
+
+def shared_openai_client():
+    """
+    OpenAI client reused by every agent's model, so LLM calls share one
+    keep-alive connection pool (phi otherwise builds a new client per call).
+    None when no API key is configured; phi then reports it at call time.
+    """
+    global _openai_client
+    if _openai_client is None and os.getenv("OPENAI_API_KEY"):
+        with _openai_lock:
+            if _openai_client is None:
+                _openai_client = OpenAI()
+    return _openai_client
+
+def _model(agent_name: str, concurrent_tools: bool = False):
+    return TracedOpenAIChat(model="gpt-4o", agent_name=agent_name, client=shared_openai_client(),
+                            concurrent_tools=concurrent_tools)
+
+
+# ---------------------------------------------------------
+# 1) WEB SEARCH AGENT
+# ---------------------------------------------------------
+def _build_web_search_agent():
+    return Agent(
         name="Web Search Agent",
         role="Search the web and fetch news/trends",
-        model=OpenAIChat(model="gpt-4o"),
-        tools=[DuckDuckGo()],
+        model=_model("Web Search Agent"),
+        tools=[cache_toolkit(schedule_toolkit(DuckDuckGo(), "duckduckgo"), NEWS_TTL)],
         markdown=True,
         show_tool_calls=False,
         instructions=[
@@ -289,29 +744,34 @@ def get_financial_agent():
         ],
     )
 
-    # ---------------------------------------------------------
-    # 2) FINANCE AGENT
-    # ---------------------------------------------------------
 
-    
-    yfinance_tools = YFinanceTools(
+# ---------------------------------------------------------
+# 2) FINANCE AGENT
+# ---------------------------------------------------------
+def _build_finance_agent():
+    yfinance_tools = cache_toolkit(schedule_toolkit(YFinanceTools(
         stock_price=True,
         analyst_recommendations=True,
         stock_fundamentals=True,
         company_news=True,
-    )
+    ), "yahoo"), QUOTE_TTL)
 
     # Finance agent with all custom tools correctly added
-    finance_agent = Agent(
+    return Agent(
         name="Finance Agent",
         role="Handles all stock & financial queries",
-        model=OpenAIChat(model="gpt-4o"),
+        model=_model("Finance Agent", concurrent_tools=True),
         tools=[
             yfinance_tools,         
             one_year_tool,           
             compare_stocks_tool,            
+            ten_year_analysis_tool,
+            compare_multi_stocks_tool,
+            multi_horizon_analysis_tool,
+            screen_universe_tool,
+            correlation_tool,
             google_news_tool, 
-            DuckDuckGo()        
+            cache_toolkit(schedule_toolkit(DuckDuckGo(), "duckduckgo"), NEWS_TTL)
         ],
         markdown=True,
         show_tool_calls=False,
@@ -319,6 +779,14 @@ def get_financial_agent():
             "Use yfinance tools for real-time data (price, fundamentals, earnings, news).",
             "Use one_year_tool for 1-year performance.",
             "Use compare_stocks_tool for comparing multiple stocks.",
+            "Use multi_horizon_analysis_tool for any other horizon (1m, 3m, YTD, 3y, 5y, 10y) or several "
+            "horizons at once: ONE call covers every horizon and symbol, never call tools once per horizon.",
+            "Use ten_year_analysis_tool for a detailed 10-year report with yearly returns, "
+            "and compare_multi_stocks_tool to rank 3+ stocks over 10 years.",
+            "Use screen_universe_tool to find the best / worst stocks of the S&P 500 or a watchlist "
+            "by Sharpe, CAGR, volatility or drawdown (one call screens the whole universe).",
+            "Use correlation_tool when asked how correlated / diversified stocks are: "
+            "one call covers every symbol (never compare them pair by pair).",
             "Use google_news_tool for the latest news (prefer it over DuckDuckGo for finance).",
             "If 5+ stocks are given, produce a comparison table.",
             "Always include reference links and a professional summary.",
@@ -326,13 +794,30 @@ def get_financial_agent():
         ],
     )
 
+
+# ---------------------------
+# AGENT FACTORY (returns master Supervisor agent)
+# ---------------------------
+
+def get_financial_agent():
+    """
+    Build and return the multi-agent Supervisor (team) that routes tasks:
+     - Web Search Agent: DuckDuckGo for news/trends
+     - Finance Agent: yfinance tools + custom historical tools
+     - Supervisor Agent: team routing and final answer aggregation
+    Tool results of both sub-agents go through the shared `tool_cache`
+    (hit/miss counters via `tool_cache.stats()`).
+    """
+    web_search_agent = _build_web_search_agent()
+    finance_agent = _build_finance_agent()
+
     # ---------------------------------------------------------
     # 3) SUPERVISOR AGENT (TEAM ROUTER)
     # ---------------------------------------------------------
     master_agent = Agent(
         name="Supervisor Agent",
         role="Routes user questions to correct sub-agent",
-        model=OpenAIChat(model="gpt-4o"),
+        model=_model("Supervisor Agent"),
         team=[web_search_agent, finance_agent],
         markdown=True,
         show_tool_calls=False,
@@ -341,7 +826,9 @@ def get_financial_agent():
             "Yahoo Finance news should be used ONLY when specifically asked.",
             "For stock-specific real-time data → Finance Agent.",
             "For multi-stock comparisons → Finance Agent (use compare_stocks_tool).",
-            "For long-term (5-10 years) history → use Finance Agent + one_year_tool repeatedly.",
+            "For history over any horizon (1 month to 10 years) → Finance Agent (multi_horizon_analysis_tool, one call).",
+            "For correlation / diversification between stocks → Finance Agent (correlation_tool).",
+            "For screening the S&P 500 or a watchlist (top / bottom K by a metric) → Finance Agent (screen_universe_tool).",
             "Produce a friendly, conversational tone. Always return final structured summary.",
             "Always include reference links, a TL;DR section, and properly formatted tables.",
             "Always include reference links, a TL;DR section, and properly formatted tables.",
@@ -351,19 +838,198 @@ def get_financial_agent():
     return master_agent
 
 
+# ---------------------------------------------------------
+# WARM AGENT POOLS
+# ---------------------------------------------------------
+# Pre-built agents, checked out per session / sub-task and reset on return.
+AGENT_POOL_SIZE = int(os.getenv("AGENT_POOL_SIZE", "4"))
+
+agent_pool = AgentPool(get_financial_agent, AGENT_POOL_SIZE, name="supervisor")
+finance_agent_pool = AgentPool(_build_finance_agent, AGENT_POOL_SIZE, name="finance")
+web_search_agent_pool = AgentPool(_build_web_search_agent, AGENT_POOL_SIZE, name="web_search")
+
+def warm_agent_pools():
+    """Start pre-building agents in the background (call once at startup)."""
+    for pool in (agent_pool, finance_agent_pool, web_search_agent_pool):
+        pool.warm()
+
+
+# ---------------------------------------------------------
+# PARALLEL FAN-OUT (mixed data + news questions)
+# ---------------------------------------------------------
+
+def _chunk_text(chunk):
+    if hasattr(chunk, "content") and chunk.content:
+        return chunk.content
+    if isinstance(chunk, str):
+        return chunk
+    return None
+
+def _fan_out_tasks(message: str, prompt: str = None):
+    """(heading, agent pool, prompt) per independent sub-task, or None."""
+    if not router.is_mixed(message):
+        return None
+    subject = ", ".join(router.extract_symbols(message)) or message
+    return [
+        (
+            "## 📈 Market Data\n\n",
+            finance_agent_pool,
+            f"{prompt or message}\n\nAnswer only the price / performance part. The latest news is covered separately.",
+        ),
+        (
+            "## 📰 Latest News\n\n",
+            web_search_agent_pool,
+            f"Find the latest news about {subject}. Short summaries with source links.",
+        ),
+    ]
+
+def _fan_out_stream(tasks, failures=None):
+    """
+    Run every sub-agent concurrently and merge their streams.
+    Whichever sub-agent produces output first is streamed live; the others
+    are buffered and emitted (then streamed live) once it finishes.
+    Failed sub-agents are reported inline and appended to `failures`.
+    Closing the stream (e.g. the client went away) stops the sub-agents at
+    their next chunk without waiting for them.
+    """
+    events = queue.Queue()
+    stop = threading.Event()
+    n = len(tasks)
+
+    def worker(i, pool, prompt):
+        try:
+            with pool.checkout() as agent, tracing.span(agent.name, kind="agent"):
+                for chunk in agent.run(message=prompt, stream=True):
+                    if stop.is_set():
+                        break
+                    text = _chunk_text(chunk)
+                    if text:
+                        events.put((i, text))
+        except Exception as e:
+            if failures is not None:
+                failures.append(e)
+            events.put((i, f"\n\nError running sub-agent: {e}\n"))
+        finally:
+            events.put((i, None))
+
+    buffers = {i: [] for i in range(n)}
+    done, flushed = set(), set()
+    live = None
+
+    pool = ThreadPoolExecutor(max_workers=n)
+    try:
+        for i, (_, agents, prompt) in enumerate(tasks):
+            pool.submit(tracing.bind(worker), i, agents, prompt)
+
+        while len(flushed) < n:
+            if live is None:
+                ready = [i for i in range(n) if i not in flushed and (buffers[i] or i in done)]
+                if ready:
+                    live = ready[0]
+                    yield ("\n\n" if flushed else "") + tasks[live][0]
+            if live is not None:
+                if buffers[live]:
+                    yield "".join(buffers[live])
+                    buffers[live].clear()
+                if live in done:
+                    flushed.add(live)
+                    live = None
+                    continue
+
+            i, text = events.get()
+            if text is None:
+                done.add(i)
+            else:
+                buffers[i].append(text)
+    finally:
+        stop.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def fan_out_stream(message: str, prompt: str = None, failures=None):
+    """
+    Concurrent sub-agent stream for mixed questions; None if the message is not one.
+    `prompt` is what the agents see (the message plus conversation context);
+    sub-agent exceptions are appended to `failures`.
+    """
+    tasks = _fan_out_tasks(message, prompt)
+    return _fan_out_stream(tasks, failures) if tasks else None
+
+
 # ---------------------------------------------------------
 # STREAMING WRAPPER FOR UI
 # ---------------------------------------------------------
 
-def run_agent_stream(message: str):
+def _agent_answer(message: str, prompt: str, agent=None, fan_out: bool = True, failures=None):
+    parallel = fan_out_stream(message, prompt, failures) if fan_out else None
+    if parallel is not None:
+        yield from parallel
+        return
+
+    if agent is not None:
+        with tracing.span(agent.name, kind="agent"):
+            yield from agent.run(message=prompt, stream=True)
+        clear_memory(agent)  # history lives in ConversationContext, not in phi
+        return
+
+    with agent_pool.checkout() as agent, tracing.span(agent.name, kind="agent"):
+        yield from agent.run(message=prompt, stream=True)
+
+def _answer(message: str, prompt: str, agent=None, fan_out: bool = True, context: str = ""):
+    fast = fast_path_answer(message)
+    if fast is not None:
+        yield fast
+        return
+
+    # same intent asked before in the same conversation context, on data
+    # that has not been refreshed since
+    cached_answer = answer_cache.get(message, context)
+    if cached_answer is not None:
+        yield cached_answer
+        return
+
+    parts, failures = [], []
+    for chunk in _agent_answer(message, prompt, agent, fan_out, failures):
+        text = _chunk_text(chunk)
+        if text:
+            parts.append(text)
+        yield chunk
+    if not failures:
+        answer_cache.put(message, "".join(parts), context)
+
+def stream_answer(message: str, agent=None, fan_out: bool = True, context=None):
+    """
+    Answer one message as a stream of chunks:
+     1) fast path (direct tool call, no LLM)
+     2) answer cache (same intent, underlying data unchanged)
+     3) parallel sub-agent fan-out for mixed data + news questions
+     4) the Supervisor team (`agent`, or one checked out of `agent_pool`)
+    With `context` (a conversation.ConversationContext) the agents see a
+    token-bounded summary of the session so far, and the turn is recorded.
+    """
+    if context is None:
+        yield from _answer(message, message, agent, fan_out)
+        return
+
+    rendered = context.render()
+    parts = []
+    for chunk in _answer(message, context.prompt(message, rendered), agent, fan_out, rendered):
+        text = _chunk_text(chunk)
+        if text:
+            parts.append(text)
+        yield chunk
+    context.add_turn(message, "".join(parts))
+
+
+def run_agent_stream(message: str, fan_out: bool = True):
     """
     Streaming generator for Streamlit UI.
+    With fan_out, mixed data + news questions run both sub-agents in parallel.
+    Each call is recorded as one trace (see tracing.last_trace).
     """
     import traceback
     try:
-        agent = get_financial_agent()
-        for chunk in agent.run(message=message, stream=True):
-            yield chunk
+        with tracing.trace(message):
+            yield from stream_answer(message, fan_out=fan_out)
     except Exception as e:
         yield f"Error running agent: {e}\n{traceback.format_exc()}"
 
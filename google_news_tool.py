@@ -1,37 +1,84 @@
 from phi.tools import tool
-from GoogleNews import GoogleNews
+
+import pandas as pd
+
+import tool_output
+from news_fetcher import news_fetcher
+from prefetcher import prefetcher
+from tool_cache import NEWS_TTL, cached
+
+
+def _format_items(items) -> str:
+    text = ""
+    for item in items:
+        title = item.get("title", "No title")
+        date = item.get("date", "Unknown date")
+        link = item.get("link", "")
+        text += (
+            f"### {title}\n"
+            f"- 📅 {date}\n"
+            f"- 🔗 [Read full article]({link})\n\n"
+        )
+    return text
+
+
+def _compact(results) -> str:
+    rows, errors = [], {}
+    for q, items in results.items():
+        if isinstance(items, Exception):
+            errors[q] = str(items)
+            continue
+        rows += [{"query": q, "title": i.get("title"), "date": i.get("date"), "link": i.get("link")} for i in items]
+    meta = {"source": "google_news", "queries": list(results)}
+    if errors:
+        meta["errors"] = errors
+    table = pd.DataFrame(rows).set_index("query") if rows else None
+    return tool_output.compact(meta, table, budget=tool_output.budget_for("google_news_tool"))
+
 
 @tool
+@cached(ttl=NEWS_TTL)
 def google_news_tool(query: str, limit: int = 5):
     """
     Google News search tool.
+    Several tickers or company names separated by commas (e.g. "AAPL, MSFT, NVDA")
+    are searched in parallel in one call, with duplicate stories removed;
+    any other query is searched as written.
     Returns clickable markdown links.
     """
     try:
-        google = GoogleNews(lang='en')
-        google.search(query)
-        results = google.results()
-
+        results = news_fetcher.search(query, limit=limit)
         if not results:
-            return f"No recent Google News found for **{query}**."
-
-        text = f"# 📰 Latest Google News for **{query}**\n\n"
+            return "Error using Google News: empty query"
+        # only queries that loaded are worth refreshing in the background
+        prefetcher.note_news([q for q, items in results.items() if not isinstance(items, Exception)])
 
-        for item in results[:limit]:
-            title = item.get("title", "No title")
-            date = item.get("date", "Unknown date")
-            link = item.get("link", "")
+        if tool_output.is_compact():
+            if all(isinstance(items, Exception) for items in results.values()):
+                raise next(iter(results.values()))
+            return _compact(results)
 
-            # Fix invalid GoogleNews links
-            if link.startswith("./"):
-                link = "https://news.google.com" + link[1:]
+        if len(results) == 1:
+            (q, items), = results.items()
+            if isinstance(items, Exception):
+                raise items
+            if not items:
+                return f"No recent Google News found for **{q}**."
+            return f"# 📰 Latest Google News for **{q}**\n\n" + _format_items(items)
 
-            text += (
-                f"### {title}\n"
-                f"- 📅 {date}\n"
-                f"- 🔗 [Read full article]({link})\n\n"
-            )
+        failed = [q for q, items in results.items() if isinstance(items, Exception)]
+        if len(failed) == len(results):
+            raise results[failed[0]]
 
+        text = f"# 📰 Latest Google News for **{', '.join(results)}**\n\n"
+        for q, items in results.items():
+            text += f"## {q}\n\n"
+            if isinstance(items, Exception):
+                text += f"- ⚠️ Error fetching news: {items}\n\n"
+            elif not items:
+                text += "- No recent stories.\n\n"
+            else:
+                text += _format_items(items)
         return text
 
     except Exception as e:
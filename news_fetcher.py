@@ -0,0 +1,328 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import html
+import re
+import threading
+import xml.etree.ElementTree as ET
+from urllib.parse import quote_plus, urlsplit
+
+import httpx
+
+import tracing
+from fetch_scheduler import STALE_TTL, FlightPriority, is_retryable, scheduler
+from tool_cache import ToolCache, _normalize
+
+
+# ---------------------------
+# Settings
+# ---------------------------
+
+NEWS_FETCH_TTL = 120          # seconds a query's stories are reused
+TITLE_SIMILARITY = 0.8        # token overlap above which two titles are one story
+MAX_CONNECTIONS = 20
+
+RSS_URL = "https://news.google.com/rss/search?q={query}&hl=en-US&gl=US&ceid=US:en"
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64; rv:128.0) Gecko/20100101 Firefox/128.0"
+
+_TAG = re.compile(r"<[^>]+>")
+_WORD = re.compile(r"\w+")
+_SPLIT = re.compile(r"[,;|]")
+# a string is only split when every part is a ticker or a company name
+_TICKER = re.compile(r"^\^?[A-Z0-9][A-Z0-9.=-]{0,9}$")
+_NAME = re.compile(r"^[A-Z0-9][\w.&'-]*(?: (?:&|[A-Z0-9][\w.&'-]*)){0,3}$")
+_COMPANY_SUFFIXES = {"inc", "corp", "co", "ltd", "llc", "plc", "ag", "sa", "nv", "se"}
+
+
+# ---------------------------
+# Google News RSS source
+# ---------------------------
+
+async def google_news_rss(client: httpx.AsyncClient, query: str) -> list:
+    """
+    One Google News RSS search. Items use the same keys the GoogleNews
+    package returned: title, media, date, desc, link.
+    """
+    resp = await client.get(RSS_URL.format(query=quote_plus(query)))
+    resp.raise_for_status()
+    tracing.annotate(bytes=len(resp.content))
+
+    items = []
+    for item in ET.fromstring(resp.content).iter("item"):
+        source = item.find("source")
+        title = (item.findtext("title") or "").strip()
+        media = source.text.strip() if source is not None and source.text else ""
+        if media and title.endswith(f" - {media}"):
+            title = title[: -len(media) - 3]
+        items.append({
+            "title": title,
+            "media": media,
+            "date": (item.findtext("pubDate") or "").strip(),
+            "desc": " ".join(html.unescape(_TAG.sub(" ", item.findtext("description") or "")).split()),
+            "link": (item.findtext("link") or "").strip(),
+        })
+    return items
+
+
+# ---------------------------
+# De-duplication
+# ---------------------------
+
+def _url_key(link: str) -> str:
+    parts = urlsplit(link or "")
+    return (parts.netloc.lower().removeprefix("www.") + parts.path.rstrip("/")).lower()
+
+
+def _title_tokens(title: str) -> frozenset:
+    return frozenset(_WORD.findall((title or "").casefold()))
+
+
+def _similar(a: frozenset, b: frozenset) -> bool:
+    if not a or not b:
+        return False
+    return len(a & b) / len(a | b) >= TITLE_SIMILARITY
+
+
+def dedupe(items, seen_urls=None, seen_titles=None) -> list:
+    """
+    Drop repeated stories: same URL (ignoring scheme, query string and
+    trailing slash) or a near-identical title. Pass the `seen_*` sets to
+    dedupe across several result lists.
+    """
+    seen_urls = set() if seen_urls is None else seen_urls
+    seen_titles = [] if seen_titles is None else seen_titles
+    out = []
+    for item in items:
+        url = _url_key(item.get("link", ""))
+        tokens = _title_tokens(item.get("title", ""))
+        if (url and url in seen_urls) or any(_similar(tokens, t) for t in seen_titles):
+            continue
+        if url:
+            seen_urls.add(url)
+        seen_titles.append(tokens)
+        out.append(item)
+    return out
+
+
+def _is_entity(part: str) -> bool:
+    """A ticker ("NVDA") or a capitalized company name ("Berkshire Hathaway"), not a bare "Inc."."""
+    if part.rstrip(".").casefold() in _COMPANY_SUFFIXES:
+        return False
+    return bool(_TICKER.match(part) or _NAME.match(part))
+
+
+def split_queries(query) -> list:
+    """
+    'AAPL, MSFT; NVDA', 'Apple, Microsoft' or ['AAPL', 'MSFT'] → unique,
+    non-empty queries in order. Any other string ("Tesla, Inc. earnings")
+    stays one query.
+    """
+    if isinstance(query, (list, tuple)):
+        parts = query
+    else:
+        parts = [" ".join(p.split()) for p in _SPLIT.split(query or "")]
+        if not all(_is_entity(p) for p in parts if p):
+            parts = [query or ""]
+    out, seen = [], set()
+    for p in parts:
+        p = " ".join(str(p).split())
+        if p and _normalize(p) not in seen:
+            seen.add(_normalize(p))
+            out.append(p)
+    return out
+
+
+# ---------------------------
+# Fetcher
+# ---------------------------
+
+class NewsFetcher:
+    """
+    Async news search on one background event loop that owns a shared
+    httpx.AsyncClient (keep-alive connections reused across calls).
+
+    - per-query results cached for `ttl` seconds (normalized query key)
+    - identical queries in flight at the same time share one request
+    - several queries are fetched concurrently and de-duplicated
+    - upstream calls go through the fetch scheduler ("google_news"); while
+      Google is throttling us, a query's last stories are served and
+      re-fetched in the background
+
+    Call `search()` from any thread.
+    `source` is an async (client, query) -> [items] callable; swap it for a
+    fake in benchmarks.
+    """
+
+    def __init__(self, source=None, ttl: float = NEWS_FETCH_TTL):
+        self.source = source or google_news_rss
+        self.ttl = ttl
+        self.cache = ToolCache(maxsize=512)
+        self.last_good = ToolCache(maxsize=512)     # served while the provider rejects us
+        self._loop = None
+        self._client = None
+        self._inflight = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    # ---- background loop ----
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="news-fetcher", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def _submit(self, coro) -> concurrent.futures.Future:
+        """Run `coro` on the fetcher loop, carrying the caller's trace context."""
+        loop = self._ensure_loop()
+        ctx = contextvars.copy_context()
+        done = concurrent.futures.Future()
+
+        def finish(task):
+            if task.cancelled():
+                done.cancel()
+            elif task.exception() is not None:
+                done.set_exception(task.exception())
+            else:
+                done.set_result(task.result())
+
+        def start():
+            loop.create_task(coro, context=ctx).add_done_callback(finish)
+
+        loop.call_soon_threadsafe(start)
+        return done
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers={"User-Agent": USER_AGENT},
+                timeout=httpx.Timeout(10.0),
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+            )
+        return self._client
+
+    # ---- fetching (runs on the fetcher loop) ----
+
+    async def _fetch(self, query: str) -> list:
+        key = ("news", _normalize(query))
+        found, items = self.cache.get(key)
+        if found:
+            tracing.annotate(cache_news="hit")
+            return items
+
+        found, stale = self.last_good.get(key)
+        if found and scheduler.rejecting("google_news") and not scheduler.is_background():
+            return self._serve_stale(query, stale)
+
+        tracing.annotate(cache_news="miss")
+        try:
+            return await asyncio.shield(self._upstream_task(query))
+        except Exception as e:
+            if not found or not is_retryable(e):
+                raise
+            return self._serve_stale(query, stale)
+
+    def _serve_stale(self, query: str, items: list) -> list:
+        """Stale-while-revalidate: last good stories now, a background re-fetch for the next call."""
+        tracing.annotate(cache_news="stale")
+        scheduler.served_stale("google_news")
+        with scheduler.background():
+            self._upstream_task(query).add_done_callback(lambda t: t.cancelled() or t.exception())
+        return items
+
+    def _upstream_task(self, query: str) -> asyncio.Future:
+        """The in-flight upstream fetch of `query`, started if there is none."""
+        key = ("news", _normalize(query))
+        flight = self._inflight.get(key)
+        if flight is not None:
+            task, priority = flight
+            priority.join()  # an interactive caller lifts a background refresh
+            return task
+        priority = FlightPriority()
+        with priority.lead():
+            task = asyncio.ensure_future(self._fetch_upstream(query))
+        self._inflight[key] = (task, priority)
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    async def _fetch_upstream(self, query: str) -> list:
+        with tracing.span("google_news", kind="upstream", query=query):
+            items = dedupe(await scheduler.acall("google_news", self.source, self._http(), query))
+        key = ("news", _normalize(query))
+        if items:
+            self.cache.set(key, items, self.ttl)
+            self.last_good.set(key, items, STALE_TTL)
+        self._versions[key] = self._versions.get(key, 0) + 1
+        return items
+
+    async def _search_many(self, queries, limit: int) -> dict:
+        async def one(q):
+            with tracing.span("news_query", kind="fetch", query=q):
+                return await self._fetch(q)
+
+        results = await asyncio.gather(*(one(q) for q in queries), return_exceptions=True)
+
+        out, seen_urls, seen_titles = {}, set(), []
+        for q, items in zip(queries, results):
+            if isinstance(items, BaseException):
+                out[q] = items
+            else:
+                out[q] = dedupe(items, seen_urls, seen_titles)[:limit]
+        return out
+
+    # ---- public API ----
+
+    def search(self, query, limit: int = 5) -> dict:
+        """
+        {query: [items] or Exception} for each query in `query`
+        (a list, or a string with several queries separated by , ; or |).
+        """
+        queries = split_queries(query)
+        if not queries:
+            return {}
+        return self._submit(self._search_many(queries, limit)).result()
+
+    def refresh(self, query):
+        """
+        Fetch each query in `query` upstream now, replacing its cached stories
+        (used by the background prefetcher). Returns {query: [items] or Exception}.
+        """
+        queries = split_queries(query)
+        if not queries:
+            return {}
+
+        async def run():
+            results = await asyncio.gather(*(self._upstream_task(q) for q in queries), return_exceptions=True)
+            return dict(zip(queries, results))
+
+        return self._submit(run()).result()
+
+    def expires_in(self, query: str) -> float:
+        """Seconds before the cached stories of `query` expire (0 if none are cached)."""
+        return self.cache.expires_in(("news", _normalize(query)))
+
+    def version(self, query: str) -> int:
+        """Times `query` has been fetched upstream (bumps on every refresh)."""
+        return self._versions.get(("news", _normalize(query)), 0)
+
+    def clear(self):
+        self.cache.clear()
+        self.last_good.clear()
+
+    def close(self):
+        """Close the HTTP client and stop the background loop."""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        if self._client is not None:
+            client, self._client = self._client, None
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+
+
+# Shared fetcher used by google_news_tool
+news_fetcher = NewsFetcher()
@@ -0,0 +1,267 @@
+import atexit
+import logging
+import os
+import threading
+import time
+
+import tracing
+from fetch_scheduler import scheduler
+from news_fetcher import news_fetcher, split_queries
+from price_store import price_store
+
+
+# ---------------------------
+# Settings
+# ---------------------------
+
+PREFETCH_ENABLED = os.getenv("PREFETCH", "0") == "1"               # off unless PREFETCH=1
+PREFETCH_INTERVAL = float(os.getenv("PREFETCH_INTERVAL", "300"))    # seconds between refresh rounds
+PREFETCH_RATE = float(os.getenv("PREFETCH_RATE", "2"))              # upstream jobs per second, at most
+PREFETCH_WATCHLIST = os.getenv("PREFETCH_WATCHLIST", "")            # "sp500", a file in WATCHLIST_DIR or "AAPL,MSFT"
+
+MAX_HOT = 50                 # symbols learned from tool calls
+MAX_HOT_NEWS = 20            # news queries learned from tool calls
+HOT_HALF_LIFE = 3600         # seconds for a symbol's hotness to halve
+HOT_MIN_SCORE = 0.05         # colder keys (one use, ~4 half-lives ago) stop being refreshed
+MAX_NOTED_BATCH = 20         # larger requests (universe screens) are not learned from
+WATCHLIST_PERIOD = "10y"
+
+# longer periods cover shorter ones in the price store
+_PERIOD_RANK = {p: i for i, p in enumerate(["1mo", "3mo", "6mo", "ytd", "1y", "2y", "5y", "10y", "max"])}
+
+logger = logging.getLogger("agentic.prefetch")
+
+
+# ---------------------------
+# Hot set
+# ---------------------------
+
+class HotSet:
+    """
+    Keys scored by exponentially decayed use counts (half-life `half_life`
+    seconds), each with a small payload. Only the `maxsize` hottest are kept,
+    and keys that cooled below HOT_MIN_SCORE are dropped.
+    """
+
+    def __init__(self, maxsize: int, half_life: float = HOT_HALF_LIFE):
+        self.maxsize = maxsize
+        self.half_life = half_life
+        self._items = {}            # key -> [score, last_seen, payload]
+        self._lock = threading.Lock()
+
+    def _score(self, item, now) -> float:
+        return item[0] * 0.5 ** ((now - item[1]) / self.half_life)
+
+    def note(self, key, merge=None, payload=None):
+        """Count one use of `key`; `merge(old, new)` combines payloads."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self._items[key] = [1.0, now, payload]
+            else:
+                item[0] = self._score(item, now) + 1.0
+                item[1] = now
+                item[2] = merge(item[2], payload) if merge else payload
+            if len(self._items) > 2 * self.maxsize:
+                for k in self._ranked(now)[self.maxsize:]:
+                    del self._items[k]
+
+    def _ranked(self, now):
+        scores = {k: self._score(item, now) for k, item in self._items.items()}
+        for k in [k for k, score in scores.items() if score < HOT_MIN_SCORE]:
+            del self._items[k], scores[k]
+        return sorted(scores, key=scores.get, reverse=True)
+
+    def top(self) -> list:
+        """[(key, payload)] hottest first, at most `maxsize`."""
+        now = time.monotonic()
+        with self._lock:
+            return [(k, self._items[k][2]) for k in self._ranked(now)[: self.maxsize]]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+def _longer(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a if _PERIOD_RANK.get(a, -1) >= _PERIOD_RANK.get(b, -1) else b
+
+
+def _merge_need(old, new):
+    """(longest period, needs metrics) of two uses of a symbol."""
+    return _longer(old[0], new[0]), old[1] or new[1]
+
+
+# ---------------------------
+# Background prefetcher
+# ---------------------------
+
+class Prefetcher:
+    """
+    Keeps the data of hot tickers warm so chat turns rarely wait on upstream.
+
+    Tools report what they read (`note_prices`, `note_metrics`, `note_news`).
+    A daemon thread then refreshes, every `interval` seconds:
+    - the price history of the hottest symbols and of the watchlist (into the
+      disk store and the in-memory column store, plus their metrics state)
+    - the stories of hot news queries, before their cached copy expires
+
+    Fresh data is skipped without touching upstream, and upstream jobs run at
+    most `rate` per second, queued behind interactive calls in the fetch
+    scheduler. `stop()` (also run at exit) ends the thread
+    between jobs.
+    """
+
+    def __init__(self, store=price_store, news=news_fetcher, interval: float = PREFETCH_INTERVAL,
+                 rate: float = PREFETCH_RATE, watchlist: str = PREFETCH_WATCHLIST):
+        self.store = store
+        self.news = news
+        self.interval = interval
+        self.rate = rate
+        self.watchlist = watchlist
+        self.symbols = HotSet(MAX_HOT)
+        self.queries = HotSet(MAX_HOT_NEWS)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self.rounds = 0
+        self.refreshed = 0
+        self.skipped = 0
+        self.errors = 0
+
+    # ---- learning ----
+
+    def note_prices(self, symbols, period: str):
+        symbols = list(symbols)
+        if len(symbols) > MAX_NOTED_BATCH:
+            return
+        for sym in symbols:
+            self.symbols.note(sym, _merge_need, (period, False))
+
+    def note_metrics(self, symbol: str, period: str):
+        self.symbols.note(symbol, _merge_need, (period, True))
+
+    def note_news(self, query):
+        for q in split_queries(query)[:MAX_NOTED_BATCH]:
+            self.queries.note(q)
+
+    # ---- planning ----
+
+    def _watchlist(self) -> list:
+        if not self.watchlist:
+            return []
+        import screener  # only when a watchlist is configured
+
+        try:
+            return screener.load_universe(self.watchlist)
+        except Exception as e:
+            logger.warning("prefetch watchlist unavailable: %s", e)
+            return []
+
+    def plan(self) -> list:
+        """Jobs for one round: ("prices", symbol, period, metrics) and ("news", query)."""
+        needs = dict(self.symbols.top())
+        for sym in self._watchlist():
+            needs[sym] = _merge_need(needs.get(sym, (None, False)), (WATCHLIST_PERIOD, False))
+
+        jobs = [("prices", sym, period or "1y", metrics) for sym, (period, metrics) in needs.items()]
+        return jobs + [("news", q) for q, _ in self.queries.top()]
+
+    # ---- running ----
+
+    def _throttle(self) -> bool:
+        """Wait for the next upstream slot; False if stopped meanwhile."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1.0 / self.rate
+        return not self._stop.wait(slot - now)
+
+    def _prices(self, symbol: str, period: str, metrics: bool):
+        if self.store.is_fresh(symbol, period):
+            self.store.closes(symbol, period)      # no upstream: just keep it in memory
+            self.skipped += 1
+            return
+        if not self._throttle():
+            return
+        with tracing.span("prefetch_prices", kind="background", symbol=symbol, period=period):
+            self.store.closes(symbol, period)
+            if metrics:
+                self.store.metrics(symbol, "10y")
+        self.refreshed += 1
+
+    def _news(self, query: str):
+        # refresh only stories that would expire before the next round
+        if self.news.expires_in(query) > self.interval:
+            self.skipped += 1
+            return
+        if not self._throttle():
+            return
+        with tracing.span("prefetch_news", kind="background", query=query):
+            result = self.news.refresh(query).get(query)
+        if isinstance(result, BaseException):
+            raise result
+        self.refreshed += 1
+
+    def run_once(self):
+        """One refresh round (callable directly, e.g. at startup or in tests)."""
+        for job in self.plan():
+            if self._stop.is_set():
+                return
+            try:
+                if job[0] == "prices":
+                    self._prices(*job[1:])
+                else:
+                    self._news(job[1])
+            except Exception as e:
+                self.errors += 1
+                logger.warning("prefetch %s failed: %s", job[:2], e)
+        self.rounds += 1
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            with scheduler.background():   # behind every interactive upstream call
+                self.run_once()
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def start(self):
+        """Start the background thread (no-op if running or PREFETCH is not 1)."""
+        if not PREFETCH_ENABLED:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="prefetcher", daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout: float = 10.0):
+        """Signal the thread and wait for its current job to finish."""
+        self._stop.set()
+        with self._lock:
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "running": bool(self._thread and self._thread.is_alive()),
+            "rounds": self.rounds,
+            "refreshed": self.refreshed,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "hot_symbols": [s for s, _ in self.symbols.top()],
+            "hot_news": [q for q, _ in self.queries.top()],
+        }
+
+
+# Shared prefetcher fed by the tools
+prefetcher = Prefetcher()
@@ -0,0 +1,554 @@
+import json
+import os
+import re
+import shutil
+import threading
+from datetime import datetime, time as dtime, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+import tracing
+from column_store import ColumnStore
+from fetch_scheduler import FlightPriority, is_retryable, scheduler
+from running_metrics import RunningMetrics, trading_dates
+from singleflight import SingleFlight
+
+
+# ---------------------------
+# Settings
+# ---------------------------
+
+CACHE_DIR = os.getenv(
+    "PRICE_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".price_cache"),
+)
+
+COLUMNS = ["Open", "High", "Low", "Close", "Volume", "Dividends", "Stock Splits"]
+
+# US equity session (holidays are not modelled; a holiday only costs one extra refresh)
+MARKET_TZ = ZoneInfo("America/New_York")
+MARKET_OPEN = dtime(9, 30)
+MARKET_CLOSE = dtime(16, 0)
+
+# How old cached bars may get while the market is open
+INTRADAY_TTL = timedelta(minutes=15)
+
+# Relative Close change of an already stored, settled bar that means Yahoo
+# re-adjusted the history (split or dividend) since it was stored
+READJUST_TOLERANCE = 1e-4
+
+_PERIOD_OFFSETS = {
+    "1mo": pd.DateOffset(months=1),
+    "3mo": pd.DateOffset(months=3),
+    "6mo": pd.DateOffset(months=6),
+    "1y": pd.DateOffset(years=1),
+    "2y": pd.DateOffset(years=2),
+    "5y": pd.DateOffset(years=5),
+    "10y": pd.DateOffset(years=10),
+}
+
+
+# ---------------------------
+# Internal helpers
+# ---------------------------
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _period_start(period: str, now: datetime):
+    """
+    First calendar day a yfinance `period` covers, as a naive date Timestamp.
+    Returns None for "max". Day-count periods ("5d") are handled by the caller.
+    """
+    now_et = now.astimezone(MARKET_TZ)
+    today = pd.Timestamp(now_et.date())
+    if period == "max":
+        return None
+    if period == "ytd":
+        return pd.Timestamp(year=today.year, month=1, day=1)
+    if period in _PERIOD_OFFSETS:
+        return today - _PERIOD_OFFSETS[period]
+    raise ValueError(f"Unsupported period: {period}")
+
+
+@lru_cache(maxsize=32)
+def _coverage_start(period: str, today):
+    """`_period_start` for a market date (memoized for bulk coverage checks)."""
+    return _period_start(period, datetime.combine(today, MARKET_CLOSE, tzinfo=MARKET_TZ))
+
+
+def _day_count(period: str):
+    """Return N for "Nd" periods (N trading sessions), else None."""
+    m = re.fullmatch(r"(\d+)d", period)
+    return int(m.group(1)) if m else None
+
+
+def _last_market_close(now: datetime) -> datetime:
+    """Most recent weekday 16:00 New York time at or before `now`."""
+    now_et = now.astimezone(MARKET_TZ)
+    day = now_et.date()
+    if now_et.time() < MARKET_CLOSE:
+        day -= timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return datetime.combine(day, MARKET_CLOSE, tzinfo=MARKET_TZ)
+
+
+def is_market_open(now: datetime = None) -> bool:
+    now_et = (now or _now()).astimezone(MARKET_TZ)
+    return now_et.weekday() < 5 and MARKET_OPEN <= now_et.time() < MARKET_CLOSE
+
+
+def is_stale(fetched_at: datetime, now: datetime = None) -> bool:
+    """
+    Cached bars are stale when:
+    - the market is open and they are older than INTRADAY_TTL, or
+    - the market is closed and they were fetched before the last close.
+    """
+    now = now or _now()
+    if is_market_open(now):
+        return now - fetched_at > INTRADAY_TTL
+    return fetched_at < _last_market_close(now)
+
+
+def _yf_fetch(symbol: str, period: str = None, start=None):
+    """Default upstream fetcher: one yfinance history call."""
+    ticker = yf.Ticker(symbol)
+    if start is not None:
+        return ticker.history(start=start)
+    return ticker.history(period=period)
+
+
+# ---------------------------
+# On-disk columnar store
+# ---------------------------
+
+class PriceStore:
+    """
+    Per-symbol OHLCV cache kept as one .npy file per column (memory-mapped on read).
+
+    Layout: <root>/<SYMBOL>/{index,Open,High,...}.npy + meta.json [+ metrics_<period>.json]
+    - index.npy holds UTC nanoseconds; meta.json keeps the exchange tz,
+      the earliest period start the data covers and the last refresh time.
+    - metrics_<period>.json holds a RunningMetrics state, advanced with each
+      refresh's new bars so analysis never needs a pass over the history.
+    - A shorter period is answered by slicing a longer cached one.
+    - Stale data is topped up by fetching only bars since the last stored date.
+      Yahoo's prices are split / dividend adjusted, so when the overlapping
+      bar no longer matches or a new bar carries a split or dividend, the
+      whole covered period is downloaded again instead.
+    - Concurrent requests for the same (symbol, period) share one fetch.
+    - Upstream calls go through the fetch scheduler ("yahoo" provider). While
+      Yahoo is throttling us, stale bars are served and refreshed in the
+      background.
+    """
+
+    def __init__(self, root: str = CACHE_DIR, fetcher=None):
+        self.root = root
+        self.fetcher = fetcher or _yf_fetch
+        self._lock = threading.Lock()
+        self._flight = SingleFlight(FlightPriority)
+        self.memory = ColumnStore()
+
+    # ---- paths / io ----
+
+    def _dir(self, symbol: str) -> str:
+        safe = re.sub(r"[^A-Z0-9.^=_-]", "_", symbol)
+        return os.path.join(self.root, safe)
+
+    def _read_meta(self, symbol: str):
+        path = os.path.join(self._dir(symbol), "meta.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _load(self, symbol: str, meta: dict):
+        d = self._dir(symbol)
+        try:
+            index = np.load(os.path.join(d, "index.npy"), mmap_mode="r")
+            cols = {c: np.load(os.path.join(d, f"{c}.npy"), mmap_mode="r") for c in meta["columns"]}
+        except (OSError, ValueError):
+            return None
+        if any(len(v) != len(index) for v in cols.values()):
+            return None  # torn write from another process; treat as a miss
+
+        idx = pd.DatetimeIndex(np.asarray(index).view("datetime64[ns]")).tz_localize("UTC")
+        if meta.get("tz"):
+            idx = idx.tz_convert(meta["tz"])
+        idx.name = "Date"
+        return pd.DataFrame({c: np.asarray(v) for c, v in cols.items()}, index=idx)
+
+    def _save(self, symbol: str, df: pd.DataFrame, covered_from, fetched_at: datetime):
+        d = self._dir(symbol)
+        os.makedirs(d, exist_ok=True)
+
+        idx = df.index
+        tz = str(idx.tz) if idx.tz is not None else None
+        utc = idx.tz_convert("UTC") if idx.tz is not None else idx
+        columns = [c for c in COLUMNS if c in df.columns]
+
+        arrays = {"index": utc.as_unit("ns").asi8.astype(np.int64)}
+        for c in columns:
+            arrays[c] = df[c].to_numpy(dtype=np.float64)
+
+        self.memory.drop(symbol)  # re-read on next use
+        with self._lock:
+            for name, arr in arrays.items():
+                tmp = os.path.join(d, f".{name}.tmp.npy")
+                np.save(tmp, arr)
+                os.replace(tmp, os.path.join(d, f"{name}.npy"))
+
+            meta = {
+                "tz": tz,
+                "columns": columns,
+                "covered_from": covered_from.isoformat() if covered_from is not None else None,
+                "fetched_at": fetched_at.isoformat(),
+            }
+            tmp = os.path.join(d, ".meta.tmp.json")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp, os.path.join(d, "meta.json"))
+
+    # ---- coverage ----
+
+    @staticmethod
+    def _covers(meta: dict, start) -> bool:
+        covered_from = meta.get("covered_from")
+        if covered_from is None:
+            return True  # cached with period="max"
+        if start is None:
+            return False
+        return pd.Timestamp(covered_from) <= start
+
+    @staticmethod
+    def _slice(df: pd.DataFrame, period: str, start):
+        n = _day_count(period)
+        if n is not None:
+            return df.iloc[-n:]
+        if start is None:
+            return df
+        dates = df.index.tz_localize(None).normalize() if df.index.tz is not None else df.index.normalize()
+        return df[dates >= start]
+
+    def _fetch(self, symbol: str, **kwargs):
+        """One upstream call, recorded as a tracing span with the payload size."""
+        with tracing.span("yfinance", kind="upstream", symbol=symbol, **kwargs) as sp:
+            df = scheduler.call("yahoo", self.fetcher, symbol, **kwargs)
+            if df is not None:
+                sp.set(bytes=int(df.memory_usage(index=True).sum()))
+            return df
+
+    # ---- public API ----
+
+    def history(self, symbol: str, period: str = "1y") -> pd.DataFrame:
+        """
+        Return a yfinance-shaped history DataFrame for `symbol` over `period`.
+        Raises whatever the fetcher raises; an empty frame means no data.
+        Callers that race on the same (symbol, period) wait for one upstream fetch.
+        """
+        return self._flight.do((symbol, period), self._history, symbol, period)
+
+    async def ahistory(self, symbol: str, period: str = "1y") -> pd.DataFrame:
+        """Async variant of `history`; coalesces with threads and other tasks."""
+        return await self._flight.do_async((symbol, period), self._history, symbol, period)
+
+    def _history(self, symbol: str, period: str) -> pd.DataFrame:
+        now = _now()
+        n = _day_count(period)
+        # Day-count periods ride on a 1-month cache so they can always be sliced
+        start = _period_start("1mo" if n is not None else period, now)
+
+        meta = self._read_meta(symbol)
+        df = self._load(symbol, meta) if meta else None
+
+        if df is None or df.empty or not self._covers(meta, start):
+            tracing.annotate(cache_price="miss")
+            fetch_period = "1mo" if n is not None else period
+            df = self._fetch(symbol, period=fetch_period)
+            if df is None or df.empty:
+                return df
+            self._drop_metrics(symbol)  # a full download may be re-adjusted (splits, dividends)
+            self._save(symbol, df, start, now)
+            return self._slice(df, period, start)
+
+        if is_stale(datetime.fromisoformat(meta["fetched_at"]), now):
+            if scheduler.rejecting("yahoo") and not scheduler.is_background():
+                return self._serve_stale(symbol, df, period, start)
+            tracing.annotate(cache_price="refresh")
+            try:
+                df = self._refresh(symbol, df, meta, now)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                return self._serve_stale(symbol, df, period, start)
+        else:
+            tracing.annotate(cache_price="hit")
+
+        return self._slice(df, period, start)
+
+    def _serve_stale(self, symbol: str, df: pd.DataFrame, period: str, start):
+        """Stale-while-revalidate: answer from the stored bars, refresh them in the background."""
+        tracing.annotate(cache_price="stale")
+        scheduler.served_stale("yahoo")
+        scheduler.revalidate(("yahoo", symbol, period), self.history, symbol, period)
+        return self._slice(df, period, start)
+
+    @staticmethod
+    def _readjusted(df: pd.DataFrame, new: pd.DataFrame, ref_day) -> bool:
+        """
+        True when `new` (fetched from `ref_day` on) shows the stored history
+        is no longer adjusted like Yahoo's: the settled `ref_day` Close moved,
+        or a later bar carries a split or a dividend.
+        """
+        def closes_on(frame):
+            dates = frame.index.tz_localize(None) if frame.index.tz is not None else frame.index
+            return frame["Close"].to_numpy()[dates.normalize() == pd.Timestamp(ref_day)]
+
+        if "Close" in new.columns and "Close" in df.columns:
+            old, fresh = closes_on(df), closes_on(new)
+            if old.size and fresh.size and not np.isclose(fresh[-1], old[-1], rtol=READJUST_TOLERANCE, atol=0.0):
+                return True
+
+        def events(frame):
+            cols = [c for c in ("Stock Splits", "Dividends") if c in frame.columns]
+            dates = frame.index.tz_localize(None) if frame.index.tz is not None else frame.index
+            out = frame[cols].fillna(0.0).set_axis(dates.normalize())
+            return out[(out.index > pd.Timestamp(ref_day)) & (out != 0.0).any(axis=1)]
+
+        # a split / dividend not already in the stored copy of that bar
+        known = events(df)
+        for day, row in events(new).iterrows():
+            if day not in known.index or not known.loc[[day]].iloc[-1].reindex(row.index).equals(row):
+                return True
+        return False
+
+    def _redownload(self, symbol: str, meta: dict, now: datetime):
+        """Fetch the whole covered period again (after a re-adjustment) and reset the metrics state."""
+        covered_from = pd.Timestamp(meta["covered_from"]) if meta.get("covered_from") else None
+        if covered_from is None:
+            df = self._fetch(symbol, period="max")
+        else:
+            df = self._fetch(symbol, start=covered_from.date().isoformat())
+        if df is None or df.empty:
+            raise ValueError(f"re-download of {symbol} returned no data")
+        self._drop_metrics(symbol)
+        self._save(symbol, df, covered_from, now)
+        return df
+
+    def _refresh(self, symbol: str, df: pd.DataFrame, meta: dict, now: datetime):
+        """
+        Fetch bars from the last settled stored session onward and merge them
+        in; the overlapping session is compared with the stored one to catch
+        a split / dividend re-adjustment.
+        """
+        # the last bar may be an intraday one whose Close legitimately moves;
+        # the one before it is settled
+        ref_day = df.index[-2 if len(df) > 1 else -1].date()
+        new = self._fetch(symbol, start=ref_day.isoformat())
+        if new is not None and not new.empty:
+            if df.index.tz is not None and new.index.tz is not None:
+                new.index = new.index.tz_convert(df.index.tz)
+            if self._readjusted(df, new, ref_day):
+                tracing.annotate(cache_price="readjust")
+                return self._redownload(symbol, meta, now)
+            new = new[[c for c in df.columns if c in new.columns]]
+            df = pd.concat([df, new])
+            df = df[~df.index.duplicated(keep="last")].sort_index()
+
+        covered_from = pd.Timestamp(meta["covered_from"]) if meta.get("covered_from") else None
+        self._save(symbol, df, covered_from, now)
+        if new is not None and not new.empty and "Close" in new.columns:
+            self._advance_metrics(symbol, new)
+        return df
+
+    # ---- incremental metrics ----
+
+    def _metrics_path(self, symbol: str, period: str) -> str:
+        return os.path.join(self._dir(symbol), f"metrics_{period}.json")
+
+    def _read_metrics(self, symbol: str, period: str):
+        try:
+            with open(self._metrics_path(symbol, period), "r", encoding="utf-8") as f:
+                return RunningMetrics.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _save_metrics(self, symbol: str, period: str, state: RunningMetrics):
+        path = self._metrics_path(symbol, period)
+        tmp = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+        with self._lock:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state.to_dict(), f)
+            os.replace(tmp, path)
+
+    def _drop_metrics(self, symbol: str):
+        d = self._dir(symbol)
+        if os.path.isdir(d):
+            for name in os.listdir(d):
+                if name.startswith("metrics_"):
+                    try:
+                        os.remove(os.path.join(d, name))
+                    except OSError:
+                        pass
+
+    def _advance_metrics(self, symbol: str, new: pd.DataFrame):
+        """Fold freshly fetched bars into every stored metrics state of `symbol` (O(1) per bar)."""
+        d = self._dir(symbol)
+        periods = [n[len("metrics_"):-len(".json")] for n in os.listdir(d)
+                   if n.startswith("metrics_") and n.endswith(".json")]
+        if not periods:
+            return
+        days, closes = trading_dates(new.index), new["Close"].to_numpy(dtype=np.float64)
+        for period in periods:
+            state = self._read_metrics(symbol, period)
+            if state is None:
+                continue
+            state.extend(days, closes)
+            self._save_metrics(symbol, period, state)
+
+    def is_fresh(self, symbol: str, period: str) -> bool:
+        """True when cached bars cover `period` and need no refresh (no upstream call would be made)."""
+        meta = self._read_meta(symbol)
+        if not meta:
+            return False
+        covered_from = pd.Timestamp(meta["covered_from"]) if meta.get("covered_from") else None
+        return self.covers(covered_from, period) and not is_stale(datetime.fromisoformat(meta["fetched_at"]))
+
+    def covers(self, covered_from, period: str) -> bool:
+        """Whether data starting at `covered_from` (None: all history) reaches back over `period`."""
+        if covered_from is None:
+            return True
+        if period is None or period == "max":
+            return False
+        return pd.Timestamp(covered_from) <= _coverage_start(period, _now().astimezone(MARKET_TZ).date())
+
+    def closes(self, symbol: str, period: str = "1y"):
+        """
+        (trading dates, Close prices) of `symbol` over `period` as zero-copy
+        views into the in-memory column store, loading it from `history`
+        (disk, then upstream) when it is missing, stale or too short.
+        Returns None when there is no data.
+        """
+        now = _now()
+        n = _day_count(period)
+        start = _period_start("1mo" if n is not None else period, now)
+
+        hit = self.memory.get(symbol, start)
+        if hit is not None:
+            days, values, fetched_at, covered_from = hit
+            if not is_stale(fetched_at, now) and (covered_from is None or (start is not None and covered_from <= start)):
+                tracing.annotate(cache_memory="hit")
+                return (days[-n:], values[-n:]) if n is not None else (days, values)
+
+        tracing.annotate(cache_memory="miss")
+        df = self.history(symbol, period)
+        if df is None or df.empty or "Close" not in df.columns:
+            return None
+        meta = self._read_meta(symbol) or {}
+        fetched_at = datetime.fromisoformat(meta["fetched_at"]) if meta.get("fetched_at") else now
+        idx = df.index.tz_localize(None) if df.index.tz is not None else df.index
+        days = idx.normalize().as_unit("ns").to_numpy()
+        self.memory.put(symbol, days, df["Close"].to_numpy(), fetched_at, start)
+
+        hit = self.memory.get(symbol, start)
+        if hit is None:  # evicted straight away (budget smaller than one symbol)
+            return days, df["Close"].to_numpy(dtype=self.memory.dtype)
+        days, values = hit[0], hit[1]
+        return (days[-n:], values[-n:]) if n is not None else (days, values)
+
+    def metrics(self, symbol: str, period: str = "10y") -> RunningMetrics:
+        """
+        Incremental return / risk state of `symbol` over `period` (a calendar
+        period such as "1y" or "10y"). While the cached bars are fresh this
+        is two small file reads, whatever the history length. Otherwise the
+        history is refreshed first, which folds the new bars into the state.
+        The state is rebuilt from the stored bars (one full pass) when it is
+        missing or its start has drifted more than REBASE_DAYS behind the
+        period start. Raises ValueError for day-count periods.
+        """
+        if period == "max" or _day_count(period) is not None:
+            raise ValueError(f"Unsupported metrics period: {period}")
+        return self._flight.do((symbol, period, "metrics"), self._metrics, symbol, period)
+
+    def _metrics(self, symbol: str, period: str):
+        start = _period_start(period, _now())
+        meta = self._read_meta(symbol)
+        state = self._read_metrics(symbol, period) if meta else None
+        if (state is not None and self._covers(meta, start) and not state.drifted(start.date())
+                and not is_stale(datetime.fromisoformat(meta["fetched_at"]))):
+            tracing.annotate(cache_metrics="hit")
+            return state
+
+        df = self.history(symbol, period)  # refreshes stale bars, advancing stored states
+        if df is None or df.empty:
+            return None
+        state = self._read_metrics(symbol, period)
+        last_day = trading_dates(df.index[-1:])[0]
+        if state is None or state.drifted(start.date()) or state.last_date != last_day:
+            tracing.annotate(cache_metrics="rebuild")
+            state = RunningMetrics.from_closes(trading_dates(df.index), df["Close"].to_numpy(dtype=np.float64))
+            self._save_metrics(symbol, period, state)
+        else:
+            tracing.annotate(cache_metrics="advance")
+        return state
+
+    def local_closes(self, symbol: str, period: str = None):
+        """
+        Raw (UTC nanosecond timestamps, Close prices, meta) straight
+        from disk, or None if `symbol` is not stored or its data does not
+        cover `period`. Never fetches and ignores staleness: bulk readers
+        (the screener) take whatever the store holds and report its as-of
+        date. Timestamps are left unconverted so callers can convert many
+        symbols in one go.
+        """
+        meta = self._read_meta(symbol)
+        if not meta or "Close" not in meta.get("columns", ()):
+            return None
+        if period is not None and not self._covers(meta, _coverage_start(period, _now().astimezone(MARKET_TZ).date())):
+            return None
+        d = self._dir(symbol)
+        try:
+            index = np.load(os.path.join(d, "index.npy"))
+            close = np.load(os.path.join(d, "Close.npy"))
+        except (OSError, ValueError):
+            return None
+        if len(index) != len(close) or not len(index):
+            return None
+        return index, close, meta
+
+    def version(self, symbol: str):
+        """
+        Opaque token that changes whenever `symbol`'s cached bars are fetched,
+        refreshed or dropped; None if nothing is cached or the bars are stale.
+        Lets derived results (e.g. cached answers) tell if they are still current.
+        """
+        meta = self._read_meta(symbol.upper().strip())
+        if meta is None:
+            return None
+        fetched_at = datetime.fromisoformat(meta["fetched_at"])
+        return None if is_stale(fetched_at) else meta["fetched_at"]
+
+    def invalidate(self, symbol: str = None):
+        """Drop cached bars for one symbol, or for every symbol when none is given."""
+        with self._lock:
+            if symbol is None:
+                shutil.rmtree(self.root, ignore_errors=True)
+            else:
+                shutil.rmtree(self._dir(symbol.upper().strip()), ignore_errors=True)
+        self.memory.drop(None if symbol is None else symbol.upper().strip())
+
+
+# Shared default store used by the tools
+price_store = PriceStore()
+
+
+def invalidate(symbol: str = None):
+    """Explicit invalidation hook for the shared store."""
+    price_store.invalidate(symbol)
@@ -0,0 +1,316 @@
+import os
+import re
+import threading
+from typing import NamedTuple, Optional
+
+
+# ---------------------------
+# Settings
+# ---------------------------
+
+# Routes scoring below this go to the Supervisor LLM instead
+MIN_CONFIDENCE = float(os.getenv("ROUTER_MIN_CONFIDENCE", "0.75"))
+
+
+# ---------------------------
+# Patterns (README "Supported Queries")
+# ---------------------------
+
+_SYMBOL = re.compile(r"(?<![\w$])\$?([A-Z]{1,5}(?:[.-][A-Z]{1,2})?)\b")
+_NOT_SYMBOLS = {
+    "I", "A", "AN", "THE", "US", "USA", "CEO", "CFO", "ETF", "AI", "YTD", "TL", "DR", "TLDR",
+    "VS", "OR", "AND", "OF", "ON", "IN", "TO", "ME", "MY", "IS", "IT", "EPS", "PE", "IPO",
+    "GDP", "USD", "EUR", "API", "FAQ", "OK",
+}
+
+_NEWS = re.compile(r"\b(news|headlines?)\b", re.I)
+_NEWS_QUERY = re.compile(r"\b(?:news|headlines?)\s+(?:about|on|for|regarding|of)\s+(.+?)[\s?.!]*$", re.I)
+_COMPARE = re.compile(r"\b(compare|comparison|vs\.?|versus|against|rank|ranking)\b", re.I)
+_PERFORMANCE = re.compile(r"\b(performance|performed|perform|returns?|analysis|analy[sz]e|done)\b", re.I)
+_TEN_YEAR = re.compile(r"\b(10|ten)[- ]?(y|yr|yrs|years?)\b|\bdecade\b", re.I)
+_ONE_YEAR = re.compile(r"\b(1|one)[- ]?(y|yr|year)\b|\b(past|last|this) year\b|\b12[- ]?months?\b", re.I)
+_CORRELATION = re.compile(r"\b(correlat\w*|covariance|co-?move\w*|diversif\w*)\b", re.I)
+_OTHER_HORIZON = re.compile(r"\b([2-9]|[1-9]\d)[- ]?(y|yr|yrs|years?|months?|mo|days?|weeks?)\b|\bytd\b", re.I)
+# a calendar year or quarter: the fast-path tools only look back from today
+_DATES = re.compile(r"\b(19|20)\d{2}\b|\bQ[1-4]\b", re.I)
+
+# wording that asks for judgement or data the fast-path tools do not produce
+_NEEDS_LLM = re.compile(
+    r"\b(why|should|predict|forecast|recommend\w*|buy|sell|explain|outlook|target|fundamentals?|"
+    r"dividends?|earnings|valuation|opinion|think|price of|current price)\b",
+    re.I,
+)
+
+
+# lookbacks correlation_tool accepts, keyed by canonical horizon
+_CORRELATION_PERIODS = {"6m": "6mo", "1y": "1y", "2y": "2y", "5y": "5y", "10y": "10y"}
+
+
+class Route(NamedTuple):
+    intent: str
+    tool: str
+    args: dict
+    confidence: float
+
+
+# ---------------------------
+# Counters
+# ---------------------------
+
+_lock = threading.Lock()
+_counts = {"routed": 0, "fallback": 0}
+
+
+def record(routed: bool):
+    with _lock:
+        _counts["routed" if routed else "fallback"] += 1
+
+
+def stats() -> dict:
+    """How many messages were answered without / with the LLM."""
+    with _lock:
+        return dict(_counts)
+
+
+# ---------------------------
+# Classifier
+# ---------------------------
+
+def extract_symbols(message: str) -> list:
+    """
+    Upper-case ticker-like tokens in order of appearance, de-duplicated.
+    Single letters around a slash are ratios ("P/E", "P/B"), not tickers.
+    """
+    text = message or ""
+    found = []
+    for m in _SYMBOL.finditer(text):
+        sym = m.group(1)
+        if len(sym) == 1 and "/" in (text[m.start() - 1:m.start()] + text[m.end():m.end() + 1]):
+            continue
+        found.append(sym)
+    return list(dict.fromkeys(s for s in found if s not in _NOT_SYMBOLS))
+
+
+def is_mixed(message: str) -> bool:
+    """A data question and a news question about named symbols in one message."""
+    text = message or ""
+    if not _NEWS.search(text) or not extract_symbols(text):
+        return False
+    return bool(_COMPARE.search(text) or _PERFORMANCE.search(text) or _TEN_YEAR.search(text) or _ONE_YEAR.search(text)
+                or _CORRELATION.search(text))
+
+
+def classify(message: str) -> Optional[Route]:
+    """
+    Map a message to one fast-path tool call, or None when it is not one of
+    the supported query shapes. Confidence is lowered for anything that
+    looks like it needs reasoning, not just numbers.
+    """
+    text = (message or "").strip()
+    if not text:
+        return None
+
+    symbols = extract_symbols(text)
+    news = bool(_NEWS.search(text))
+    compare = bool(_COMPARE.search(text))
+    performance = bool(_PERFORMANCE.search(text))
+    ten_year = bool(_TEN_YEAR.search(text))
+    one_year = bool(_ONE_YEAR.search(text))
+    correlation = bool(_CORRELATION.search(text))
+    other_horizon = bool(_OTHER_HORIZON.search(_TEN_YEAR.sub(" ", text)))
+
+    penalty = 0.3 if _NEEDS_LLM.search(text) else 0.0
+    if other_horizon:
+        penalty += 0.3
+
+    horizons_asked = horizons(text)
+    several_horizons = len(horizons_asked) >= 2 or (horizons_asked and horizons_asked[0] not in ("1y", "10y"))
+    # "compare" alone could be about anything (CEOs, market cap); the tools compare returns
+    compare_returns = compare and (performance or one_year or ten_year)
+    # words, dates or quarters the fast-path tools have no argument for
+    off_topic = bool(unrouted_words(text) or _DATES.search(text))
+
+    route = None
+    if news:
+        if compare or performance or ten_year or one_year or correlation:
+            return None  # mixed data + news question: leave it to the agents
+        m = _NEWS_QUERY.search(text)
+        query = m.group(1) if m else " ".join(symbols)
+        if query:
+            route = Route("news", "google_news_tool", {"query": query}, 0.9)
+    elif correlation and len(symbols) >= 2:
+        periods = [_CORRELATION_PERIODS.get(h) for h in horizons_asked]
+        args = {"symbols": ",".join(symbols)}
+        if len(periods) == 1 and periods[0]:
+            args["period"] = periods[0]
+        # a supported lookback is an argument here, not an unsupported horizon
+        penalty = 0.3 if _NEEDS_LLM.search(text) else 0.0
+        if len(periods) > 1 or (periods and not periods[0]):
+            penalty += 0.3
+        route = Route("correlation", "correlation_tool", args, 0.9)
+    elif several_horizons and (performance or compare) and 1 <= len(symbols) <= 5:
+        # one download per symbol covers every horizon; the horizon penalty does not apply
+        penalty = 0.3 if _NEEDS_LLM.search(text) else 0.0
+        route = Route("multi_horizon", "multi_horizon_analysis_tool",
+                      {"symbols": ",".join(symbols), "horizons": ",".join(horizons_asked)}, 0.9)
+    elif compare_returns and len(symbols) >= 3 and not one_year:
+        route = Route("multi_compare", "compare_multi_stocks_tool", {"symbols": ",".join(symbols)}, 0.9)
+    elif compare_returns and len(symbols) == 2 and ten_year:
+        route = Route("multi_compare", "compare_multi_stocks_tool", {"symbols": ",".join(symbols)}, 0.9)
+    elif compare_returns and len(symbols) == 2:
+        route = Route("compare", "compare_stocks_tool", {"symbol1": symbols[0], "symbol2": symbols[1]},
+                      0.9 if one_year else 0.8)
+    elif len(symbols) == 1 and ten_year and (performance or not compare):
+        route = Route("ten_year", "ten_year_analysis_tool", {"symbol": symbols[0]}, 0.9 if performance else 0.8)
+    elif len(symbols) == 1 and one_year and performance:
+        route = Route("one_year", "one_year_tool", {"symbol": symbols[0]}, 0.9)
+
+    if route is None:
+        return None
+    if off_topic and route.intent != "news":
+        penalty += 0.3
+    return route._replace(confidence=round(max(0.0, route.confidence - penalty), 2))
+
+
+def route(message: str, min_confidence: float = None) -> Optional[Route]:
+    """`classify` with the confidence threshold applied."""
+    r = classify(message)
+    threshold = MIN_CONFIDENCE if min_confidence is None else min_confidence
+    if r is None or r.confidence < threshold:
+        return None
+    return r
+
+
+# ---------------------------
+# Intent keys (answer cache)
+# ---------------------------
+
+_WORDS = re.compile(r"[a-z]+")
+_STOPWORDS = {
+    "a", "an", "the", "of", "for", "on", "in", "at", "to", "and", "with", "over", "from", "by",
+    "me", "my", "i", "you", "your", "we", "us", "please", "pls", "can", "could", "would", "will",
+    "give", "show", "tell", "get", "find", "provide", "want", "need", "let", "see", "know",
+    "what", "whats", "s", "is", "are", "was", "were", "be", "been", "has", "have", "had", "do", "does", "did",
+    "how", "its", "it", "this", "that", "these", "those", "some", "any", "quick", "brief", "detailed",
+    "stock", "stocks", "share", "shares", "company", "companies", "ticker", "tickers",
+    "year", "years", "yr", "yrs", "y", "month", "months", "mo", "day", "days", "week", "weeks",
+    "past", "last", "ten", "one", "decade", "ytd", "date", "about", "also", "just", "so", "far",
+}
+_SYNONYMS = {
+    "analysis": "performance", "analyze": "performance", "analyse": "performance", "analyzed": "performance",
+    "performed": "performance", "perform": "performance", "returns": "performance", "return": "performance",
+    "done": "performance", "doing": "performance",
+    "comparison": "compare", "compared": "compare", "vs": "compare", "versus": "compare", "against": "compare",
+    "headlines": "news", "headline": "news", "latest": "news", "recent": "news",
+}
+
+
+_NUMBER = r"(?:\d{1,2}|one|three|five|ten)"
+_HORIZON_LIST = re.compile(
+    rf"\b({_NUMBER}(?:\s*(?:,|and|&|/|or|,\s*and)\s*{_NUMBER})*)[- ]?(y|yr|yrs|years?|m|mo|mos|months?)\b"
+    r"|\b(ytd|year[- ]to[- ]date)\b",
+    re.I,
+)
+_NUMBER_WORDS = {"one": 1, "three": 3, "five": 5, "ten": 10}
+_KEY_NUMBER = re.compile(r"\bq[1-4]\b|\$?\d[\d,]*(?:\.\d+)?%?")
+
+
+# words the fast-path tools understand beyond stopwords and synonyms
+_ROUTE_WORDS = {
+    "compare", "performance", "news", "rank", "ranking", "ranked", "rankings", "performing", "performer",
+    "performers", "better", "best", "worst", "top", "which", "between", "side", "total", "growth", "cagr",
+    "volatility", "drawdown", "drawdowns", "risk", "report", "summary", "overview", "horizon", "horizons",
+    "multi", "term", "long", "short", "history", "historical", "trailing", "correlation", "correlations",
+    "each", "other", "all", "them", "their", "vs", "or", "both", "together", "sp", "google", "yahoo",
+}
+
+
+def _without_symbols_and_horizons(message: str) -> str:
+    text = _SYMBOL.sub(" ", message or "")
+    # lists first: "1, 3 and 5 year" is one horizon expression
+    text = _HORIZON_LIST.sub(" ", text)
+    return _TEN_YEAR.sub(" ", _OTHER_HORIZON.sub(" ", _ONE_YEAR.sub(" ", text)))
+
+
+def _content_words(message: str) -> set:
+    """Lower-case words of a message without symbols, horizons and stopwords, synonyms folded."""
+    text = _without_symbols_and_horizons(message)
+    words = set()
+    for w in _WORDS.findall(text.lower().replace("'", "")):
+        w = _SYNONYMS.get(w, w)
+        if w not in _STOPWORDS and len(w) > 1:
+            words.add(w)
+    return words
+
+
+def unrouted_words(message: str) -> set:
+    """Content words no fast-path tool covers ("market", "cap", "ceos", "ratio")."""
+    return {w for w in _content_words(message) if w not in _ROUTE_WORDS and not _CORRELATION.match(w)}
+
+
+def horizons(message: str) -> list:
+    """
+    Every horizon named in a message, canonical and in order:
+    "1y, 3y and 5y returns" → ["1y", "3y", "5y"]; "1, 3 and 5 years" → the same;
+    "YTD" → ["ytd"].
+    """
+    out = []
+    for m in _HORIZON_LIST.finditer(message or ""):
+        if m.group(3):
+            out.append("ytd")
+            continue
+        unit = "y" if m.group(2).lower().startswith("y") else "m"
+        for n in re.findall(_NUMBER, m.group(1), re.I):
+            n = int(n) if n.isdigit() else _NUMBER_WORDS[n.lower()]
+            if n:
+                out.append(f"{n}{unit}")
+    return list(dict.fromkeys(out))
+
+
+def horizon(message: str) -> Optional[str]:
+    """Canonical time horizon named in a message ("10y", "1y", "ytd", "3mo", ...), or None."""
+    text = message or ""
+    if _TEN_YEAR.search(text):
+        return "10y"
+    if re.search(r"\bytd\b|\byear[- ]to[- ]date\b|\bthis year\b", text, re.I):
+        return "ytd"
+    if _ONE_YEAR.search(text):
+        return "1y"
+    m = _OTHER_HORIZON.search(text)
+    if m:
+        unit = m.group(2).lower()
+        unit = "y" if unit.startswith("y") else "mo" if unit.startswith("mo") else unit[0]
+        return f"{int(m.group(1))}{unit}"
+    return None
+
+
+def _key_numbers(message: str) -> tuple:
+    """Quarters, years, prices and other numbers outside horizons: "Q3", "2020", "$250" → ("2020", "250", "q3")."""
+    text = _without_symbols_and_horizons(message).lower()
+    return tuple(sorted({n.replace("$", "").replace(",", "") for n in _KEY_NUMBER.findall(text)}))
+
+
+def _key_horizons(message: str) -> tuple:
+    found = set(horizons(message))
+    one = horizon(message)
+    if one is not None:
+        found.add(one[:-2] + "m" if one.endswith("mo") else one)
+    return tuple(sorted(found))
+
+
+def intent_key(message: str) -> Optional[tuple]:
+    """
+    Normalized intent of a question: (content words, sorted symbols, horizons,
+    numbers). Phrasings of the same question share a key, e.g. "10 year
+    analysis of MSFT" and "give me a 10-year MSFT analysis", while years,
+    quarters and prices keep "AAPL in 2020" and "AAPL in 2022" apart. None
+    when there is no symbol or no content word to go on ("what about AAPL?"
+    depends on the conversation).
+    """
+    symbols = extract_symbols(message)
+    if not symbols:
+        return None
+    words = _content_words(message)
+    if not words:
+        return None
+    return (tuple(sorted(words)), tuple(sorted(symbols)), _key_horizons(message), _key_numbers(message))
@@ -0,0 +1,208 @@
+import math
+from datetime import date
+
+import numpy as np
+
+from analytics import HORIZON_TOLERANCE_DAYS, TRADING_DAYS
+
+
+# ---------------------------
+# Settings
+# ---------------------------
+
+# Rebuild a state once its window start has drifted this many days behind the period start
+REBASE_DAYS = HORIZON_TOLERANCE_DAYS
+
+_SCALARS = (
+    "first_date", "first_close", "last_date", "last_close",
+    "n", "mean", "m2", "peak", "max_drawdown", "high", "low",
+)
+
+
+# ---------------------------
+# Incremental per-symbol metrics
+# ---------------------------
+
+class RunningMetrics:
+    """
+    Return / risk metrics of one symbol's closes, updated in O(1) per bar:
+
+    - first / last close and date (total return, CAGR)
+    - running mean and variance of daily returns (Welford) for volatility
+    - running peak and worst drawdown, high and low
+    - last close of every calendar year (yearly returns, the running YTD bucket)
+
+    `add(day, close)` appends a bar. Re-adding the latest day (an intraday
+    close revised by a refresh) replaces it: the state before that bar is
+    kept as a snapshot and restored first. `summary()` gives the same
+    numbers `analytics.summarize` computes over the same bars.
+    """
+
+    def __init__(self):
+        self.first_date = None
+        self.first_close = math.nan
+        self.last_date = None
+        self.last_close = math.nan
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.peak = -math.inf
+        self.max_drawdown = 0.0
+        self.high = -math.inf
+        self.low = math.inf
+        self.year_closes = {}
+        self._before_last = None
+
+    # ---- updating ----
+
+    def _snapshot(self) -> dict:
+        snap = {k: getattr(self, k) for k in _SCALARS}
+        year = self.last_date.year if self.last_date else None
+        snap["year_close"] = (year, self.year_closes.get(year))
+        return snap
+
+    def _restore(self, snap: dict):
+        self.year_closes.pop(self.last_date.year, None)
+        for k in _SCALARS:
+            setattr(self, k, snap[k])
+        prev_year, prev_close = snap["year_close"]
+        if prev_close is not None:
+            self.year_closes[prev_year] = prev_close
+
+    def add(self, day: date, close: float):
+        """Fold in the close of `day`; older days than the last one are ignored."""
+        if close is None or math.isnan(close):
+            return
+        if self.last_date is not None:
+            if day < self.last_date:
+                return
+            if day == self.last_date:
+                if self._before_last is None:
+                    self.__init__()  # the only bar so far was revised: start over
+                else:
+                    self._restore(self._before_last)
+            else:
+                self._before_last = self._snapshot()
+        else:
+            self._before_last = None
+
+        if self.first_date is None:
+            self.first_date, self.first_close = day, close
+        else:
+            ret = close / self.last_close - 1.0
+            self.n += 1
+            delta = ret - self.mean
+            self.mean += delta / self.n
+            self.m2 += delta * (ret - self.mean)
+
+        self.peak = max(self.peak, close)
+        self.max_drawdown = min(self.max_drawdown, close / self.peak - 1.0)
+        self.high = max(self.high, close)
+        self.low = min(self.low, close)
+        self.year_closes[day.year] = close
+        self.last_date, self.last_close = day, close
+
+    def extend(self, days, closes):
+        for day, close in zip(days, closes):
+            self.add(day, float(close))
+
+    @classmethod
+    def from_closes(cls, days, closes) -> "RunningMetrics":
+        """One full pass over a history (the only non-O(1) step)."""
+        state = cls()
+        state.extend(days, closes)
+        return state
+
+    # ---- reading ----
+
+    def summary(self, trading_days: int = TRADING_DAYS) -> dict:
+        """start, end, total_return, years, cagr, volatility, max_drawdown, high, low (% like summarize)."""
+        if self.first_date is None:
+            return dict.fromkeys(
+                ("start", "end", "total_return", "years", "cagr", "volatility", "max_drawdown", "high", "low"),
+                math.nan,
+            )
+        years = (self.last_date - self.first_date).days / 365.25
+        growth = self.last_close / self.first_close
+        cagr = (growth ** (1.0 / years) - 1.0) * 100.0 if self.first_close > 0 and years > 0 else math.nan
+        vol = math.sqrt(self.m2 / (self.n - 1)) * math.sqrt(trading_days) * 100.0 if self.n > 1 else math.nan
+        return {
+            "start": self.first_close,
+            "end": self.last_close,
+            "total_return": (growth - 1.0) * 100.0,
+            "years": years,
+            "cagr": cagr,
+            "volatility": vol,
+            "max_drawdown": self.max_drawdown * 100.0,
+            "high": self.high,
+            "low": self.low,
+        }
+
+    def yearly_returns(self) -> dict:
+        """{year: % return from the prior year-end close}, the last entry being the running YTD."""
+        years = sorted(self.year_closes)
+        return {
+            y: (self.year_closes[y] / self.year_closes[p] - 1.0) * 100.0
+            for p, y in zip(years, years[1:])
+        }
+
+    def ytd_return(self) -> float:
+        year = self.last_date.year if self.last_date else None
+        prev = self.year_closes.get(year - 1) if year else None
+        return (self.last_close / prev - 1.0) * 100.0 if prev else math.nan
+
+    def drifted(self, window_start, days: int = REBASE_DAYS) -> bool:
+        """True once the state starts more than `days` before `window_start` (time to rebuild)."""
+        if self.first_date is None or window_start is None:
+            return True
+        return (window_start - self.first_date).days > days
+
+    # ---- serialization ----
+
+    def to_dict(self) -> dict:
+        def enc(snap):
+            out = {k: _enc(v) for k, v in snap.items() if k != "year_close"}
+            out["year_close"] = list(snap["year_close"])
+            return out
+
+        out = {k: _enc(getattr(self, k)) for k in _SCALARS}
+        out["year_closes"] = {str(y): c for y, c in self.year_closes.items()}
+        out["before_last"] = enc(self._before_last) if self._before_last else None
+        return out
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RunningMetrics":
+        def dec(snap):
+            out = {k: _dec(k, snap[k]) for k in _SCALARS}
+            out["year_close"] = tuple(snap["year_close"])
+            return out
+
+        state = cls()
+        for k in _SCALARS:
+            setattr(state, k, _dec(k, data[k]))
+        state.year_closes = {int(y): c for y, c in data["year_closes"].items()}
+        state._before_last = dec(data["before_last"]) if data.get("before_last") else None
+        return state
+
+
+def _enc(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float) and not math.isfinite(value):
+        return repr(value)  # "nan" / "inf" / "-inf"; JSON has no literal for them
+    return value
+
+
+def _dec(key: str, value):
+    if key.endswith("_date"):
+        return date.fromisoformat(value) if value else None
+    if isinstance(value, str):
+        return float(value)
+    return value
+
+
+def trading_dates(index) -> np.ndarray:
+    """DatetimeIndex (tz-aware or not) → python dates of the exchange sessions."""
+    if getattr(index, "tz", None) is not None:
+        index = index.tz_localize(None)
+    return index.normalize().date
@@ -0,0 +1,251 @@
+import io
+import os
+import re
+import time
+from datetime import datetime
+
+import httpx
+import numpy as np
+import pandas as pd
+
+import analytics
+import tracing
+from column_store import align
+from price_store import price_store
+
+
+# ---------------------------
+# Settings
+# ---------------------------
+
+UNIVERSE_DIR = os.getenv(
+    "UNIVERSE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".universe_cache"),
+)
+SP500_URL = os.getenv(
+    "SP500_URL",
+    "https://raw.githubusercontent.com/datasets/s-and-p-500-companies/main/data/constituents.csv",
+)
+# watchlist files a universe may name; nothing outside this directory is ever read
+WATCHLIST_DIR = os.getenv(
+    "WATCHLIST_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "watchlists"),
+)
+UNIVERSE_TTL = 7 * 24 * 3600          # seconds before the S&P 500 list is re-downloaded
+RISK_FREE_RATE = float(os.getenv("RISK_FREE_RATE", "0"))   # % per year, for the Sharpe-like ratio
+
+# metric name → (summary column, True if higher is better)
+METRICS = {
+    "sharpe": ("sharpe", True),
+    "cagr": ("cagr", True),
+    "return": ("total_return", True),
+    "total_return": ("total_return", True),
+    "volatility": ("volatility", False),
+    "drawdown": ("max_drawdown", True),      # drawdowns are negative: closest to 0 is best
+    "max_drawdown": ("max_drawdown", True),
+}
+
+SP500_NAMES = {"sp500", "s&p500", "s&p 500", "spx", "snp500"}
+_TICKER = re.compile(r"^[A-Z0-9^][A-Z0-9.^=-]{0,9}$")
+
+
+# ---------------------------
+# Universes
+# ---------------------------
+
+def parse_symbols(text: str) -> list:
+    """
+    Tickers from a watchlist: one per line, or comma / whitespace separated,
+    or a CSV with a Symbol / Ticker column. Lines starting with # are skipped.
+    """
+    lines = [ln for ln in (text or "").splitlines() if ln.strip() and not ln.lstrip().startswith("#")]
+    if lines:
+        header = [h.strip().lower() for h in lines[0].split(",")]
+        for col in ("symbol", "ticker"):
+            if col in header:
+                table = pd.read_csv(io.StringIO("\n".join(lines)), dtype=str)
+                return _clean(table[table.columns[header.index(col)]])
+    return _clean(re.split(r"[\s,;]+", "\n".join(lines)))
+
+
+def _clean(symbols) -> list:
+    out = (str(s).strip().upper().replace(".", "-") for s in symbols if isinstance(s, str) and s.strip())
+    return list(dict.fromkeys(s for s in out if _TICKER.match(s)))
+
+
+def _sp500() -> list:
+    """S&P 500 constituents, downloaded at most once per UNIVERSE_TTL (stale copy kept as a fallback)."""
+    path = os.path.join(UNIVERSE_DIR, "sp500.txt")
+    try:
+        fresh = time.time() - os.path.getmtime(path) < UNIVERSE_TTL
+    except OSError:
+        fresh = False
+
+    if not fresh:
+        try:
+            with tracing.span("sp500_list", kind="upstream"):
+                resp = httpx.get(SP500_URL, timeout=10.0, follow_redirects=True)
+                resp.raise_for_status()
+            symbols = parse_symbols(resp.text)
+            if len(symbols) < 400:
+                raise ValueError(f"only {len(symbols)} symbols in {SP500_URL}")
+            os.makedirs(UNIVERSE_DIR, exist_ok=True)
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write("\n".join(symbols))
+            os.replace(tmp, path)
+            return symbols
+        except Exception as e:
+            if not os.path.exists(path):
+                raise ValueError(f"S&P 500 list unavailable ({e}); pass a watchlist file or symbols instead")
+
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_symbols(f.read())
+
+
+def _watchlist_file(spec: str):
+    """
+    The file `spec` names under WATCHLIST_DIR, or None if there is none.
+    `spec` comes from the model, so paths leading outside the directory
+    (absolute, "..", symlinks) raise ValueError.
+    """
+    root = os.path.realpath(WATCHLIST_DIR)
+    path = os.path.realpath(os.path.join(root, spec))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"Watchlist {spec!r} is not in the watchlist directory")
+    return path if os.path.isfile(path) else None
+
+
+def load_universe(universe: str) -> list:
+    """
+    Symbols of a universe: "sp500", the name of a watchlist file in
+    WATCHLIST_DIR, or an inline comma-separated list. Raises ValueError
+    if it has no symbols.
+    """
+    spec = (universe or "").strip()
+    if spec.lower() in SP500_NAMES:
+        symbols = _sp500()
+    else:
+        path = _watchlist_file(spec)
+        if path is not None:
+            with open(path, "r", encoding="utf-8") as f:
+                symbols = parse_symbols(f.read())
+        else:
+            symbols = parse_symbols(spec)
+    if not symbols:
+        raise ValueError(f"No symbols in universe {universe!r}")
+    return symbols
+
+
+# ---------------------------
+# Bulk price matrix from the local store
+# ---------------------------
+
+def fetch_period(horizon: str) -> str:
+    """Smallest yfinance period whose history covers a screening horizon."""
+    offset = analytics.horizon_offset(horizon)
+    if offset is None:
+        return "1y"  # ytd
+    months = offset.kwds.get("years", 0) * 12 + offset.kwds.get("months", 0)
+    for period, span in (("1y", 12), ("2y", 24), ("5y", 60), ("10y", 120)):
+        if months <= span:
+            return period
+    return "max"
+
+
+def _trading_days(utc_ns: np.ndarray, tz) -> np.ndarray:
+    """UTC bar timestamps → exchange-local trading dates (datetime64[ns] at midnight)."""
+    idx = pd.DatetimeIndex(utc_ns.view("datetime64[ns]"))
+    if tz:
+        idx = idx.tz_localize("UTC").tz_convert(tz).tz_localize(None)
+    return idx.normalize().as_unit("ns").to_numpy()
+
+
+def close_matrix(symbols, period: str = None, store=price_store):
+    """
+    Close prices of `symbols` from the in-memory column store, else read
+    from disk (and kept in memory); never fetched. Returns (prices, missing):
+    a date x symbol DataFrame on the union of trading dates, and the symbols
+    with no stored data covering `period`.
+    """
+    columns, from_disk, missing = {}, [], []
+    for sym in symbols:
+        hit = store.memory.get(sym)
+        if hit is not None and store.covers(hit[3], period):
+            columns[sym] = hit[:2]
+            continue
+        data = store.local_closes(sym, period)
+        if data is None:
+            missing.append(sym)
+        else:
+            from_disk.append((sym, *data))
+
+    # one timezone conversion per exchange rather than per symbol
+    by_tz = {}
+    for j, (_, _, _, meta) in enumerate(from_disk):
+        by_tz.setdefault(meta.get("tz"), []).append(j)
+    for tz, rows in by_tz.items():
+        converted = _trading_days(np.concatenate([from_disk[j][1] for j in rows]), tz)
+        bounds = np.cumsum([len(from_disk[j][1]) for j in rows])[:-1]
+        for j, days in zip(rows, np.split(converted, bounds)):
+            sym, _, close, meta = from_disk[j]
+            covered_from = pd.Timestamp(meta["covered_from"]) if meta.get("covered_from") else None
+            store.memory.put(sym, days, close, datetime.fromisoformat(meta["fetched_at"]), covered_from)
+            columns[sym] = (days, close)
+
+    columns = {sym: columns[sym] for sym in symbols if sym in columns}
+    return align(columns), missing
+
+
+# ---------------------------
+# Screen
+# ---------------------------
+
+def screen(symbols, metric: str = "sharpe", top: int = 10, horizon: str = "5y", worst: bool = False,
+           store=price_store, fetch_missing=None):
+    """
+    Rank a universe on one metric over a trailing horizon and keep the top `top`.
+
+    Metrics come from one vectorized `analytics.horizon_summary` pass over
+    the whole price matrix, and the best (or, with `worst`, the worst) rows
+    are picked with `analytics.top_k`, so nothing is sorted beyond those.
+    `fetch_missing(symbols)` is called once for symbols with no local data
+    (e.g. a bounded concurrent download into the store); without it they
+    are only reported.
+
+    Returns (ranked, info): the ranked summary rows (with a `sharpe`
+    column) and {"universe", "screened", "missing", "insufficient", "as_of"}.
+    """
+    key = metric.strip().lower()
+    if key not in METRICS:
+        raise ValueError(f"Unknown metric {metric!r} (use one of: {', '.join(METRICS)})")
+    column, higher_is_better = METRICS[key]
+    analytics.horizon_offset(horizon)  # validate before touching any data
+    period = fetch_period(horizon)
+
+    with tracing.span("screen_load", kind="compute", symbols=len(symbols)) as sp:
+        prices, missing = close_matrix(symbols, period, store)
+        if missing and fetch_missing is not None:
+            fetch_missing(missing)
+            prices, missing = close_matrix(symbols, period, store)
+        sp.set(missing=len(missing))
+
+    info = {"universe": len(symbols), "screened": 0, "missing": missing, "insufficient": [], "as_of": None}
+    if prices.empty:
+        return pd.DataFrame(), info
+
+    with tracing.span("screen_metrics", kind="compute", symbols=prices.shape[1]):
+        summary = analytics.horizon_summary(prices, [horizon]).droplevel("horizon")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # annualized return over volatility; computed directly so sub-year windows get one too
+            annual = (np.power(summary["end"] / summary["start"], 1.0 / summary["years"]) - 1.0) * 100.0
+            summary["sharpe"] = (annual - RISK_FREE_RATE) / summary["volatility"]
+
+        usable = summary[column].notna()
+        info.update(
+            screened=int(usable.sum()),
+            insufficient=list(summary.index[~usable]),
+            as_of=prices.index[-1].date().isoformat(),
+        )
+        ranked = analytics.top_k(summary[usable], column, top, ascending=higher_is_better == worst)
+    return ranked, info
@@ -0,0 +1,261 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+import tracing
+from conversation import ConversationContext
+from news_fetcher import news_fetcher
+from fetch_scheduler import scheduler
+from prefetcher import prefetcher
+from price_store import price_store
+from financial_agent import _chunk_text, agent_pool, stream_answer, warm_agent_pools
+
+
+# ------------------------------------------------------
+# SETTINGS
+# ------------------------------------------------------
+MAX_CONCURRENT_CHATS = int(os.getenv("MAX_CONCURRENT_CHATS", "64"))   # answers generated at once
+MAX_QUEUED_CHATS = int(os.getenv("MAX_QUEUED_CHATS", "256"))          # waiting beyond that → 503
+QUEUE_TIMEOUT = float(os.getenv("CHAT_QUEUE_TIMEOUT", "30"))          # seconds a request may wait
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "1000"))                 # idle sessions kept (LRU)
+
+
+# ------------------------------------------------------
+# SESSIONS (conversation context only; LLM turns check a pooled team out)
+# ------------------------------------------------------
+class _Session:
+    def __init__(self):
+        self.context = ConversationContext()   # bounded history the agents see
+        self.lock = asyncio.Lock()   # one answer at a time per session
+        self.last_used = time.time()
+
+
+class SessionStore:
+    def __init__(self, max_sessions: int = MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+
+    def get(self, session_id: str) -> _Session:
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = _Session()
+            while len(self._sessions) > self.max_sessions:
+                oldest_id, oldest = next(iter(self._sessions.items()))
+                if oldest.lock.locked():
+                    break  # never drop a session mid-answer
+                del self._sessions[oldest_id]
+        self._sessions.move_to_end(session_id)
+        session.last_used = time.time()
+        return session
+
+    def drop(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+# ------------------------------------------------------
+# ADMISSION CONTROL (bounded concurrency + bounded queue)
+# ------------------------------------------------------
+class Admission:
+    """
+    At most `limit` answers run at once; up to `max_queued` more may wait
+    `timeout` seconds for a slot. Anything beyond that is rejected at once
+    so clients back off instead of piling onto the box.
+    """
+
+    def __init__(self, limit: int, max_queued: int, timeout: float):
+        self._sem = asyncio.Semaphore(limit)
+        self.limit = limit
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self.waiting = 0
+        self.active = 0
+
+    def check(self):
+        """Reject at once (503) if the queue is already full."""
+        if self.waiting >= self.max_queued:
+            raise HTTPException(503, "Server busy, retry shortly", headers={"Retry-After": "2"})
+
+    async def acquire(self, timeout: float = None):
+        """Wait for a slot, at most `timeout` seconds (default: the queue timeout)."""
+        self.check()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), self.timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(503, "Timed out waiting for a free slot", headers={"Retry-After": "5"})
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+        self._sem.release()
+
+
+# ------------------------------------------------------
+# APP
+# ------------------------------------------------------
+app = FastAPI(title="Finance AI Assistant")
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+# Blocking agent / tool I/O runs here, never on the event loop
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_CHATS, thread_name_prefix="chat")
+_sessions = SessionStore()
+_admission = Admission(MAX_CONCURRENT_CHATS, MAX_QUEUED_CHATS, QUEUE_TIMEOUT)
+
+
+@app.on_event("startup")
+async def _startup():
+    warm_agent_pools()
+    prefetcher.start()
+
+
+@app.on_event("shutdown")
+async def _shutdown():
+    prefetcher.stop()
+    _executor.shutdown(wait=False, cancel_futures=True)
+    news_fetcher.close()
+
+
+class ChatRequest(BaseModel):
+    message: str
+    session_id: str = None
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _produce(message: str, session: _Session, out: asyncio.Queue, loop, stop: threading.Event):
+    """Worker thread: run one answer and push text chunks back onto the event loop."""
+
+    def put(item):
+        loop.call_soon_threadsafe(out.put_nowait, item)
+
+    try:
+        with tracing.trace(message) as turn:
+            # a Supervisor team is checked out of agent_pool only if the turn
+            # reaches the LLM (not for fast-path or cached answers)
+            stream = stream_answer(message, context=session.context)
+            try:
+                for chunk in stream:
+                    if stop.is_set():
+                        break  # client went away
+                    text = _chunk_text(chunk)
+                    if text:
+                        put(("delta", {"text": text}))
+            finally:
+                stream.close()
+        put(("done", {"trace_id": turn.id, "duration_ms": turn.duration_ms}))
+    except Exception as e:
+        put(("error", {"message": str(e)}))
+    finally:
+        put(None)
+
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest, request: Request):
+    """Stream one answer as Server-Sent Events: `delta`* then `done` (or `error`)."""
+    message = (req.message or "").strip()
+    if not message:
+        raise HTTPException(400, "Empty message")
+
+    _admission.check()
+    session_id = req.session_id or uuid.uuid4().hex
+    session = _sessions.get(session_id)
+
+    async def events():
+        # Everything is acquired in here so the finally below always frees it,
+        # even if the client goes away before the first event. The session lock
+        # comes first: waiting on an earlier answer of the same session must
+        # not hold a slot, and both waits share CHAT_QUEUE_TIMEOUT.
+        loop = asyncio.get_running_loop()
+        out = asyncio.Queue()
+        stop = threading.Event()
+        locked = admitted = False
+        worker = None
+        try:
+            yield _sse("session", {"session_id": session_id})
+            deadline = loop.time() + QUEUE_TIMEOUT
+            try:
+                await asyncio.wait_for(session.lock.acquire(), QUEUE_TIMEOUT)
+            except asyncio.TimeoutError:
+                yield _sse("error", {"message": "Timed out waiting for this session's previous answer",
+                                     "retry_after": 5})
+                return
+            locked = True
+            try:
+                await _admission.acquire(max(0.0, deadline - loop.time()))
+            except HTTPException as e:
+                yield _sse("error", {"message": e.detail, "retry_after": int(e.headers["Retry-After"])})
+                return
+            admitted = True
+
+            worker = loop.run_in_executor(_executor, _produce, message, session, out, loop, stop)
+            while True:
+                item = await out.get()
+                if item is None:
+                    break
+                if await request.is_disconnected():
+                    stop.set()
+                    break
+                yield _sse(*item)
+        finally:
+            stop.set()
+            # free the slot only once the worker thread has really finished
+            if worker is not None:
+                await asyncio.shield(worker)
+            if locked:
+                session.lock.release()
+            if admitted:
+                _admission.release()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.delete("/chat/{session_id}")
+async def end_session(session_id: str):
+    _sessions.drop(session_id)
+    return {"ok": True}
+
+
+@app.get("/healthz")
+async def healthz():
+    return {
+        "ok": True,
+        "active": _admission.active,
+        "waiting": _admission.waiting,
+        "sessions": len(_sessions),
+        "agents": agent_pool.stats(),
+        "price_memory": price_store.memory.stats(),
+        "prefetch": prefetcher.stats(),
+        "upstream": scheduler.stats(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return tracing.render_prometheus()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run("server:app", host=os.getenv("HOST", "127.0.0.1"), port=int(os.getenv("PORT", "8000")))
@@ -0,0 +1,80 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import Future
+from contextlib import nullcontext
+
+
+# ---------------------------
+# Single-flight call coalescing
+# ---------------------------
+
+class SingleFlight:
+    """
+    Collapse concurrent calls with the same key into one execution.
+
+    The first caller for a key (the leader) runs the function; every caller
+    that arrives while it is in flight - another thread or an asyncio task -
+    waits on the same Future and gets the same result or exception.
+    Nothing is cached once the call completes.
+
+    `shared` is an optional factory of per-call state (e.g.
+    fetch_scheduler.FlightPriority): the leader creates it and runs inside
+    `state.lead()`, and every caller that joins calls `state.join()`.
+    """
+
+    def __init__(self, shared=None):
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def _claim(self, key):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                fut, state = call
+                leader = False
+            else:
+                fut = Future()
+                # RUNNING futures cannot be cancelled, so one waiter giving up
+                # (e.g. a cancelled asyncio task) never cancels the others
+                fut.set_running_or_notify_cancel()
+                state = self.shared() if self.shared else None
+                self._calls[key] = (fut, state)
+                leader = True
+        if not leader and state is not None:
+            state.join()
+        return fut, state, leader
+
+    def _run(self, key, fut: Future, state, fn, args, kwargs):
+        try:
+            with state.lead() if state is not None else nullcontext():
+                result = fn(*args, **kwargs)
+        except BaseException as e:
+            with self._lock:
+                self._calls.pop(key, None)
+            fut.set_exception(e)
+        else:
+            with self._lock:
+                self._calls.pop(key, None)
+            fut.set_result(result)
+
+    def do(self, key, fn, *args, **kwargs):
+        """Blocking call; runs `fn` in the calling thread if it is the leader."""
+        fut, state, leader = self._claim(key)
+        if leader:
+            self._run(key, fut, state, fn, args, kwargs)
+        return fut.result()
+
+    async def do_async(self, key, fn, *args, **kwargs):
+        """Awaitable call; a leader runs the blocking `fn` in the default executor."""
+        fut, state, leader = self._claim(key)
+        if leader:
+            loop = asyncio.get_running_loop()
+            ctx = contextvars.copy_context()  # keep the caller's trace and fetch priority
+            loop.run_in_executor(None, ctx.run, self._run, key, fut, state, fn, args, kwargs)
+        return await asyncio.wrap_future(fut)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,41 @@
+import pytest
+
+from benchmarks.fakes import FakeNewsSource
+from google_news_tool import google_news_tool
+from news_fetcher import news_fetcher
+from prefetcher import prefetcher
+
+
+class FailingFor(FakeNewsSource):
+    """Canned stories, except for the queries in `failing`."""
+
+    def __init__(self, failing):
+        super().__init__()
+        self.failing = set(failing)
+
+    async def __call__(self, client, query: str) -> list:
+        if query in self.failing:
+            raise RuntimeError(f"upstream failed for {query}")
+        return await super().__call__(client, query)
+
+
+@pytest.fixture
+def noted(monkeypatch):
+    seen = []
+    monkeypatch.setattr(prefetcher, "note_news", seen.append)
+    monkeypatch.setattr(news_fetcher, "source", FailingFor({"BADQ"}))
+    news_fetcher.clear()
+    yield seen
+    news_fetcher.clear()
+
+
+def test_only_loaded_queries_are_noted_for_prefetch(noted):
+    out = google_news_tool.entrypoint("AAPL, BADQ")
+    assert "AAPL: headline" in out
+    assert noted == [["AAPL"]]
+
+
+def test_failed_search_notes_nothing(noted):
+    out = google_news_tool.entrypoint("BADQ")
+    assert out.startswith("Error")
+    assert noted == [[]]
@@ -0,0 +1,204 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.fakes import SyntheticHistory
+from price_store import PriceStore
+
+
+@pytest.fixture
+def fetcher():
+    return SyntheticHistory(latency=0.2)
+
+
+@pytest.fixture
+def store(tmp_path, fetcher):
+    return PriceStore(root=str(tmp_path), fetcher=fetcher)
+
+
+# ---------------------------
+# Coalescing
+# ---------------------------
+
+def test_concurrent_ahistory_calls_share_one_fetch(store, fetcher):
+    async def main():
+        return await asyncio.gather(*(store.ahistory("AAPL", "1y") for _ in range(6)))
+
+    frames = asyncio.run(main())
+    assert fetcher.calls == 1
+    assert all(f.equals(frames[0]) for f in frames)
+    assert len(frames[0]) > 200
+
+
+def test_ahistory_coalesces_with_threads(store, fetcher):
+    frames = []
+    threads = [threading.Thread(target=lambda: frames.append(store.history("MSFT", "1y"))) for _ in range(3)]
+    for t in threads:
+        t.start()
+
+    async def main():
+        return await asyncio.gather(*(store.ahistory("MSFT", "1y") for _ in range(3)))
+
+    frames += asyncio.run(main())
+    for t in threads:
+        t.join()
+    assert fetcher.calls == 1
+    assert len(frames) == 6
+    assert all(f.equals(frames[0]) for f in frames)
+
+
+def test_ahistory_serves_the_stored_copy_afterwards(store, fetcher):
+    first = asyncio.run(store.ahistory("NVDA", "1y"))
+    again = asyncio.run(store.ahistory("NVDA", "6mo"))
+    assert fetcher.calls == 1
+    assert again.index[-1] == first.index[-1]
+    assert len(again) < len(first)
+
+
+def test_ahistory_errors_reach_every_caller(store, fetcher):
+    async def main():
+        return await asyncio.gather(*(store.ahistory("BADX", "1y") for _ in range(4)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert fetcher.calls == 1
+
+
+# ---------------------------
+# Incremental refresh / re-adjustment
+# ---------------------------
+
+class Upstream:
+    """
+    SyntheticHistory as seen `hidden` sessions ago; records the arguments
+    of every fetch. Edit `frame()` to model Yahoo re-adjusting its history.
+    """
+
+    def __init__(self, hidden: int = 0):
+        self.inner = SyntheticHistory()
+        self.hidden = hidden
+        self.requests = []
+
+    def frame(self, symbol: str):
+        self.inner(symbol, period="max")  # generate the full series once
+        return self.inner._frames[symbol]
+
+    def __call__(self, symbol: str, period: str = None, start=None):
+        self.requests.append({"period": period, "start": start})
+        df = self.inner(symbol, period=period, start=start)
+        last = self.frame(symbol).index[-1 - self.hidden]
+        return df[df.index <= last]
+
+
+def _age(store: PriceStore, symbol: str, days: int = 10):
+    """Make the stored bars of `symbol` stale."""
+    meta = store._read_meta(symbol)
+    fetched_at = datetime.fromisoformat(meta["fetched_at"]) - timedelta(days=days)
+    store._save(symbol, store._load(symbol, meta),
+                pd.Timestamp(meta["covered_from"]) if meta["covered_from"] else None, fetched_at)
+
+
+@pytest.fixture
+def upstream():
+    return Upstream(hidden=5)
+
+
+@pytest.fixture
+def lagging_store(tmp_path, upstream):
+    return PriceStore(root=str(tmp_path), fetcher=upstream)
+
+
+def test_refresh_fetches_only_new_bars(lagging_store, upstream):
+    before = lagging_store.history("AAPL", "1y")
+    assert upstream.requests == [{"period": "1y", "start": None}]
+
+    upstream.hidden = 0
+    _age(lagging_store, "AAPL")
+    after = lagging_store.history("AAPL", "1y")
+
+    # one top-up from the last settled stored session, no full download
+    assert len(upstream.requests) == 2
+    assert upstream.requests[1]["period"] is None
+    assert upstream.requests[1]["start"] == before.index[-2].date().isoformat()
+
+    full = upstream.frame("AAPL")
+    assert after.index[-1] == full.index[-1]
+    assert after.index[0] == before.index[0]
+    assert len(after) == len(before) + 5
+    assert np.allclose(after["Close"].to_numpy(), full.loc[after.index, "Close"].to_numpy())
+
+
+def test_fresh_bars_are_not_refetched(lagging_store, upstream):
+    lagging_store.history("AAPL", "1y")
+    lagging_store.history("AAPL", "6mo")
+    assert len(upstream.requests) == 1
+
+
+def _split(frame, day, ratio: float = 2.0):
+    """Yahoo-style 2:1 split on `day`: earlier prices divided, volumes multiplied."""
+    earlier = frame.index < day
+    for col in ("Open", "High", "Low", "Close"):
+        frame.loc[earlier, col] /= ratio
+    frame.loc[earlier, "Volume"] *= ratio
+    frame.loc[day, "Stock Splits"] = ratio
+
+
+def test_split_in_new_bars_downloads_the_period_again(lagging_store, upstream):
+    before = lagging_store.history("AAPL", "1y")
+    covered_from = lagging_store._read_meta("AAPL")["covered_from"]
+
+    full = upstream.frame("AAPL")
+    _split(full, full.index[-3])
+    upstream.hidden = 0
+    _age(lagging_store, "AAPL")
+    after = lagging_store.history("AAPL", "1y")
+
+    # top-up, then a re-download of everything the store covered
+    assert len(upstream.requests) == 3
+    assert upstream.requests[2] == {"period": None, "start": pd.Timestamp(covered_from).date().isoformat()}
+    assert after.index[0] == before.index[0]
+    assert np.allclose(after["Close"].to_numpy(), full.loc[after.index, "Close"].to_numpy())
+    assert np.isclose(after["Close"].iloc[0], before["Close"].iloc[0] / 2)
+
+
+def test_dividend_in_new_bars_downloads_the_period_again(lagging_store, upstream):
+    lagging_store.history("AAPL", "1y")
+
+    full = upstream.frame("AAPL")
+    full.loc[full.index[-2], "Dividends"] = 0.25
+    upstream.hidden = 0
+    _age(lagging_store, "AAPL")
+    after = lagging_store.history("AAPL", "1y")
+
+    assert len(upstream.requests) == 3
+    assert after.loc[full.index[-2], "Dividends"] == 0.25
+
+
+def test_moved_settled_close_downloads_the_period_again(lagging_store, upstream):
+    lagging_store.history("AAPL", "1y")
+
+    # history re-adjusted upstream for an event outside the fetched window
+    full = upstream.frame("AAPL")
+    for col in ("Open", "High", "Low", "Close"):
+        full[col] *= 0.98
+    upstream.hidden = 0
+    _age(lagging_store, "AAPL")
+    after = lagging_store.history("AAPL", "1y")
+
+    assert len(upstream.requests) == 3
+    assert np.allclose(after["Close"].to_numpy(), full.loc[after.index, "Close"].to_numpy())
+
+
+def test_known_split_is_not_readjusted_twice(lagging_store, upstream):
+    full = upstream.frame("AAPL")
+    _split(full, full.index[-30])
+    lagging_store.history("AAPL", "1y")  # stored already adjusted, split included
+
+    upstream.hidden = 0
+    _age(lagging_store, "AAPL")
+    lagging_store.history("AAPL", "1y")
+    assert len(upstream.requests) == 2
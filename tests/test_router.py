@@ -0,0 +1,107 @@
+import pytest
+
+import router
+
+
+ROUTED = [
+    # (message, intent, tool, args)
+    ("How has AAPL performed over the past year?", "one_year", "one_year_tool", {"symbol": "AAPL"}),
+    ("1 year performance of TSLA", "one_year", "one_year_tool", {"symbol": "TSLA"}),
+    ("10 year analysis of MSFT", "ten_year", "ten_year_analysis_tool", {"symbol": "MSFT"}),
+    ("give me a 10-year MSFT analysis", "ten_year", "ten_year_analysis_tool", {"symbol": "MSFT"}),
+    ("Compare AAPL vs MSFT returns this year", "compare", "compare_stocks_tool",
+     {"symbol1": "AAPL", "symbol2": "MSFT"}),
+    ("compare AAPL and MSFT over 10 years", "multi_compare", "compare_multi_stocks_tool", {"symbols": "AAPL,MSFT"}),
+    ("Compare returns of AAPL, MSFT, GOOGL and NVDA", "multi_compare", "compare_multi_stocks_tool",
+     {"symbols": "AAPL,MSFT,GOOGL,NVDA"}),
+    ("rank AAPL, MSFT and NVDA by performance", "multi_compare", "compare_multi_stocks_tool",
+     {"symbols": "AAPL,MSFT,NVDA"}),
+    ("correlation between AAPL and MSFT", "correlation", "correlation_tool", {"symbols": "AAPL,MSFT"}),
+    ("correlation of AAPL, MSFT and SPY over 5 years", "correlation", "correlation_tool",
+     {"symbols": "AAPL,MSFT,SPY", "period": "5y"}),
+    ("1, 3 and 5 year returns of AAPL and MSFT", "multi_horizon", "multi_horizon_analysis_tool",
+     {"symbols": "AAPL,MSFT", "horizons": "1y,3y,5y"}),
+    ("6 month and 1 year performance of NVDA", "multi_horizon", "multi_horizon_analysis_tool",
+     {"symbols": "NVDA", "horizons": "6m,1y"}),
+    ("3 year performance of AAPL", "multi_horizon", "multi_horizon_analysis_tool",
+     {"symbols": "AAPL", "horizons": "3y"}),
+    ("latest news about Tesla", "news", "google_news_tool", {"query": "Tesla"}),
+    ("NVDA headlines", "news", "google_news_tool", {"query": "NVDA"}),
+]
+
+# left to the LLM: judgement, data the tools do not produce, dates, mixed or off-topic
+FALLBACK = [
+    "Should I buy AAPL?",
+    "Why did TSLA fall this year?",
+    "What is the P/E ratio of AAPL?",
+    "What is the current price of AAPL?",
+    "AAPL dividends over the past year",
+    "Compare the CEOs of AAPL and MSFT",
+    "compare AAPL vs MSFT market cap",
+    "AAPL performance in 2020",
+    "How did AAPL do in Q3?",
+    "10 year forecast for MSFT",
+    "how has AAPL done this year and what's the latest news",
+    "Tell me a joke",
+    "hello there",
+    "",
+]
+
+
+@pytest.mark.parametrize("message, intent, tool, args", ROUTED)
+def test_routes(message, intent, tool, args):
+    r = router.route(message)
+    assert r is not None
+    assert (r.intent, r.tool, r.args) == (intent, tool, args)
+    assert r.confidence >= router.MIN_CONFIDENCE
+
+
+@pytest.mark.parametrize("message", FALLBACK)
+def test_falls_through_to_the_llm(message):
+    assert router.route(message) is None
+
+
+def test_low_confidence_is_classified_but_not_routed():
+    r = router.classify("10 year forecast for MSFT")
+    assert r is not None and r.tool == "ten_year_analysis_tool"
+    assert r.confidence < router.MIN_CONFIDENCE
+
+
+@pytest.mark.parametrize("message, symbols", [
+    ("Compare AAPL vs MSFT", ["AAPL", "MSFT"]),
+    ("$TSLA and BRK.B", ["TSLA", "BRK.B"]),
+    ("What is the P/E ratio of AAPL?", ["AAPL"]),
+    ("AAPL, aapl and AAPL again", ["AAPL"]),
+])
+def test_extract_symbols(message, symbols):
+    assert router.extract_symbols(message) == symbols
+
+
+@pytest.mark.parametrize("message, mixed", [
+    ("how has AAPL done this year and what's the latest news", True),
+    ("compare AAPL and MSFT and show news", True),
+    ("latest news about Tesla", False),
+    ("10 year analysis of MSFT", False),
+])
+def test_is_mixed(message, mixed):
+    assert router.is_mixed(message) is mixed
+
+
+@pytest.mark.parametrize("a, b", [
+    ("10 year analysis of MSFT", "give me a 10-year MSFT analysis"),
+    ("compare AAPL and MSFT", "compare MSFT and AAPL"),
+])
+def test_rephrasings_share_an_intent_key(a, b):
+    assert router.intent_key(a) is not None
+    assert router.intent_key(a) == router.intent_key(b)
+
+
+@pytest.mark.parametrize("a, b", [
+    ("AAPL performance in 2020", "AAPL performance in 2022"),
+    ("AAPL Q1 results", "AAPL Q3 results"),
+    ("1, 3 and 5 year returns of AAPL", "1, 3 and 10 year returns of AAPL"),
+    ("AAPL above $150", "AAPL above $200"),
+])
+def test_different_numbers_keep_separate_intent_keys(a, b):
+    assert router.intent_key(a) is not None
+    assert router.intent_key(a) != router.intent_key(b)
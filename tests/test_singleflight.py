@@ -0,0 +1,91 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+class SlowCall:
+    """Counts calls; each one sleeps `delay` seconds so callers overlap."""
+
+    def __init__(self, delay: float = 0.2, error: Exception = None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def __call__(self, value):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return value * 2
+
+
+def test_concurrent_async_calls_share_one_execution():
+    flight, fn = SingleFlight(), SlowCall()
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async("k", fn, 21) for _ in range(8)))
+
+    assert asyncio.run(main()) == [42] * 8
+    assert fn.calls == 1
+    assert flight.in_flight() == 0
+
+
+def test_async_callers_join_a_thread_leader():
+    flight, fn = SingleFlight(), SlowCall()
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("k", fn, 1)))
+    leader.start()
+    time.sleep(0.05)  # the thread owns the flight
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async("k", fn, 1) for _ in range(4)))
+
+    assert asyncio.run(main()) == [2] * 4
+    leader.join()
+    assert results == [2]
+    assert fn.calls == 1
+
+
+def test_different_keys_run_separately():
+    flight, fn = SingleFlight(), SlowCall(delay=0.05)
+
+    async def main():
+        return await asyncio.gather(flight.do_async("a", fn, 1), flight.do_async("b", fn, 2))
+
+    assert asyncio.run(main()) == [2, 4]
+    assert fn.calls == 2
+
+
+def test_exception_reaches_every_waiter_and_is_not_kept():
+    flight, fn = SingleFlight(), SlowCall(error=ValueError("upstream down"))
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async("k", fn, 1) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert fn.calls == 1
+
+    fn.error = None
+    assert flight.do("k", fn, 1) == 2  # nothing cached once the call completed
+    assert fn.calls == 2
+
+
+def test_cancelled_waiter_does_not_cancel_the_others():
+    flight, fn = SingleFlight(), SlowCall()
+
+    async def main():
+        first = asyncio.ensure_future(flight.do_async("k", fn, 5))
+        second = asyncio.ensure_future(flight.do_async("k", fn, 5))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == 10
+    assert fn.calls == 1
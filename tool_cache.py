@@ -0,0 +1,193 @@
+import inspect
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import tool_output
+import tracing
+
+
+# ---------------------------
+# TTL settings (seconds)
+# ---------------------------
+
+QUOTE_TTL = 60              # anything ending at today's price
+NEWS_TTL = 10 * 60          # news / web search
+LONG_TERM_TTL = 24 * 3600   # 10-year analytics
+PARTIAL_TTL = 60            # results where some symbols / queries failed
+
+# Arguments whose case never changes the result (tickers, horizons, metric names);
+# anything else (file paths, search queries) is only whitespace-normalized
+CASE_INSENSITIVE_ARGS = frozenset({"symbol", "symbol1", "symbol2", "symbols", "horizon", "horizons",
+                                   "period", "metric"})
+
+# markdown tool output reporting failed symbols / queries next to the good ones
+_PARTIAL_MARKERS = ("**Warnings / Errors:**", "⚠️ Error fetching news")
+
+
+# ---------------------------
+# Internal helpers
+# ---------------------------
+
+def _normalize(value, fold: bool = True):
+    """Make equivalent tool arguments produce the same cache key (`fold`: ignore case too)."""
+    if isinstance(value, str):
+        value = " ".join(value.split())
+        return value.casefold() if fold else value
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(v, fold) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _normalize(v, fold)) for k, v in value.items()))
+    return value
+
+
+def _arguments(arguments: dict) -> tuple:
+    return tuple((k, _normalize(v, k in CASE_INSENSITIVE_ARGS)) for k, v in arguments.items())
+
+
+def _partial(result: str) -> bool:
+    """Output with some failed symbols / queries: a warnings section, or compact meta with "errors"."""
+    if any(marker in result for marker in _PARTIAL_MARKERS):
+        return True
+    if not result.startswith("{"):
+        return False
+    try:
+        meta = json.loads(result.split("\n", 1)[0])
+    except ValueError:
+        return False
+    return isinstance(meta, dict) and bool(meta.get("errors"))
+
+
+def _ttl_for(result, ttl: float) -> float:
+    """How long to keep `result`: 0 for failures, at most PARTIAL_TTL for partial failures."""
+    if not isinstance(result, str):
+        return ttl
+    # tools report failures as "Error ..." strings; never pin those
+    if result.startswith("Error"):
+        return 0
+    return min(ttl, PARTIAL_TTL) if _partial(result) else ttl
+
+
+# ---------------------------
+# Shared TTL + LRU cache
+# ---------------------------
+
+class ToolCache:
+    """
+    Bounded LRU of tool results with a per-entry TTL.
+    Keys are (tool name, normalized bound arguments, output mode).
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value, ttl: float):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def expires_in(self, key) -> float:
+        """Seconds until `key` expires (0 if it is not cached); does not count as a hit or miss."""
+        with self._lock:
+            entry = self._data.get(key)
+            return max(0.0, entry[0] - time.monotonic()) if entry is not None else 0.0
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self, name: str = None):
+        """Drop every entry, or only the entries of one tool."""
+        with self._lock:
+            if name is None:
+                self._data.clear()
+            else:
+                for key in [k for k in self._data if k[0] == name]:
+                    del self._data[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def wrap(self, func, ttl: float, name: str = None):
+        """
+        Return `func` wrapped with this cache (signature preserved for phi).
+        Every call is recorded as a "tool" tracing span with cache_tool=hit/miss.
+        """
+        name = name or func.__name__
+        sig = inspect.signature(func)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracing.span(name, kind="tool") as sp:
+                try:
+                    bound = sig.bind(*args, **kwargs)
+                    bound.apply_defaults()
+                    key = (name, _arguments(bound.arguments), tool_output.mode())
+                    hash(key)
+                except TypeError:
+                    return func(*args, **kwargs)  # unhashable / invalid args: just run it
+
+                found, value = self.get(key)
+                sp.set(cache_tool="hit" if found else "miss")
+                if found:
+                    return value
+                value = func(*args, **kwargs)
+                keep = _ttl_for(value, ttl)
+                if keep > 0:
+                    self.set(key, value, keep)
+                return value
+
+        return wrapper
+
+
+# Single cache shared by every agent's tools
+tool_cache = ToolCache()
+
+
+def cached(ttl: float, name: str = None):
+    """
+    Decorator for tool functions; place it under phi's @tool:
+
+        @tool
+        @cached(ttl=QUOTE_TTL)
+        def one_year_tool(symbol: str): ...
+    """
+    def decorator(func):
+        return tool_cache.wrap(func, ttl, name)
+    return decorator
+
+
+def cache_toolkit(toolkit, ttl: float):
+    """Wrap every function registered on a phi Toolkit (e.g. DuckDuckGo) with the shared cache."""
+    for fn in toolkit.functions.values():
+        if fn.entrypoint is not None:
+            fn.entrypoint = tool_cache.wrap(fn.entrypoint, ttl, f"{toolkit.name}.{fn.name}")
+    return toolkit
@@ -0,0 +1,136 @@
+import contextvars
+import json
+import math
+import os
+from contextlib import contextmanager
+
+import pandas as pd
+
+
+# ---------------------------
+# Settings
+# ---------------------------
+#
+# Tools called by the LLM answer in a dense "compact" form (one JSON line of
+# metadata + an optional CSV table) and every tool result handed to the model
+# is held to a token budget. Direct (fast path) calls keep the markdown the
+# user reads.
+
+LLM_OUTPUT_MODE = os.getenv("TOOL_OUTPUT_MODE", "compact")        # "compact" | "markdown"
+TOOL_TOKEN_BUDGET = int(os.getenv("TOOL_TOKEN_BUDGET", "800"))    # per tool call, ~4 chars/token
+
+# Per-tool overrides of TOOL_TOKEN_BUDGET
+TOOL_TOKEN_BUDGETS = {
+    "google_news_tool": 600,
+}
+
+YAHOO_QUOTE = "https://finance.yahoo.com/quote/{symbol}"
+
+_mode = contextvars.ContextVar("tool_output_mode", default="markdown")
+
+
+# ---------------------------
+# Mode
+# ---------------------------
+
+def mode() -> str:
+    return _mode.get()
+
+
+def is_compact() -> bool:
+    return _mode.get() == "compact"
+
+
+@contextmanager
+def output_mode(value: str):
+    """Render tool output as `value` ("compact" / "markdown") inside this block."""
+    token = _mode.set(value)
+    try:
+        yield
+    finally:
+        _mode.reset(token)
+
+
+# ---------------------------
+# Budget
+# ---------------------------
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text or "") / 4)
+
+
+def budget_for(tool_name: str) -> int:
+    return TOOL_TOKEN_BUDGETS.get(tool_name, TOOL_TOKEN_BUDGET)
+
+
+def fit(text, budget: int = TOOL_TOKEN_BUDGET) -> str:
+    """Cut `text` to about `budget` tokens at a line boundary, saying how much was dropped."""
+    if not isinstance(text, str) or estimate_tokens(text) <= budget:
+        return text
+    limit = budget * 4
+    cut = text.rfind("\n", 0, limit)
+    cut = cut if cut > limit // 2 else limit
+    dropped = estimate_tokens(text[cut:])
+    return text[:cut].rstrip() + f"\n…[truncated ~{dropped} tokens]"
+
+
+# ---------------------------
+# Compact rendering
+# ---------------------------
+
+def _round(value, decimals: int):
+    if isinstance(value, float):
+        return None if math.isnan(value) else round(value, decimals)
+    if isinstance(value, dict):
+        return {k: _round(v, decimals) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_round(v, decimals) for v in value]
+    return value
+
+
+def _csv(df: pd.DataFrame, decimals: int) -> str:
+    return df.to_csv(float_format=f"%.{decimals}f", lineterminator="\n").rstrip("\n")
+
+
+def _omitted_note(rows: pd.DataFrame, decimals: int) -> str:
+    """One-line summary of the rows left out of a truncated table."""
+    parts = [f"{len(rows)} middle rows omitted ({rows.index[0]} … {rows.index[-1]})"]
+    for col in rows.select_dtypes("number").columns[:3]:
+        s = rows[col].dropna()
+        if not s.empty:
+            parts.append(f"{col} min={s.min():.{decimals}f} median={s.median():.{decimals}f} max={s.max():.{decimals}f}")
+    return "# " + "; ".join(parts)
+
+
+def _split(table: pd.DataFrame, keep: int):
+    """(first rows, middle, last rows) keeping `keep` rows in total."""
+    top = (keep + 1) // 2
+    end = len(table) - (keep - top)
+    return table.iloc[:top], table.iloc[top:end], table.iloc[end:]
+
+
+def compact(meta: dict, table: pd.DataFrame = None, budget: int = TOOL_TOKEN_BUDGET, decimals: int = 2) -> str:
+    """
+    Dense tool output: one JSON line of metadata, then `table` as CSV.
+    If that exceeds `budget` tokens the table keeps its first and last rows
+    (ranking order is preserved, so best and worst survive) and the middle
+    is replaced by a one-line min/median/max summary.
+    """
+    head = json.dumps(_round(meta, decimals), separators=(",", ":"), default=str)
+    if table is None or table.empty:
+        return head
+
+    full = head + "\n" + _csv(table, decimals)
+    if estimate_tokens(full) <= budget:
+        return full
+
+    lo, hi, best = 0, len(table) - 1, None
+    while lo <= hi:  # largest head + tail slice that fits
+        keep = (lo + hi) // 2
+        top, rest, bottom = _split(table, keep)
+        text = "\n".join([head, _csv(pd.concat([top, bottom]), decimals), _omitted_note(rest, decimals)])
+        if estimate_tokens(text) <= budget:
+            best, lo = text, keep + 1
+        else:
+            hi = keep - 1
+    return best if best is not None else fit(full, budget)
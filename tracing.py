@@ -0,0 +1,222 @@
+import contextvars
+import itertools
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# ---------------------------
+# Spans / traces
+# ---------------------------
+#
+# A trace is one chat turn; spans are agent hops, LLM calls, tool calls and
+# upstream fetches inside it. Spans carry wall time plus optional attributes:
+#   input_tokens / output_tokens   (LLM calls)
+#   bytes                          (upstream payload size)
+#   cache_<name> = "hit" | "miss"  (e.g. cache_tool, cache_price)
+# Every finished span is logged as one JSON line on the "agentic.trace"
+# logger and folded into the Prometheus counters below, trace or no trace.
+
+logger = logging.getLogger("agentic.trace")
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+_span_ids = itertools.count(1)
+
+
+class Span:
+    def __init__(self, name: str, kind: str, parent=None, **attrs):
+        self.id = next(_span_ids)
+        self.name = name
+        self.kind = kind
+        self.parent = parent
+        self.attrs = dict(attrs)
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self.duration_ms = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "parent": self.parent,
+            "kind": self.kind,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            **self.attrs,
+        }
+
+
+class Trace:
+    def __init__(self, message: str = ""):
+        self.id = uuid.uuid4().hex
+        self.message = message
+        self.start = time.time()
+        self.duration_ms = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = [s.to_dict() for s in sorted(self.spans, key=lambda s: s.start)]
+        return {
+            "trace_id": self.id,
+            "message": self.message,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "spans": spans,
+        }
+
+
+# Most recently finished trace (handy for a debug view)
+last_trace = None
+
+
+@contextmanager
+def trace(message: str = ""):
+    """Collect every span opened in this context (and bound threads) into one Trace."""
+    global last_trace
+    tr = Trace(message)
+    token = _current_trace.set(tr)
+    t0 = time.perf_counter()
+    try:
+        yield tr
+    finally:
+        tr.duration_ms = (time.perf_counter() - t0) * 1000.0
+        _current_trace.reset(token)
+        last_trace = tr
+        logger.info(json.dumps({"event": "trace", "trace_id": tr.id, "duration_ms": tr.duration_ms,
+                                "spans": len(tr.spans)}))
+
+
+def start_span(name: str, kind: str = "internal", **attrs) -> Span:
+    """Open a span without making it current (for generators); close with end_span()."""
+    parent = _current_span.get()
+    return Span(name, kind, parent.id if parent else None, **attrs)
+
+
+def end_span(sp: Span, error: BaseException = None):
+    sp.duration_ms = (time.perf_counter() - sp._t0) * 1000.0
+    if error is not None:
+        sp.attrs["error"] = repr(error)
+    tr = _current_trace.get()
+    if tr is not None:
+        tr.add(sp)
+    _observe(sp)
+    logger.info(json.dumps({"event": "span", "trace_id": tr.id if tr else None, **sp.to_dict()}, default=str))
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attrs):
+    """Time a block as a span nested under the current one."""
+    sp = start_span(name, kind, **attrs)
+    token = _current_span.set(sp)
+    error = None
+    try:
+        yield sp
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current_span.reset(token)
+        end_span(sp, error)
+
+
+def annotate(**attrs):
+    """Attach attributes to the current span, if any."""
+    sp = _current_span.get()
+    if sp is not None:
+        sp.set(**attrs)
+
+
+def bind(fn):
+    """Carry the current trace/span into another thread (use when submitting to a pool)."""
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.run(fn, *args, **kwargs)
+
+
+# ---------------------------
+# Prometheus-style counters
+# ---------------------------
+
+_metrics_lock = threading.Lock()
+_counters = defaultdict(float)
+
+_HELP = {
+    "agentic_spans_total": "Finished spans by kind and name.",
+    "agentic_span_seconds_total": "Wall time spent in spans by kind and name.",
+    "agentic_llm_tokens_total": "LLM tokens by agent and direction.",
+    "agentic_fetched_bytes_total": "Bytes received from upstream providers.",
+    "agentic_cache_events_total": "Cache lookups by cache and result.",
+}
+
+
+def _inc(metric: str, value: float = 1.0, **labels):
+    key = (metric, tuple(sorted(labels.items())))
+    with _metrics_lock:
+        _counters[key] += value
+
+
+def _observe(sp: Span):
+    _inc("agentic_spans_total", kind=sp.kind, name=sp.name)
+    _inc("agentic_span_seconds_total", sp.duration_ms / 1000.0, kind=sp.kind, name=sp.name)
+    for direction in ("input", "output"):
+        tokens = sp.attrs.get(f"{direction}_tokens")
+        if tokens:
+            _inc("agentic_llm_tokens_total", tokens, agent=sp.attrs.get("agent", sp.name), direction=direction)
+    if sp.attrs.get("bytes"):
+        _inc("agentic_fetched_bytes_total", sp.attrs["bytes"], source=sp.name)
+    for key, value in sp.attrs.items():
+        if key.startswith("cache_"):
+            _inc("agentic_cache_events_total", cache=key[len("cache_"):], result=str(value))
+
+
+def render_prometheus() -> str:
+    """Counters in the Prometheus text exposition format."""
+    with _metrics_lock:
+        items = sorted(_counters.items())
+    lines, seen = [], set()
+    for (metric, labels), value in items:
+        if metric not in seen:
+            seen.add(metric)
+            lines.append(f"# HELP {metric} {_HELP.get(metric, metric)}")
+            lines.append(f"# TYPE {metric} counter")
+        label_txt = ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in labels)
+        lines.append(f"{metric}{{{label_txt}}} {value:g}" if label_txt else f"{metric} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(port: int = 9100, host: str = "127.0.0.1"):
+    """Serve render_prometheus() on http://host:port/metrics from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd